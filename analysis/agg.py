@@ -1,5 +1,7 @@
 import os
+import sqlite3
 import pandas as pd
+from change_feed import read_changes, changed_games
 
 class PlayerPerformanceAggregator:
     
@@ -8,6 +10,8 @@ class PlayerPerformanceAggregator:
         Initialize the PlayerPerformanceAggregator with the file path.
         """
         self.agg_file = agg_file
+        # Last change feed record aggregated by aggregate_changes, saved next to the aggregate file
+        self.offset_file = os.path.splitext(agg_file)[0] + '.offset'
         self.agg_df = self._load_or_initialize_agg_df()
     
     def _load_or_initialize_agg_df(self):
@@ -21,7 +25,9 @@ class PlayerPerformanceAggregator:
         else:
             # Create an empty DataFrame with the relevant columns if the file doesn't exist
             agg_df = pd.DataFrame(columns=['accountId', 'games_played', 'kills', 'deaths', 'damage_dealt',
-                                           'damage_taken', 'total_hits', 'headshots', 'Assists', 'TotalScore', 'agent_pool'])
+                                           'damage_taken', 'total_hits', 'headshots', 'Assists', 'TotalScore', 'agent_pool',
+                                           'avg_kills', 'avg_deaths', 'avg_damage_dealt', 'avg_damage_taken',
+                                           'avg_total_hits', 'avg_headshots', 'avg_Assists', 'avg_TotalScore'])
             print(f"Created a new aggregate file at {self.agg_file}")
         return agg_df
     
@@ -111,6 +117,8 @@ class PlayerPerformanceAggregator:
     def save_agg_df(self):
         """
         Save the aggregated DataFrame back to the Excel file.
+
+        :return: True if the file was saved.
         """
         # Before saving, calculate the averages
         self._calculate_averages()
@@ -118,8 +126,97 @@ class PlayerPerformanceAggregator:
         try:
             self.agg_df.to_excel(self.agg_file)
             print(f"Aggregated data saved to {self.agg_file}")
+            return True
         except Exception as e:
             print(f"Error saving data to Excel: {e}")
+            return False
+
+    def _read_offset(self):
+        if os.path.exists(self.offset_file):
+            with open(self.offset_file, 'r') as f:
+                return int(f.read().strip())
+        return 0
+
+    def _write_offset(self, change_id):
+        with open(self.offset_file, 'w') as f:
+            f.write(str(change_id))
+
+    @staticmethod
+    def _fetch_player_pf(cursor, platform_game_id):
+        """
+        Read the player_pf of one game from the game_player_stats table written by the importer.
+        """
+        placeholder = '?' if isinstance(cursor, sqlite3.Cursor) else '%s'
+        cursor.execute(
+            "SELECT account_id, display_name, agent_name, kills, deaths, damage_dealt, damage_taken, total_hits, "
+            f"headshots, assists, total_score FROM game_player_stats WHERE platformGameId = {placeholder};",
+            (platform_game_id,)
+        )
+        return pd.DataFrame(cursor.fetchall(), columns=[
+            'accountId', 'displayName', 'AgentName', 'kills', 'deaths', 'damage_dealt', 'damage_taken',
+            'total_hits', 'headshots', 'Assists', 'TotalScore'
+        ])
+
+    def aggregate_changes(self, cursor, batch_size=500):
+        """
+        Aggregate the games the importer published on its change feed since the saved offset,
+        reading their player performance from game_player_stats instead of the game files.
+
+        A game that was imported again after it was aggregated would be counted twice, so the
+        aggregate is then rebuilt from every game in game_player_stats. The offset is saved
+        after the aggregate file.
+
+        :param cursor: A DB-API cursor on the esports database, MySQL or a SQLite import.
+        :param batch_size: Number of change records read at a time.
+        :return: Number of games aggregated.
+        """
+        offset = self._read_offset()
+        start_offset = offset
+        games = {}
+        while True:
+            changes = read_changes(cursor, after=offset, limit=batch_size)
+            if not changes:
+                break
+            if changed_games(cursor, changes, start_offset):
+                print("Games were imported again since the last aggregation, rebuilding the aggregate.")
+                return self.rebuild_from_db(cursor)
+            # Keep one entry per game, a game changed twice since the offset is aggregated once
+            for change in changes:
+                games[change.platformGameId] = change.change_id
+            offset = changes[-1].change_id
+
+        for platform_game_id in games:
+            self.aggregate_player_data(self._fetch_player_pf(cursor, platform_game_id))
+
+        if games and not self.save_agg_df():
+            return 0
+        self._write_offset(offset)
+        print(f"Aggregated {len(games)} games up to change {offset}")
+        return len(games)
+
+    def rebuild_from_db(self, cursor):
+        """
+        Recompute the aggregate from every game in game_player_stats and move the offset to the
+        latest change.
+
+        :param cursor: A DB-API cursor on the esports database.
+        :return: Number of games aggregated.
+        """
+        cursor.execute("SELECT MAX(change_id) FROM game_changes;")
+        offset = cursor.fetchone()[0] or 0
+        cursor.execute("SELECT DISTINCT platformGameId FROM game_player_stats;")
+        game_ids = [row[0] for row in cursor.fetchall()]
+
+        # Keep the columns of the loaded file, drop its rows
+        self.agg_df = self.agg_df.iloc[0:0]
+        for platform_game_id in game_ids:
+            self.aggregate_player_data(self._fetch_player_pf(cursor, platform_game_id))
+
+        if not self.save_agg_df():
+            return 0
+        self._write_offset(offset)
+        print(f"Rebuilt the aggregate from {len(game_ids)} games up to change {offset}")
+        return len(game_ids)
 
 # Example usage:
 # Assuming `player_pf` is the player performance DataFrame you get from GameDataCleaner
@@ -0,0 +1,142 @@
+import sys
+import gzip
+import json
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+from game_cleaning import GameDataCleaner, damage_totals
+
+
+def _measure(function, *args):
+    """
+    Run function once for its time and once under tracemalloc for the peak memory it allocates.
+    """
+    start = time.perf_counter()
+    function(*args)
+    seconds = time.perf_counter() - start
+
+    tracemalloc.start()
+    function(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return seconds, peak
+
+
+def _loop_totals(damage_events):
+    """
+    The per event loop _createPlayerPf used before damage_totals, updating a dict per player.
+    """
+    player_metrics = {}
+    for event in damage_events:
+        causer_id = event['causerId']['value']
+        victim_id = event.get('victimId', {}).get('value', None)
+        for player_id in (causer_id, victim_id):
+            if player_id not in player_metrics:
+                player_metrics[player_id] = {
+                    'kills': 0, 'deaths': 0, 'damage_dealt': 0, 'damage_taken': 0, 'total_hits': 0, 'headshots': 0
+                }
+        player_metrics[causer_id]['damage_dealt'] += event['damageAmount']
+        player_metrics[causer_id]['total_hits'] += 1
+        if event['location'] == 'HEAD':
+            player_metrics[causer_id]['headshots'] += 1
+        if event['killEvent']:
+            player_metrics[causer_id]['kills'] += 1
+        player_metrics[victim_id]['damage_taken'] += event['damageAmount']
+        if event['killEvent']:
+            player_metrics[victim_id]['deaths'] += 1
+    return player_metrics
+
+
+def _damage_arrays(damage_events):
+    """
+    Extract damage events into the arrays damage_totals reduces, as _createPlayerPf did before
+    GameEvents collected them as columns.
+    """
+    player_index = {}
+    causer_index, victim_index, damage_amounts, kill_events, headshots = [], [], [], [], []
+    for event in damage_events:
+        causer_index.append(player_index.setdefault(event['causerId']['value'], len(player_index)))
+        victim_index.append(player_index.setdefault(event.get('victimId', {}).get('value', None), len(player_index)))
+        damage_amounts.append(event['damageAmount'])
+        kill_events.append(bool(event['killEvent']))
+        headshots.append(event['location'] == 'HEAD')
+    return (np.array(causer_index, dtype=np.intp), np.array(victim_index, dtype=np.intp), np.array(damage_amounts),
+            np.array(kill_events, dtype=bool), np.array(headshots, dtype=bool), len(player_index))
+
+
+def bench_damage(events):
+    """
+    Time the damage reduction of a game: the previous per event loop against extracting the
+    arrays and reducing them with damage_totals, and damage_totals alone.
+    """
+    damage_events = [event['damageEvent'] for event in events
+                     if isinstance(event.get('damageEvent'), dict) and 'causerId' in event['damageEvent']]
+
+    start = time.perf_counter()
+    _loop_totals(damage_events)
+    loop_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    arrays = _damage_arrays(damage_events)
+    damage_totals(*arrays)
+    arrays_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    damage_totals(*arrays)
+    kernel_seconds = time.perf_counter() - start
+    return len(damage_events), loop_seconds, arrays_seconds, kernel_seconds
+
+
+def bench_file(path):
+    """
+    Measure GameDataCleaner on a local game file, next to building pd.DataFrame(events),
+    the sparse frame the cleaner used to start from.
+
+    :param path: A gzipped game file, e.g. a file of a local mirror of the bucket.
+    :return: Dict of timings in seconds and peak allocations in bytes.
+    """
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        events = json.load(f)
+
+    clean_seconds, clean_peak = _measure(GameDataCleaner.genGameDataFromJson, events)
+    frame_seconds, frame_peak = _measure(pd.DataFrame, events)
+    damage_events, loop_seconds, arrays_seconds, kernel_seconds = bench_damage(events)
+    return {
+        'events': len(events),
+        'damage_events': damage_events,
+        'damage_loop_seconds': loop_seconds,
+        'damage_arrays_seconds': arrays_seconds,
+        'damage_kernel_seconds': kernel_seconds,
+        'clean_seconds': clean_seconds,
+        'clean_peak_bytes': clean_peak,
+        'frame_seconds': frame_seconds,
+        'frame_peak_bytes': frame_peak,
+    }
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python bench_cleaning.py <game.json.gz> [<game.json.gz> ...]")
+        sys.exit(1)
+
+    totals = {}
+    for path in sys.argv[1:]:
+        result = bench_file(path)
+        for name, value in result.items():
+            totals[name] = totals.get(name, 0) + value
+        print(f"{path}: {result['events']} events, genGameDataFromJson {result['clean_seconds'] * 1000:.1f}ms "
+              f"peak {result['clean_peak_bytes'] / 1e6:.1f}MB, "
+              f"pd.DataFrame(events) {result['frame_seconds'] * 1000:.1f}ms peak {result['frame_peak_bytes'] / 1e6:.1f}MB")
+
+    games = len(sys.argv) - 1
+    print(f"games: {games}, events: {totals['events']}")
+    print(f"genGameDataFromJson: {totals['clean_seconds'] / games * 1000:.1f}ms per game")
+    print(f"pd.DataFrame(events): {totals['frame_seconds'] / games * 1000:.1f}ms per game")
+    print(f"damage events: {totals['damage_events']}, per event loop {totals['damage_loop_seconds'] * 1000:.1f}ms, "
+          f"arrays + damage_totals {totals['damage_arrays_seconds'] * 1000:.1f}ms, "
+          f"damage_totals alone {totals['damage_kernel_seconds'] * 1000:.1f}ms")
+
+
+if __name__ == '__main__':
+    main()
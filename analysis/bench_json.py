@@ -0,0 +1,93 @@
+import gc
+import io
+import sys
+import gzip
+import time
+from json_stream import BACKENDS, set_backend, get_backend, loads, iter_gz_json
+
+
+def _time(function, *args, repeat=3):
+    """
+    Return the best time of repeat runs of function, and its result. The garbage collector is
+    paused during runs, as its passes over the decoded events would dominate the timings.
+    """
+    best = None
+    for _ in range(repeat):
+        result = None
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            result = function(*args)
+            seconds = time.perf_counter() - start
+        finally:
+            gc.enable()
+        best = seconds if best is None else min(best, seconds)
+    return best, result
+
+
+def bench_file(path, backends=None):
+    """
+    Time decoding a game file with each JSON backend: the whole decompressed body with loads, and
+    the compressed file through iter_gz_json, streamed and with whole_file. Every backend must
+    decode the file exactly like json.
+
+    :param path: A gzipped game file, e.g. a file of a local mirror of the bucket.
+    :param backends: Names of the backends to time, all of BACKENDS by default.
+    :return: Dict of timings in seconds by backend, and the sizes of the file.
+    """
+    with open(path, 'rb') as f:
+        compressed = f.read()
+    body = gzip.decompress(compressed)
+
+    result = {'compressed_bytes': len(compressed), 'bytes': len(body), 'backends': {}}
+    expected = None
+    previous = get_backend()
+    try:
+        for name in backends or sorted(BACKENDS):
+            set_backend(name)
+            loads_seconds, events = _time(loads, body)
+            stream_seconds, streamed = _time(lambda: list(iter_gz_json(io.BytesIO(compressed))))
+            whole_seconds, whole = _time(lambda: list(iter_gz_json(io.BytesIO(compressed), whole_file=True)))
+            if expected is None:
+                set_backend('json')
+                expected = loads(body)
+                set_backend(name)
+            if events != expected or streamed != expected or whole != expected:
+                raise AssertionError(f"{name} decodes {path} differently from json")
+            result['backends'][name] = {'loads_seconds': loads_seconds, 'iter_gz_json_seconds': stream_seconds,
+                                        'whole_file_seconds': whole_seconds}
+        result['events'] = len(expected)
+    finally:
+        set_backend(previous)
+    return result
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python bench_json.py <game.json.gz> [<game.json.gz> ...]")
+        sys.exit(1)
+
+    totals = {}
+    for path in sys.argv[1:]:
+        result = bench_file(path)
+        timings = ', '.join(f"{name} loads {seconds['loads_seconds'] * 1000:.1f}ms "
+                            f"iter_gz_json {seconds['iter_gz_json_seconds'] * 1000:.1f}ms "
+                            f"whole_file {seconds['whole_file_seconds'] * 1000:.1f}ms"
+                            for name, seconds in result['backends'].items())
+        print(f"{path}: {result['events']} events, {result['bytes'] / 1e6:.1f}MB, {timings}")
+        for name, seconds in result['backends'].items():
+            backend_totals = totals.setdefault(name, dict.fromkeys(seconds, 0))
+            for metric, value in seconds.items():
+                backend_totals[metric] += value
+
+    games = len(sys.argv) - 1
+    print(f"games: {games}, default backend: {get_backend()}")
+    for name, seconds in totals.items():
+        print(f"{name}: loads {seconds['loads_seconds'] / games * 1000:.1f}ms per game, "
+              f"iter_gz_json {seconds['iter_gz_json_seconds'] / games * 1000:.1f}ms per game, "
+              f"whole_file {seconds['whole_file_seconds'] / games * 1000:.1f}ms per game")
+
+
+if __name__ == '__main__':
+    main()
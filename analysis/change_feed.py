@@ -0,0 +1,111 @@
+import sqlite3
+from collections import namedtuple
+
+# One record of the importer's change feed: a game committed by an import run
+GameChange = namedtuple('GameChange', ['change_id', 'platformGameId', 'year', 'object_key', 'content_hash',
+                                       'published_at'])
+
+
+def _placeholder(cursor):
+    return '?' if isinstance(cursor, sqlite3.Cursor) else '%s'
+
+
+def read_changes(cursor, after=0, limit=1000):
+    """
+    Read the changes published after a change id, oldest first.
+
+    :param cursor: A DB-API cursor on the esports database, MySQL or a SQLite import.
+    :param after: The last change id already processed, 0 to start from the beginning.
+    :param limit: Maximum number of changes returned.
+    :return: List of GameChange.
+    """
+    p = _placeholder(cursor)
+    cursor.execute(
+        f"SELECT {', '.join(GameChange._fields)} FROM game_changes "
+        f"WHERE change_id > {p} ORDER BY change_id LIMIT {p};",
+        (after, limit)
+    )
+    return [GameChange(*row) for row in cursor.fetchall()]
+
+
+def latest_change_id(cursor):
+    """
+    Return the id of the last published change, 0 if none was published yet.
+    """
+    cursor.execute("SELECT MAX(change_id) FROM game_changes;")
+    return cursor.fetchone()[0] or 0
+
+
+def changed_games(cursor, changes, after):
+    """
+    Return the platformGameIds among changes that already had a change at or before the offset,
+    i.e. games a consumer at that offset has processed before and that were imported again.
+    """
+    game_ids = sorted({change.platformGameId for change in changes})
+    if not game_ids:
+        return set()
+    p = _placeholder(cursor)
+    cursor.execute(
+        f"SELECT DISTINCT platformGameId FROM game_changes "
+        f"WHERE change_id <= {p} AND platformGameId IN ({', '.join([p] * len(game_ids))});",
+        [after] + game_ids
+    )
+    return {row[0] for row in cursor.fetchall()}
+
+
+def load_offset(cursor, consumer):
+    """
+    Return the last change id a consumer saved with save_offset, 0 for a new consumer.
+    """
+    p = _placeholder(cursor)
+    cursor.execute(f"SELECT last_change_id FROM change_consumers WHERE consumer = {p};", (consumer,))
+    row = cursor.fetchone()
+    return row[0] if row else 0
+
+
+def save_offset(cursor, consumer, change_id):
+    """
+    Save the last change id a consumer processed. Saving it in the transaction that writes the
+    consumer's results makes each change take effect exactly once.
+    """
+    if isinstance(cursor, sqlite3.Cursor):
+        cursor.execute(
+            "INSERT INTO change_consumers (consumer, last_change_id) VALUES (?, ?) "
+            "ON CONFLICT (consumer) DO UPDATE SET last_change_id = excluded.last_change_id;",
+            (consumer, change_id)
+        )
+    else:
+        cursor.execute(
+            "INSERT INTO change_consumers (consumer, last_change_id) VALUES (%s, %s) "
+            "ON DUPLICATE KEY UPDATE last_change_id = VALUES(last_change_id);",
+            (consumer, change_id)
+        )
+
+
+def consume(conn, consumer, handle, batch_size=500):
+    """
+    Hand the changes published since a consumer's saved offset to handle, one batch at a time.
+    Each batch is committed together with the new offset, so a consumer that fails resumes
+    with the batch it did not finish.
+
+    :param conn: A DB-API connection on the esports database.
+    :param consumer: Name the offset is saved under, e.g. 'rollups'.
+    :param handle: Called with the cursor and a list of GameChange; its writes are committed with the offset.
+    :param batch_size: Maximum number of changes per batch.
+    :return: Number of changes processed.
+    """
+    cursor = conn.cursor()
+    processed = 0
+    try:
+        offset = load_offset(cursor, consumer)
+        while True:
+            changes = read_changes(cursor, after=offset, limit=batch_size)
+            if not changes:
+                return processed
+            handle(cursor, changes)
+            offset = changes[-1].change_id
+            save_offset(cursor, consumer, offset)
+            conn.commit()
+            processed += len(changes)
+    finally:
+        cursor.close()
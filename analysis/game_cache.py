@@ -0,0 +1,223 @@
+import os
+import sys
+import json
+import mmap
+import time
+import struct
+import hashlib
+import numpy as np
+from json_stream import iter_gz_json
+from object_sources import open_source
+from game_cleaning import GameEvents
+
+# Bump when GameEvents collects something new, so games cached by an older version are parsed again
+CACHE_VERSION = 1
+MAGIC = b'VCTGAME\0'
+# Columns start at multiples of ALIGNMENT bytes in the file
+ALIGNMENT = 64
+
+
+def _digest(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def _aligned(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def _boundary_columns(boundaries):
+    """
+    Split (position, roundNumber) pairs into a positions array and round numbers, as an array when
+    they are all integers and as a list kept in the header otherwise.
+    """
+    positions = np.array([position for position, _ in boundaries], dtype=np.int64)
+    numbers = [number for _, number in boundaries]
+    if all(type(number) is int for number in numbers):
+        return positions, np.array(numbers, dtype=np.int64)
+    return positions, numbers
+
+
+def write_events(path, events, key, content_hash):
+    """
+    Write the events of a game to a cache file: a JSON header, then one aligned array per column.
+
+    Damage events and round boundaries are stored as columns. The first gameDecided, the last
+    snapshot and the configuration are single objects of a few KB and stay JSON in the header.
+
+    :param path: The cache file, replaced atomically.
+    :param events: GameEvents of the game.
+    :param key: The source key of the game file.
+    :param content_hash: The hash of the game file the events were parsed from.
+    """
+    columns = {'damage.' + name: values for name, values in events.damage.items()}
+    header = {
+        'version': CACHE_VERSION,
+        'key': key,
+        'content_hash': content_hash,
+        'count': events.count,
+        'platform_game_id': events.platform_game_id,
+        'types': sorted(events.types),
+        'players': events.players,
+        'locations': events.locations,
+        'round_ceremony_types': events.round_ceremony_types,
+        'game_decided': events.game_decided,
+        'snapshot': events.snapshot,
+        'configuration': events.configuration,
+        'round_numbers': {},
+        'columns': {},
+    }
+    for name, boundaries in (('round_started', events.round_started), ('round_ended', events.round_ended)):
+        positions, numbers = _boundary_columns(boundaries)
+        columns[name + '.position'] = positions
+        if isinstance(numbers, np.ndarray):
+            columns[name + '.number'] = numbers
+        else:
+            header['round_numbers'][name] = numbers
+
+    # Lay the columns out after the header, whose size depends on their offsets
+    offset = 0
+    for name, values in columns.items():
+        values = np.ascontiguousarray(values)
+        columns[name] = values
+        header['columns'][name] = {'dtype': values.dtype.str, 'length': len(values), 'offset': offset}
+        offset = _aligned(offset + values.nbytes)
+    header_bytes = json.dumps(header).encode('utf-8')
+    data_start = _aligned(len(MAGIC) + 8 + len(header_bytes))
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + '.part', 'wb') as f:
+        f.write(MAGIC + struct.pack('<Q', len(header_bytes)) + header_bytes)
+        for name, values in columns.items():
+            f.seek(data_start + header['columns'][name]['offset'])
+            f.write(values.tobytes())
+        # Extend the file to the end of the last column, which may be empty
+        f.truncate(data_start + offset)
+    os.replace(path + '.part', path)
+
+
+def read_events(path):
+    """
+    Read the events of a game from a cache file. The file is memory-mapped and the columns are
+    read-only arrays over the mapping, so nothing is copied until the cleaner selects from them.
+
+    :return: Tuple of the GameEvents and the header, or None if the file was written by another version.
+    """
+    with open(path, 'rb') as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError(f"{path} is not a game cache file")
+    header_length, = struct.unpack_from('<Q', data, len(MAGIC))
+    header_start = len(MAGIC) + 8
+    header = json.loads(data[header_start:header_start + header_length])
+    if header['version'] != CACHE_VERSION:
+        return None
+    data_start = _aligned(header_start + header_length)
+
+    columns = {}
+    for name, column in header['columns'].items():
+        columns[name] = np.frombuffer(data, dtype=np.dtype(column['dtype']), count=column['length'],
+                                      offset=data_start + column['offset'])
+
+    events = GameEvents()
+    events.count = header['count']
+    events.platform_game_id = header['platform_game_id']
+    events.types = set(header['types'])
+    events.players = header['players']
+    events.locations = header['locations']
+    events.round_ceremony_types = header['round_ceremony_types']
+    events.game_decided = header['game_decided']
+    events.snapshot = header['snapshot']
+    events.configuration = header['configuration']
+    events.damage = {name[len('damage.'):]: values for name, values in columns.items() if name.startswith('damage.')}
+    for name in ('round_started', 'round_ended'):
+        numbers = header['round_numbers'].get(name)
+        if numbers is None:
+            numbers = columns[name + '.number'].tolist()
+        setattr(events, name, list(zip(columns[name + '.position'].tolist(), numbers)))
+    return events, header
+
+
+class GameCache:
+    """
+    Parsed games cached on disk, keyed by source key and content hash. A game file is parsed once,
+    on its first read, into the columns of GameEvents; later reads memory-map the cache file
+    instead of downloading, decompressing and parsing the game again.
+
+    Content hashes are the source's ETags. Keys listed through GameCache.list are looked up without
+    touching the source; for other keys the ETag is asked with one head() call and remembered.
+    A game body is only read on a miss.
+    """
+
+    def __init__(self, root, source):
+        self.root = root
+        self.source = source
+        self.hashes = {}
+
+    def path(self, key, content_hash):
+        key_digest = _digest(key)
+        return os.path.join(self.root, key_digest[:2], f"{key_digest}.{_digest(content_hash)[:16]}.game")
+
+    def list(self, prefix=''):
+        """
+        Yield the objects of the source under prefix, remembering their content hash.
+        """
+        for obj in self.source.list(prefix):
+            self.hashes[obj['Key']] = obj['ETag']
+            yield obj
+
+    def head(self, key):
+        return self.source.head(key)
+
+    def open(self, key):
+        return self.source.open(key)
+
+    def get(self, key):
+        return self.source.get(key)
+
+    def events(self, key):
+        """
+        Return the GameEvents of a game file, parsing and caching it on a miss.
+        """
+        content_hash = self.hashes.get(key)
+        if content_hash is None:
+            content_hash = self.hashes[key] = self.source.head(key)['ETag']
+
+        path = self.path(key, content_hash)
+        if os.path.exists(path):
+            cached = read_events(path)
+            if cached is not None:
+                return cached[0]
+
+        # Parse the game file and replace the entries of older versions of it
+        events = GameEvents(iter_gz_json(self.source.open(key), whole_file=True, close=True))
+        key_digest = _digest(key)
+        directory = os.path.dirname(path)
+        if os.path.isdir(directory):
+            for filename in os.listdir(directory):
+                if filename.startswith(key_digest + '.') and filename.endswith('.game'):
+                    os.remove(os.path.join(directory, filename))
+        write_events(path, events, key, content_hash)
+        return events
+
+
+def warm(cache, prefix=''):
+    """
+    Parse and cache the games under prefix that are not cached yet.
+
+    :return: Number of games read.
+    """
+    keys = [obj['Key'] for obj in cache.list(prefix) if obj['Key'].endswith('.json.gz')]
+    for key in keys:
+        cache.events(key)
+        print(f"Cached {key}")
+    return len(keys)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 3:
+        print("Usage: python game_cache.py <cache_dir> <mirror_dir|s3://bucket> [prefix]")
+        sys.exit(1)
+    start = time.perf_counter()
+    count = warm(GameCache(sys.argv[1], open_source(sys.argv[2])),
+                 prefix=sys.argv[3] if len(sys.argv) > 3 else 'vct-international/games/')
+    print(f"Cached {count} games in {time.perf_counter() - start:.1f}s")
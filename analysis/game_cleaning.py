@@ -1,5 +1,204 @@
-import json
+import os
+from io import BytesIO
+from itertools import chain, islice
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import numpy as np
 import pandas as pd
+from json_stream import iter_gz_json, loads
+
+# Tables genGameDataFromJson returns
+GAME_DATA_TABLES = ('team_pf', 'round_df', 'player_pf')
+# Object source the worker processes of GameDataCleaner.iterGameDataFromMany open game keys with
+_worker_source = None
+
+
+def damage_totals(causer_index, victim_index, damage_amount, kill_event, headshot, num_players):
+    """
+    Reduce damage events to per player metrics with bincount.
+
+    Each event is given by the index of its causer and victim, its damage amount, whether it
+    killed and whether it hit the head. bincount accumulates in event order, so the damage
+    sums are the same as adding the events up one by one.
+
+    :param causer_index: Array of the causer index of every event.
+    :param victim_index: Array of the victim index of every event.
+    :param damage_amount: Array of damage amounts; integer amounts give integer damage totals.
+    :param kill_event: Boolean array, True for events that killed the victim.
+    :param headshot: Boolean array, True for events that hit the head.
+    :param num_players: Number of player indexes.
+    :return: Dict of per player arrays: kills, deaths, damage_dealt, damage_taken, total_hits,
+             headshots and headshot_percentage.
+    """
+    damage_dealt = np.bincount(causer_index, weights=damage_amount, minlength=num_players)
+    damage_taken = np.bincount(victim_index, weights=damage_amount, minlength=num_players)
+    if np.issubdtype(damage_amount.dtype, np.integer):
+        damage_dealt = damage_dealt.astype(np.int64)
+        damage_taken = damage_taken.astype(np.int64)
+    total_hits = np.bincount(causer_index, minlength=num_players)
+    headshots = np.bincount(causer_index[headshot], minlength=num_players)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        headshot_percentage = np.where(total_hits > 0, headshots / total_hits * 100, 0)
+    return {
+        'kills': np.bincount(causer_index[kill_event], minlength=num_players),
+        'deaths': np.bincount(victim_index[kill_event], minlength=num_players),
+        'damage_dealt': damage_dealt,
+        'damage_taken': damage_taken,
+        'total_hits': total_hits,
+        'headshots': headshots,
+        'headshot_percentage': headshot_percentage,
+    }
+
+
+# Codes of the first damage event field missing from an event, in the order the cleaner reads them
+DAMAGE_FIELDS = {1: 'damageAmount', 2: 'killEvent', 3: 'location'}
+# Types of damageAmount: integer amounts give integer damage totals
+AMOUNT_FLOAT, AMOUNT_INT, AMOUNT_NOT_A_NUMBER = 0, 1, 2
+
+
+class GameEvents:
+    """
+    The events GameDataCleaner reads from a game, collected in a single pass.
+
+    Each event is handed to the handler of its type; events of other types are skipped without
+    being stored. Positions are indexes in the event list, like the row labels of the DataFrame
+    this replaces. Damage events are kept as columns: arrays of one entry per event in
+    self.damage, with player ids and locations coded as indexes into self.players and
+    self.locations. GameEvents() without events is empty, to be filled by e.g. the game cache.
+    """
+
+    def __init__(self, json_data=()):
+        self.count = 0
+        # platformGameId of the first event
+        self.platform_game_id = None
+        # Event types present in the game, even with a null payload: the columns the DataFrame had
+        self.types = set()
+        # (position, roundNumber) of round boundaries
+        self.round_started = []
+        self.round_ended = []
+        self.round_ceremony_types = []
+        self.game_decided = None
+        self.snapshot = None
+        self.configuration = None
+        # Player ids and locations of damage events, in order of first appearance
+        self.players = []
+        self.locations = []
+        self.damage = {}
+
+        # Columns of the damage events while they are collected
+        self._player_codes = {}
+        self._location_codes = {}
+        self._damage_columns = {name: [] for name in
+                                ('position', 'causer', 'victim', 'amount', 'amount_type', 'kill', 'location', 'missing')}
+
+        handlers = {
+            'roundStarted': self._onRoundStarted,
+            'roundEnded': self._onRoundEnded,
+            'damageEvent': self._onDamageEvent,
+            'roundCeremony': self._onRoundCeremony,
+            'gameDecided': self._onGameDecided,
+            'snapshot': self._onSnapshot,
+            'configuration': self._onConfiguration,
+        }
+        json_data = iter(json_data)
+        first = next(json_data, None)
+        if isinstance(first, dict):
+            self.platform_game_id = first.get('platformGameId')
+        if first is not None:
+            json_data = chain((first,), json_data)
+
+        position = -1
+        for position, event in enumerate(json_data):
+            for event_type in event:
+                handler = handlers.get(event_type)
+                if handler is not None:
+                    self.types.add(event_type)
+                    payload = event[event_type]
+                    if payload is not None:
+                        handler(position, payload)
+        self.count = position + 1
+        self._finishDamage()
+
+    def _onRoundStarted(self, position, payload):
+        self.round_started.append((position, payload.get('roundNumber')))
+
+    def _onRoundEnded(self, position, payload):
+        self.round_ended.append((position, payload.get('roundNumber')))
+
+    def _onDamageEvent(self, position, payload):
+        columns = self._damage_columns
+        player_codes = self._player_codes
+        columns['position'].append(position)
+
+        # Use .get() to safely retrieve causerId and victimId; a missing id is coded -1
+        causer_id = (payload.get('causerId') or {}).get('value')
+        victim_id = (payload.get('victimId') or {}).get('value')
+        columns['causer'].append(-1 if causer_id is None else player_codes.setdefault(causer_id, len(player_codes)))
+        columns['victim'].append(-1 if victim_id is None else player_codes.setdefault(victim_id, len(player_codes)))
+
+        # Record the first missing field instead of raising, since the event may not be in a round
+        if 'damageAmount' not in payload:
+            missing = 1
+        elif 'killEvent' not in payload:
+            missing = 2
+        elif 'location' not in payload:
+            missing = 3
+        else:
+            missing = 0
+        columns['missing'].append(missing)
+
+        damage_amount = payload.get('damageAmount')
+        if isinstance(damage_amount, int):
+            columns['amount_type'].append(AMOUNT_INT)
+        elif isinstance(damage_amount, float):
+            columns['amount_type'].append(AMOUNT_FLOAT)
+        else:
+            columns['amount_type'].append(AMOUNT_NOT_A_NUMBER)
+            damage_amount = np.nan
+        columns['amount'].append(damage_amount)
+        columns['kill'].append(bool(payload.get('killEvent')))
+        columns['location'].append(self._location_codes.setdefault(payload.get('location'), len(self._location_codes)))
+
+    def _finishDamage(self):
+        columns = self._damage_columns
+        self.damage = {
+            'position': np.array(columns['position'], dtype=np.int64),
+            'causer': np.array(columns['causer'], dtype=np.int32),
+            'victim': np.array(columns['victim'], dtype=np.int32),
+            'amount': np.array(columns['amount'], dtype=np.float64),
+            'amount_type': np.array(columns['amount_type'], dtype=np.int8),
+            'kill': np.array(columns['kill'], dtype=bool),
+            'location': np.array(columns['location'], dtype=np.int32),
+            'missing': np.array(columns['missing'], dtype=np.int8),
+        }
+        self.players = list(self._player_codes)
+        self.locations = list(self._location_codes)
+        del self._damage_columns, self._player_codes, self._location_codes
+
+    def _onRoundCeremony(self, position, payload):
+        # Default to 'UNKNOWN' if type is missing
+        self.round_ceremony_types.append(payload.get('type', 'UNKNOWN'))
+
+    def _onGameDecided(self, position, payload):
+        # Only the first gameDecided is used
+        if self.game_decided is None:
+            self.game_decided = payload
+
+    def _onSnapshot(self, position, payload):
+        # Only the last snapshot is used
+        self.snapshot = payload
+
+    def _onConfiguration(self, position, payload):
+        # Only the last configuration is used
+        self.configuration = payload
+
+    def require(self, event_type):
+        """
+        Raise KeyError if no event of event_type exists, as selecting its missing column did.
+        """
+        if event_type not in self.types:
+            raise KeyError(event_type)
+
 
 class GameDataCleaner:
     AGENT_MAP = {'ADD6443A-41BD-E414-F6AD-E58D267F4E95': 'Jett',
@@ -30,88 +229,236 @@ class GameDataCleaner:
     
     @staticmethod
     def genGameDataFromJson(json_data):
-        # Use the in-memory JSON data directly (already loaded)
-        raw_data = pd.DataFrame(json_data)
+        # json_data can be the loaded list of events or a stream of events from iter_gz_json
+        # Collect what the outputs are built from in a single pass over the events
+        return GameDataCleaner.genGameDataFromEvents(GameEvents(json_data))
 
-        # Create dictionary of rounds
-        rounds_dict = GameDataCleaner._createRoundsDict(raw_data)
+    @staticmethod
+    def genGameDataFromEvents(events: GameEvents):
+        # events can come from a scan of the game file or from the game cache
+        view = GameView(events)
 
         # Create dataframe of team performance
-        team_pf, round_df = GameDataCleaner._createTeamAndRoundDf(raw_data)
+        team_pf, round_df = view.team_pf, view.round_df
 
         # Create dataframe of player performance
-        player_pf = GameDataCleaner._createPlayerPf(rounds_dict, raw_data)
+        player_pf = view.player_pf
 
         # Return team performance, round data, and player performance
         return team_pf, round_df, player_pf
     
+    @staticmethod
+    def genGameDataFromGz(fileobj, whole_file=True):
+        # Decode the whole game by default; pass whole_file=False to stream files too large for memory
+        return GameDataCleaner.genGameDataFromJson(iter_gz_json(fileobj, whole_file=whole_file))
+    
+    @staticmethod
+    def genGameDataFromMany(games, source=None, workers=None, chunksize=4, ordered=True, tables=GAME_DATA_TABLES):
+        """
+        Clean many games in parallel across a process pool and stack their outputs.
+
+        :param games: Iterable of games, each one a key of source, the path of a gzipped game file when
+                      no source is given, a gzipped game body as bytes, or a list of events.
+        :param source: Object source game keys are opened from, e.g. a LocalSource or S3Source, or a GameCache.
+        :param workers: Number of worker processes, os.cpu_count() by default; 1 cleans in this process.
+        :param chunksize: Number of games sent to a worker at once.
+        :param ordered: Stack the games in input order rather than in the order they finish.
+        :param tables: Names of the GameView tables to compute, team_pf, round_df and player_pf by default.
+        :return: Tuple of one frame per table with the table of all games, each indexed by platformGameId
+                 and the index of the game's own frame. Games that fail to clean are left out.
+        """
+        game_ids = []
+        stacked = [[] for _ in tables]
+        for _, game_id, *game_tables in GameDataCleaner.iterGameDataFromMany(
+                games, source=source, workers=workers, chunksize=chunksize, ordered=ordered, tables=tables):
+            game_ids.append(game_id)
+            for frames, frame in zip(stacked, game_tables):
+                frames.append(frame)
+
+        if not game_ids:
+            return tuple(pd.DataFrame() for _ in tables)
+        return tuple(pd.concat(frames, keys=game_ids, names=['platformGameId']) for frames in stacked)
+
+    @staticmethod
+    def iterGameDataFromMany(games, source=None, workers=None, chunksize=4, ordered=True, tables=GAME_DATA_TABLES):
+        """
+        Clean many games in parallel across a process pool, yielding each game as it is cleaned.
+        Takes the arguments of genGameDataFromMany. At most two chunks per worker are in flight,
+        so games can come from a generator over a whole season.
+
+        :return: Generator of (position of the game in games, platformGameId, one frame per table),
+                 by default (position, platformGameId, team_pf, round_df, player_pf).
+                 Games that fail to clean are reported and skipped.
+        """
+        workers = workers or os.cpu_count() or 1
+        chunks = GameDataCleaner._chunkGames(games, chunksize)
+
+        if workers <= 1:
+            for chunk in chunks:
+                yield from GameDataCleaner._reportFailures(chunk, GameDataCleaner._cleanChunk(chunk, source, tables))
+            return
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=GameDataCleaner._initWorker,
+                                 initargs=(source,)) as pool:
+            pending = deque()
+            for chunk in chunks:
+                pending.append((chunk, pool.submit(GameDataCleaner._cleanChunk, chunk, None, tables)))
+                while len(pending) >= workers * 2:
+                    yield from GameDataCleaner._nextResults(pending, ordered)
+            while pending:
+                yield from GameDataCleaner._nextResults(pending, ordered)
+
+    @staticmethod
+    def _chunkGames(games, chunksize):
+        # Lists of (position, game), chunksize games each
+        positions = enumerate(games)
+        while True:
+            chunk = list(islice(positions, max(chunksize, 1)))
+            if not chunk:
+                return
+            yield chunk
+
+    @staticmethod
+    def _nextResults(pending, ordered):
+        # The oldest chunk in input order, otherwise the first one to finish
+        if ordered:
+            chunk, future = pending.popleft()
+        else:
+            done, _ = wait([future for _, future in pending], return_when=FIRST_COMPLETED)
+            chunk, future = next(entry for entry in pending if entry[1] in done)
+            pending.remove((chunk, future))
+        return GameDataCleaner._reportFailures(chunk, future.result())
+
+    @staticmethod
+    def _reportFailures(chunk, results):
+        for (position, game), (game_id, result) in zip(chunk, results):
+            if isinstance(result, Exception):
+                name = game if isinstance(game, str) else f"game {position}"
+                print(f"Failed to clean {name}: {result!r}")
+                continue
+            yield (position, game_id) + result
+
+    @staticmethod
+    def _initWorker(source):
+        global _worker_source
+        _worker_source = source
+
+    @staticmethod
+    def _cleanChunk(chunk, source=None, tables=GAME_DATA_TABLES):
+        # Runs in a worker process: clean each game of the chunk, returning the exception of a game that failed
+        source = source if source is not None else _worker_source
+        results = []
+        for _, game in chunk:
+            try:
+                if isinstance(game, (bytes, bytearray, memoryview)):
+                    events = GameEvents(iter_gz_json(BytesIO(game), whole_file=True))
+                elif isinstance(game, str) and hasattr(source, 'events'):
+                    # A GameCache returns the events of a key without parsing the game file again
+                    events = source.events(game)
+                elif isinstance(game, str) and source is not None:
+                    events = GameEvents(iter_gz_json(source.open(game), whole_file=True, close=True))
+                elif isinstance(game, str):
+                    with open(game, 'rb') as f:
+                        events = GameEvents(iter_gz_json(f, whole_file=True))
+                else:
+                    events = GameEvents(game)
+                view = GameView(events)
+                results.append((events.platform_game_id, tuple(getattr(view, name) for name in tables)))
+            except Exception as e:
+                results.append((None, e))
+        return results
+
     @staticmethod
     def _loadFromJson(path : str):
-        with open(path, 'r', encoding='utf-8') as f:
-            raw_data = json.load(f)
+        with open(path, 'rb') as f:
+            raw_data = loads(f.read())
             return pd.DataFrame(raw_data)
     
     @staticmethod
-    def _createRoundsDict(raw_data: pd.DataFrame):
+    def _createRoundSegments(events: GameEvents):
         """
-        Create a dictionary of rounds from the raw data, handling cases where 'roundEnded' may be missing.
-        If only 'roundStarted' exists, infer the end_index based on the start of the next round or the last row.
+        Create the rounds of the game as arrays, handling cases where 'roundEnded' may be missing.
+        If only 'roundStarted' exists, infer the end_index based on the start of the next round or the last event.
+
+        :return: Tuple of round_numbers, start_index and end_index arrays, one entry per round in order of
+                 the first roundStarted of the round. Positions are event indexes, end_index included.
         """
-        # Check if 'roundStarted' and 'roundEnded' columns exist in the DataFrame
-        has_round_started = 'roundStarted' in raw_data.columns
-        has_round_ended = 'roundEnded' in raw_data.columns
+        # Check if 'roundStarted' and 'roundEnded' events exist in the game
+        has_round_started = 'roundStarted' in events.types
+        has_round_ended = 'roundEnded' in events.types
+        no_rounds = (np.array([], dtype=np.int64), np.array([], dtype=np.int64), np.array([], dtype=np.int64))
     
-        # Warn if columns are missing
+        # Warn if events are missing
         if not has_round_started:
             print("Warning: 'roundStarted' column is missing from the data.")
-            return {}
+            return no_rounds
     
-        # Filter rows based on the available columns
-        if has_round_ended:
-            filtered_df = raw_data[(pd.notna(raw_data['roundStarted'])) | (pd.notna(raw_data['roundEnded']))]
-        else:
-            # If 'roundEnded' doesn't exist, filter only by 'roundStarted'
-            filtered_df = raw_data[pd.notna(raw_data['roundStarted'])]
+        # Number the rounds in order of their first roundStarted with a round number
+        round_codes = {}
+        start_codes, start_positions = [], []
+        for index, round_number in events.round_started:
+            if round_number:
+                start_codes.append(round_codes.setdefault(round_number, len(round_codes)))
+                start_positions.append(index)
+        if not round_codes:
+            return no_rounds
+        round_numbers = np.array(list(round_codes))
     
-        rounds_dict = {}
+        # A round restarted by a later roundStarted starts at its last roundStarted
+        start_index = np.full(len(round_codes), -1, dtype=np.int64)
+        np.maximum.at(start_index, start_codes, start_positions)
     
-        # Loop through the filtered DataFrame
-        for index, row in filtered_df.iterrows():
-            # Check if the round has started
-            if pd.notna(row['roundStarted']):
-                round_number = row['roundStarted'].get('roundNumber')
-                if round_number:
-                    rounds_dict[round_number] = {'start_index': index, 'end_index': None}
+        if has_round_ended:
+            # A round ends at its last roundEnded, which must not come before its start
+            end_index = np.full(len(round_codes), -1, dtype=np.int64)
+            end_codes, end_positions = [], []
+            for index, round_number in events.round_ended:
+                code = round_codes.get(round_number)
+                if code is not None:
+                    end_codes.append(code)
+                    end_positions.append(index)
+            np.maximum.at(end_index, end_codes, end_positions)
     
-            # Check if the round has ended (only if 'roundEnded' exists)
-            if has_round_ended and pd.notna(row['roundEnded']):
-                round_number = row['roundEnded'].get('roundNumber')
-                if round_number in rounds_dict:
-                    rounds_dict[round_number]['end_index'] = index
+            # Remove rounds that don't have an end_index
+            complete = end_index >= start_index
+            return round_numbers[complete], start_index[complete], end_index[complete]
     
-        # If 'roundEnded' doesn't exist, infer 'end_index' for each round
-        if not has_round_ended:
-            round_numbers = sorted(rounds_dict.keys())  # Get sorted round numbers
-            for i, round_number in enumerate(round_numbers):
-                # For the last round, set the end_index as the last row in the DataFrame
-                if i == len(round_numbers) - 1:
-                    rounds_dict[round_number]['end_index'] = len(raw_data) - 1
-                else:
-                    # Set the end_index for the current round as the start_index of the next round - 1
-                    next_round_start = rounds_dict[round_numbers[i + 1]]['start_index']
-                    rounds_dict[round_number]['end_index'] = next_round_start - 1
-        
-        # Remove rounds that still don't have an end_index (only if 'roundEnded' exists)
-        if has_round_ended:
-            rounds_dict = {k: v for k, v in rounds_dict.items() if v['end_index'] is not None}
+        # If 'roundEnded' doesn't exist, end each round, in round number order, where the next one starts
+        by_number = np.argsort(round_numbers, kind='stable')
+        end_index = np.empty(len(round_numbers), dtype=np.int64)
+        end_index[by_number[:-1]] = start_index[by_number[1:]] - 1
+        # For the last round, set the end_index as the last event of the game
+        end_index[by_number[-1]] = events.count - 1
+        return round_numbers, start_index, end_index
     
-        # Now rounds_dict will contain the start and end index for each round
-        return rounds_dict
+    @staticmethod
+    def _createRoundIndex(rounds, positions):
+        """
+        Assign events to the rounds they were played in, for metrics to group by round in one pass.
+
+        :param rounds: The round_numbers, start_index and end_index arrays of _createRoundSegments.
+        :param positions: Sorted array of event indexes, e.g. events.damage_positions, or
+                          np.arange(events.count) for a dense index of all events.
+        :return: Tuple of the indexes into positions of the events played in a round, round by
+                 round in the order of rounds, and the round of each of them as an index into
+                 round_numbers. An event in two overlapping rounds appears once for each.
+        """
+        _, start_index, end_index = rounds
+        positions = np.asarray(positions, dtype=np.int64)
+        # Each round covers the sorted positions from the first at or after its start to the last at or before its end
+        first = np.searchsorted(positions, start_index, side='left')
+        lengths = np.maximum(np.searchsorted(positions, end_index, side='right') - first, 0)
+        round_index = np.repeat(np.arange(len(start_index)), lengths)
+        # Count up from the first position of its round for every selected event
+        offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        return first[round_index] + offsets, round_index
 
-    
     @staticmethod
-    def _createTeamAndRoundDf(raw_data : pd.DataFrame):
-        winlossdata = raw_data['gameDecided'].dropna().values[0]
+    def _createTeamAndRoundDf(events : GameEvents):
+        events.require('gameDecided')
+        if events.game_decided is None:
+            raise IndexError("index 0 is out of bounds: the game has no gameDecided event")
+        winlossdata = events.game_decided
 
         # Extract the first round's teams
         first_round = winlossdata['spikeMode']['completedRounds'][0]
@@ -180,15 +527,14 @@ class GameDataCleaner:
         round_ceremony_types = []
 
         # Extract round ceremonies (assuming the order aligns with round numbers)
-        round_ceremony = raw_data['roundCeremony'].dropna()
+        events.require('roundCeremony')
+        ceremony_types = events.round_ceremony_types
 
         # Loop through the available round ceremonies
         for idx, round_info in enumerate(round_df.index):
-            # Check if there is a corresponding round ceremony and extract the type
-            if idx < len(round_ceremony):
-                ceremony = round_ceremony.iloc[idx]
-                ceremony_type = ceremony.get('type', 'UNKNOWN')  # Default to 'UNKNOWN' if type is missing
-                round_ceremony_types.append(ceremony_type)
+            # Check if there is a corresponding round ceremony and take its type
+            if idx < len(ceremony_types):
+                round_ceremony_types.append(ceremony_types[idx])
             else:
                 round_ceremony_types.append(None)  # Append None if no ceremony data is available
 
@@ -198,88 +544,101 @@ class GameDataCleaner:
         return team_pf, round_df
     
     @staticmethod
-    def _createPlayerPf(rounds_dict: dict, raw_data: pd.DataFrame):
-        # Initialize a dictionary to store player stats
-        player_metrics = {}
-    
-        # Iterate over rounds_dict to extract relevant damage events and calculate metrics
-        for round_number, indices in rounds_dict.items():
-            start_index = indices['start_index']
-            end_index = indices['end_index']
-            
-            # Filter the rows of damage events within the round using vectorized indexing
-            round_damage_events = raw_data.loc[start_index:end_index, 'damageEvent'].dropna()
+    def _createDamageColumns(rounds, events: GameEvents):
+        """
+        Select the damage events played in a round and index their players.
+
+        :return: Dict of arrays of one entry per damage event kept: round (index into the rounds),
+                 causer and victim (index into player_index), amount, kill and headshot; and
+                 player_index, the player ids in order of first appearance mapped to their index.
+        """
+        damage = events.damage
     
-            # Process each damage event and directly update player stats
-            for event in round_damage_events:
-                # Use .get() to safely retrieve causerId, and victimId, handling cases where causerId is missing
-                causer_id = event.get('causerId', {}).get('value', None)
-                victim_id = event.get('victimId', {}).get('value', None)
-                damage_amount = event['damageAmount']
-                kill_event = event['killEvent']
-                location = event['location']
+        # Select the damage events played in a round, round by round, with the round of each
+        if len(rounds[0]):
+            events.require('damageEvent')
+        selected, round_index = GameDataCleaner._createRoundIndex(rounds, damage['position'])
+        causers = damage['causer'][selected]
     
-                # If causer_id is missing, print a warning and skip the event
-                if causer_id is None:
-                    print(f"Warning: Damage event in round {round_number} is missing causer_id. Skipping event.")
-                    continue  # Skip to the next damage event
+        # A selected event missing a field fails the game, after the warnings of the events before it
+        missing = np.flatnonzero(damage['missing'][selected])
+        checked = missing[0] if len(missing) else len(selected)
     
-                # Initialize or update stats for causer (the one dealing damage)
-                if causer_id not in player_metrics:
-                    player_metrics[causer_id] = {
-                        'kills': 0, 'deaths': 0, 'damage_dealt': 0, 'damage_taken': 0, 'total_hits': 0, 'headshots': 0
-                    }
+        # If causer_id is missing, print a warning and skip the event
+        for skipped in np.flatnonzero(causers[:checked] < 0).tolist():
+            round_number = rounds[0][round_index[skipped]]
+            print(f"Warning: Damage event in round {round_number} is missing causer_id. Skipping event.")
+        if len(missing):
+            raise KeyError(DAMAGE_FIELDS[int(damage['missing'][selected[checked]])])
+        round_index = round_index[causers >= 0]
+        kept = selected[causers >= 0]
+        causers = damage['causer'][kept]
+        # A missing victim is a player too, coded after the known players
+        victims = damage['victim'][kept].astype(np.intp)
+        victims[victims < 0] = len(events.players)
     
-                # Initialize or update stats for victim (the one receiving damage)
-                if victim_id not in player_metrics:
-                    player_metrics[victim_id] = {
-                        'kills': 0, 'deaths': 0, 'damage_dealt': 0, 'damage_taken': 0, 'total_hits': 0, 'headshots': 0
-                    }
+        # Index the players in order of first appearance, the causer (the one dealing damage) of each
+        # event before its victim (the one receiving damage)
+        appearances = np.empty(2 * len(kept), dtype=np.intp)
+        appearances[0::2] = causers
+        appearances[1::2] = victims
+        codes, first = np.unique(appearances, return_index=True)
+        player_codes = codes[np.argsort(first)]
+        code_index = np.zeros(len(events.players) + 1, dtype=np.intp)
+        code_index[player_codes] = np.arange(len(player_codes))
+        players = events.players + [None]
     
-                # Update causer's stats
-                player_metrics[causer_id]['damage_dealt'] += damage_amount
-                player_metrics[causer_id]['total_hits'] += 1
-                
-                if location == 'HEAD':
-                    player_metrics[causer_id]['headshots'] += 1
+        # Integer amounts give integer damage totals
+        amount_types = damage['amount_type'][kept]
+        if (amount_types == AMOUNT_NOT_A_NUMBER).any():
+            raise TypeError("damageAmount must be a number")
+        damage_amounts = damage['amount'][kept]
+        if (amount_types == AMOUNT_INT).all():
+            damage_amounts = damage_amounts.astype(np.int64)
+        headshot_codes = [code for code, location in enumerate(events.locations) if location == 'HEAD']
     
-                if kill_event:
-                    player_metrics[causer_id]['kills'] += 1
+        return {
+            'round': round_index,
+            'causer': code_index[causers],
+            'victim': code_index[victims],
+            'amount': damage_amounts,
+            'kill': damage['kill'][kept],
+            'headshot': np.isin(damage['location'][kept], headshot_codes),
+            'player_index': {players[code]: position for position, code in enumerate(player_codes.tolist())},
+        }
     
-                # Update victim's stats
-                player_metrics[victim_id]['damage_taken'] += damage_amount
-                if kill_event:
-                    player_metrics[victim_id]['deaths'] += 1
+    @staticmethod
+    def _createPlayerTotals(damage_columns: dict):
+        player_index = damage_columns['player_index']
     
-        # Calculate headshot percentage for each player
-        for player_id, metrics in player_metrics.items():
-            total_hits = metrics['total_hits']
-            headshots = metrics['headshots']
-            metrics['headshot_percentage'] = (headshots / total_hits * 100) if total_hits > 0 else 0
+        # Reduce the damage arrays to per player metrics
+        totals = damage_totals(damage_columns['causer'], damage_columns['victim'], damage_columns['amount'],
+                               damage_columns['kill'], damage_columns['headshot'], len(player_index))
+        totals = {name: values.tolist() for name, values in totals.items()}
+        player_metrics = {player_id: {name: values[position] for name, values in totals.items()}
+                          for player_id, position in player_index.items()}
     
-        # Convert the player_metrics dictionary into a DataFrame for analysis
+        # Convert the player_metrics dictionary into a DataFrame for analysis, one row per player index
         player_pf = pd.DataFrame.from_dict(player_metrics, orient='index').reset_index()
         player_pf.rename(columns={'index': 'playerID'}, inplace=True)
+        return player_pf
     
-        final_row = raw_data[raw_data['snapshot'].notna()].iloc[-1]
-    
-        # Iterate through playertest['players'] and update player_metrics_df
-        for player in final_row['snapshot']['players']:
-            player_id = player['playerId']['value']
-            
-            # Find the index of the player in player_metrics_df
-            if player_id in player_pf['playerID'].values:
-                # Get the index of the player to update their metrics
-                player_index = player_pf[player_pf['playerID'] == player_id].index[0]
-    
-                # Update Assists and TotalScore in player_metrics_df
-                player_pf.at[player_index, 'Assists'] = player['assists']
-                player_pf.at[player_index, 'TotalScore'] = player['scores']['combatScore']['totalScore']
+    @staticmethod
+    def _createSnapshot(events: GameEvents):
+        # The last snapshot, the one Assists and TotalScore are read from
+        events.require('snapshot')
+        if events.snapshot is None:
+            raise IndexError("single positional indexer is out-of-bounds: the game has no snapshot event")
+        return events.snapshot
     
-        filtered_df = raw_data[raw_data['configuration'].notna()]
+    @staticmethod
+    def _createAgentDf(events: GameEvents):
+        events.require('configuration')
+        if events.configuration is None:
+            raise IndexError("single positional indexer is out-of-bounds: the game has no configuration event")
         agent = []
     
-        for player in filtered_df['configuration'].iloc[-1]['players']:
+        for player in events.configuration['players']:
             account_id = player['accountId']['value']
             player_id = player['playerId']['value']
             display_name = player['displayName']
@@ -296,10 +655,163 @@ class GameDataCleaner:
         agent_df = pd.DataFrame(agent)
     
         agent_df['AgentName'] = agent_df['selectedAgent'].map(GameDataCleaner.AGENT_MAP)
+        return agent_df
+    
+    @staticmethod
+    def _createPlayerPf(view):
+        # Copy the memoized player totals, which other tables of the view may use too
+        player_pf = view.player_totals.copy()
+        player_index = view.damage_columns['player_index']
+    
+        # Join Assists and TotalScore of the last snapshot by player index
+        assists = np.full(len(player_pf), np.nan)
+        total_scores = np.full(len(player_pf), np.nan)
+        matched = False
+        for player in view.snapshot['players']:
+            player_id = player['playerId']['value']
+            position = player_index.get(player_id)
+            if position is not None:
+                assists[position] = np.nan if player['assists'] is None else player['assists']
+                total_score = player['scores']['combatScore']['totalScore']
+                total_scores[position] = np.nan if total_score is None else total_score
+                matched = True
+        if matched:
+            player_pf['Assists'] = assists
+            player_pf['TotalScore'] = total_scores
     
         # Merge player performance with agent data
-        player_pf = pd.merge(player_pf, agent_df, left_on='playerID', right_on='playerId')
+        player_pf = pd.merge(player_pf, view.agent_df, left_on='playerID', right_on='playerId')
         player_pf = player_pf.drop(columns=['selectedAgent', 'playerId'], axis=1)
     
         return player_pf
 
+
+class GameView:
+    """
+    A parsed game whose tables are computed on first access and kept, so a caller pays only
+    for the tables it reads. Intermediates several tables share, like the rounds, the damage
+    columns, the last snapshot and the agents of the configuration, are tables too and are
+    computed once per game.
+
+    Tables are functions of the view registered with GameView.table and read as attributes:
+
+        @GameView.table('kills_per_round')
+        def _kills_per_round(view):
+            ...
+
+        GameView.fromJson(events).kills_per_round
+    """
+
+    # Name -> function of the view computing the table
+    tables = {}
+
+    def __init__(self, events: GameEvents):
+        self.events = events
+        self._values = {}
+
+    @staticmethod
+    def fromJson(json_data):
+        # json_data can be the loaded list of events or a stream of events from iter_gz_json
+        return GameView(GameEvents(json_data))
+
+    @staticmethod
+    def fromGz(fileobj, whole_file=True):
+        return GameView(GameEvents(iter_gz_json(fileobj, whole_file=whole_file)))
+
+    @classmethod
+    def table(cls, name):
+        """
+        Register a function of the view as the table called name.
+        """
+        def register(function):
+            cls.tables[name] = function
+            return function
+        return register
+
+    def __getattr__(self, name):
+        function = GameView.tables.get(name)
+        if function is None or name.startswith('_'):
+            raise AttributeError(f"'GameView' object has no attribute or table '{name}'")
+        if name not in self._values:
+            self._values[name] = function(self)
+        return self._values[name]
+
+    def computed(self):
+        """
+        Names of the tables computed so far.
+        """
+        return list(self._values)
+
+
+@GameView.table('rounds')
+def _rounds(view):
+    # round_numbers, start_index and end_index of the rounds, see GameDataCleaner._createRoundSegments
+    return GameDataCleaner._createRoundSegments(view.events)
+
+
+@GameView.table('team_and_round_df')
+def _team_and_round_df(view):
+    return GameDataCleaner._createTeamAndRoundDf(view.events)
+
+
+@GameView.table('team_pf')
+def _team_pf(view):
+    return view.team_and_round_df[0]
+
+
+@GameView.table('round_df')
+def _round_df(view):
+    return view.team_and_round_df[1]
+
+
+@GameView.table('damage_columns')
+def _damage_columns(view):
+    return GameDataCleaner._createDamageColumns(view.rounds, view.events)
+
+
+@GameView.table('player_totals')
+def _player_totals(view):
+    return GameDataCleaner._createPlayerTotals(view.damage_columns)
+
+
+@GameView.table('snapshot')
+def _snapshot(view):
+    return GameDataCleaner._createSnapshot(view.events)
+
+
+@GameView.table('agent_df')
+def _agent_df(view):
+    return GameDataCleaner._createAgentDf(view.events)
+
+
+@GameView.table('player_pf')
+def _player_pf(view):
+    return GameDataCleaner._createPlayerPf(view)
+
+
+@GameView.table('player_round_df')
+def _player_round_df(view):
+    """
+    Kills, deaths and damage dealt of each player in each round, grouped by the round of every
+    damage event in one pass.
+    """
+    damage_columns = view.damage_columns
+    round_numbers = view.rounds[0]
+    players = list(damage_columns['player_index'])
+    # One bin per round and player
+    bins = damage_columns['round'] * len(players) + damage_columns['causer']
+    victim_bins = damage_columns['round'] * len(players) + damage_columns['victim']
+    size = len(round_numbers) * len(players)
+    kills = np.bincount(bins[damage_columns['kill']], minlength=size)
+    deaths = np.bincount(victim_bins[damage_columns['kill']], minlength=size)
+    damage_dealt = np.bincount(bins, weights=damage_columns['amount'], minlength=size)
+    if np.issubdtype(damage_columns['amount'].dtype, np.integer):
+        damage_dealt = damage_dealt.astype(np.int64)
+    played = (np.bincount(bins, minlength=size) + np.bincount(victim_bins, minlength=size)) > 0
+    return pd.DataFrame({
+        'Round Number': np.repeat(round_numbers, len(players))[played],
+        'playerID': np.tile(np.array(players), len(round_numbers))[played],
+        'kills': kills[played],
+        'deaths': deaths[played],
+        'damage_dealt': damage_dealt[played],
+    })
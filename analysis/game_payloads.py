@@ -0,0 +1,82 @@
+import json
+import zlib
+import sqlite3
+from functools import cached_property
+
+# zlib level used for the games metadata_z/snapshot_z columns
+COMPRESSION_LEVEL = 6
+
+
+def compress_payload(value):
+    """
+    Serialize a payload to the same JSON text the games JSON columns get, then zlib-compress it.
+    """
+    return zlib.compress(json.dumps(value).encode('utf-8'), COMPRESSION_LEVEL)
+
+
+def decompress_payload(blob):
+    """
+    Inverse of compress_payload. Returns None for a NULL column.
+    """
+    if blob is None:
+        return None
+    return json.loads(zlib.decompress(blob))
+
+
+class GameEventRow:
+    """
+    A row of the games table whose metadata and snapshot are only decoded when accessed.
+
+    Rows imported with compression carry zlib blobs in metadata_z/snapshot_z, older rows
+    carry JSON text in metadata/snapshot; both are decoded lazily and cached.
+    """
+
+    COLUMNS = ('platformGameId', 'includedPauses', 'year', 'event_type', 'sequence_number', 'wall_time',
+               'metadata', 'snapshot', 'metadata_z', 'snapshot_z')
+
+    def __init__(self, platformGameId, includedPauses, year, event_type, sequence_number, wall_time,
+                 metadata, snapshot, metadata_z, snapshot_z):
+        self.platformGameId = platformGameId
+        self.includedPauses = includedPauses
+        self.year = year
+        self.event_type = event_type
+        self.sequence_number = sequence_number
+        self.wall_time = wall_time
+        self._metadata = (metadata, metadata_z)
+        self._snapshot = (snapshot, snapshot_z)
+
+    @staticmethod
+    def _decode(raw, blob):
+        if blob is not None:
+            return decompress_payload(blob)
+        if raw is None:
+            return None
+        return json.loads(raw)
+
+    @cached_property
+    def metadata(self):
+        return self._decode(*self._metadata)
+
+    @cached_property
+    def snapshot(self):
+        return self._decode(*self._snapshot)
+
+
+def fetch_game_events(cursor, platform_game_id, event_type=None):
+    """
+    Fetch the games rows of one game ordered by sequence number, optionally filtered on the
+    event_type summary column, without decoding any payload.
+
+    :param cursor: A DB-API cursor on the esports database, MySQL or a SQLite import.
+    :param platform_game_id: The platformGameId of the game.
+    :param event_type: Only return events of this type, e.g. 'snapshot'.
+    :return: List of GameEventRow.
+    """
+    placeholder = '?' if isinstance(cursor, sqlite3.Cursor) else '%s'
+    query = f"SELECT {', '.join(GameEventRow.COLUMNS)} FROM games WHERE platformGameId = {placeholder}"
+    params = [platform_game_id]
+    if event_type is not None:
+        query += f" AND event_type = {placeholder}"
+        params.append(event_type)
+    cursor.execute(query + " ORDER BY sequence_number;", params)
+    return [GameEventRow(*row) for row in cursor.fetchall()]
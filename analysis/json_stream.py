@@ -0,0 +1,348 @@
+import io
+import os
+import re
+import gzip
+import json
+from json.decoder import scanstring
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+CHUNK_SIZE = 64 * 1024
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = ' \t\n\r'
+_WHITESPACE_RE = re.compile(r'[ \t\n\r]*')
+
+
+class RawJsonObject(dict):
+    """
+    A decoded JSON object that also carries, in raw, JSON text of some of its member values: their
+    source text, or a fast re-encoding of them by orjson (see loads_keep_raw).
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.raw = {}
+
+
+def decode_object_members(text, pos=0, keep_raw=()):
+    """
+    Decode the JSON object starting at text[pos] member by member, keeping the source text of the
+    members named in keep_raw. Every value is still parsed exactly once by the C decoder, so this
+    costs about the same as json.loads while saving a json.dumps of the kept members.
+
+    :param text: The JSON text.
+    :param pos: Index of the opening brace.
+    :param keep_raw: Names of the top-level members whose raw text is kept.
+    :return: Tuple of the RawJsonObject and the index after the closing brace.
+    """
+    skip = _WHITESPACE_RE.match
+    scan = _decoder.scan_once
+    if text[pos:pos + 1] != '{':
+        raise json.JSONDecodeError("Expecting '{'", text, pos)
+    obj = RawJsonObject()
+    pos += 1
+    # Whitespace checks are inlined: this runs once per member of every game event
+    if text[pos:pos + 1] in _WHITESPACE:
+        pos = skip(text, pos).end()
+    if text[pos:pos + 1] == '}':
+        return obj, pos + 1
+    while True:
+        if text[pos:pos + 1] != '"':
+            raise json.JSONDecodeError("Expecting property name enclosed in double quotes", text, pos)
+        key, pos = scanstring(text, pos + 1)
+        if text[pos:pos + 1] != ':':
+            pos = skip(text, pos).end()
+            if text[pos:pos + 1] != ':':
+                raise json.JSONDecodeError("Expecting ':' delimiter", text, pos)
+        start = pos + 1
+        if text[start:start + 1] in _WHITESPACE:
+            start = skip(text, start).end()
+        try:
+            obj[key], pos = scan(text, start)
+        except StopIteration as err:
+            raise json.JSONDecodeError("Expecting value", text, err.value) from None
+        if key in keep_raw:
+            obj.raw[key] = text[start:pos]
+        if text[pos:pos + 1] in _WHITESPACE:
+            pos = skip(text, pos).end()
+        nextchar = text[pos:pos + 1]
+        if nextchar == ',':
+            pos += 1
+            if text[pos:pos + 1] in _WHITESPACE:
+                pos = skip(text, pos).end()
+        elif nextchar == '}':
+            return obj, pos + 1
+        else:
+            raise json.JSONDecodeError("Expecting ',' delimiter", text, pos)
+
+
+def iter_json_array(text_stream, chunk_size=CHUNK_SIZE, keep_raw=()):
+    """
+    Incrementally parse a JSON array from a text stream, yielding one element at a time.
+
+    Only the current element and at most one unread chunk are held in memory, so peak memory
+    depends on the size of the largest element rather than the size of the whole file.
+
+    :param text_stream: A file-like object returning str from read(n).
+    :param chunk_size: Number of characters read from the stream at a time.
+    :param keep_raw: Member names whose raw text is kept when elements are objects, see decode_object_members.
+    :return: Generator over the elements of the array.
+    """
+    buffer = ''
+    pos = 0
+    eof = False
+
+    def fill():
+        nonlocal buffer, pos, eof
+        chunk = text_stream.read(chunk_size)
+        if not chunk:
+            eof = True
+        buffer = buffer[pos:] + chunk
+        pos = 0
+
+    def skip(chars):
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos] in chars:
+                pos += 1
+            if pos < len(buffer) or eof:
+                return
+            fill()
+
+    def end_of_array():
+        # After ']', only whitespace may follow, like json.loads
+        nonlocal pos
+        pos += 1
+        skip(_WHITESPACE)
+        if pos < len(buffer):
+            raise json.JSONDecodeError("Extra data", buffer, pos)
+
+    skip(_WHITESPACE)
+    if pos >= len(buffer) or buffer[pos] != '[':
+        raise ValueError("Expected a JSON array at the start of the stream")
+    pos += 1
+    skip(_WHITESPACE)
+    if pos < len(buffer) and buffer[pos] == ']':
+        end_of_array()
+        return
+
+    while True:
+        # An element is expected here, after '[' or exactly one ','
+        skip(_WHITESPACE)
+        if pos >= len(buffer):
+            raise ValueError("Unterminated JSON array")
+        try:
+            if keep_raw and buffer[pos] == '{':
+                element, end = decode_object_members(buffer, pos, keep_raw)
+            else:
+                element, end = _decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            fill()
+            continue
+        # A value ending exactly at the buffer edge (e.g. a number) may continue in the next chunk
+        if end == len(buffer) and not eof:
+            fill()
+            continue
+        pos = end
+        yield element
+
+        skip(_WHITESPACE)
+        if pos >= len(buffer):
+            raise ValueError("Unterminated JSON array")
+        if buffer[pos] == ']':
+            end_of_array()
+            return
+        if buffer[pos] != ',':
+            raise json.JSONDecodeError("Expecting ',' delimiter", buffer, pos)
+        pos += 1
+
+
+# Integer literals of this many digits may not fit in 64 bits, which orjson decodes as floats.
+# Digits are folded to 0 so that runs of them are found by bytes.find rather than a regex.
+_LONG_DIGITS = b'0' * 19
+_FOLD_DIGITS = bytes.maketrans(b'123456789', b'000000000')
+
+
+def _json_loads(data):
+    """
+    Decode JSON text with the json module, bytes being UTF-8.
+    """
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        data = bytes(data).decode('utf-8')
+    return json.loads(data)
+
+
+def _has_long_integer(data):
+    folded = data.translate(_FOLD_DIGITS)
+    start = folded.find(_LONG_DIGITS)
+    while start != -1:
+        end = start + len(_LONG_DIGITS)
+        while folded[end:end + 1] == b'0':
+            end += 1
+        # Digits after a decimal point or in an exponent belong to a float, which orjson decodes like json
+        if folded[start - 1:start] not in (b'.', b'e', b'E', b'+') and folded[end:end + 1] not in (b'.', b'e', b'E'):
+            return True
+        start = folded.find(_LONG_DIGITS, end)
+    return False
+
+
+def _orjson_loads(data):
+    """
+    Decode UTF-8 JSON bytes with orjson, raising ValueError for text it would not decode exactly
+    like json: str, and integers beyond 64 bits.
+    """
+    if not isinstance(data, bytes):
+        raise ValueError("orjson decodes bytes only here")
+    if _has_long_integer(data):
+        raise ValueError("Integer literal beyond 64 bits")
+    return orjson.loads(data)
+
+
+# Decoders by name; each returns what json.loads returns, or raises ValueError for the text to be
+# decoded by _json_loads instead
+BACKENDS = {'json': _json_loads}
+if orjson is not None:
+    BACKENDS['orjson'] = _orjson_loads
+
+_backend = None
+# Returned by _fast_loads for text the backend does not decode, as None is a JSON value
+_NOT_DECODED = object()
+
+
+def set_backend(name='auto'):
+    """
+    Select the decoder used by loads, loads_keep_raw, load_gz_json and iter_gz_json with whole_file.
+
+    :param name: A name of BACKENDS, or 'auto' for orjson when it is installed and json otherwise.
+    :return: The name of the selected backend.
+    """
+    global _backend
+    if name == 'auto':
+        name = 'orjson' if 'orjson' in BACKENDS else 'json'
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown JSON backend {name!r}, expected one of {['auto'] + sorted(BACKENDS)}")
+    _backend = name
+    return name
+
+
+def get_backend():
+    return _backend
+
+
+set_backend(os.environ.get('VCT_JSON_BACKEND', 'auto'))
+
+
+def _fast_loads(data):
+    """
+    Decode with the selected backend, or return _NOT_DECODED when it does not decode data.
+    """
+    if _backend == 'json':
+        return _NOT_DECODED
+    try:
+        return BACKENDS[_backend](data)
+    except ValueError:
+        return _NOT_DECODED
+
+
+def loads(data):
+    """
+    Like json.loads, with bytes decoded as UTF-8, using the selected backend. Text the backend
+    rejects or would decode differently goes to json, so results and errors are those of json.
+
+    :param data: A JSON document as UTF-8 bytes or str.
+    """
+    value = _fast_loads(data)
+    if value is _NOT_DECODED:
+        return _json_loads(data)
+    return value
+
+
+def iter_gz_json(fileobj, chunk_size=CHUNK_SIZE, keep_raw=(), whole_file=False, close=False):
+    """
+    Yield the elements of a gzipped JSON array read from a binary file-like object,
+    such as an open file, an S3 StreamingBody or a requests raw response.
+
+    By default the array is streamed by iter_json_array with the json module, so memory is bounded
+    by the largest element. With whole_file, the file is decompressed and decoded at once with the
+    selected backend (see loads and loads_keep_raw), which is faster with orjson but holds the whole
+    body and every element in memory.
+
+    GzipFile leaves fileobj open; with close, fileobj is closed once the elements are read or the
+    generator is closed, for objects opened just for this call, such as the ones of a source's open().
+    """
+    try:
+        with gzip.GzipFile(fileobj=fileobj) as gz:
+            if whole_file:
+                body = gz.read()
+                elements = loads_keep_raw(body, keep_raw) if keep_raw else loads(body)
+                if not isinstance(elements, list):
+                    raise ValueError("Expected a JSON array at the start of the stream")
+                yield from elements
+                return
+            text_stream = io.TextIOWrapper(gz, encoding='utf-8')
+            yield from iter_json_array(text_stream, chunk_size=chunk_size, keep_raw=keep_raw)
+    finally:
+        if close:
+            fileobj.close()
+
+
+def _keep_encoded(value, keep_raw):
+    """
+    Wrap a decoded object in a RawJsonObject whose raw members are orjson's encoding of their values.
+    """
+    obj = RawJsonObject(value)
+    for name in keep_raw:
+        if name in obj:
+            obj.raw[name] = orjson.dumps(obj[name]).decode('utf-8')
+    return obj
+
+
+def loads_keep_raw(data, keep_raw):
+    """
+    Like json.loads, but objects at the top level or directly inside a top-level array are
+    RawJsonObjects keeping JSON text of the members named in keep_raw.
+
+    With the orjson backend and bytes, this is a fast re-encode, not a passthrough of the source:
+    orjson decodes the whole document and the kept text is orjson's compact encoding of each value,
+    the same JSON value as json.dumps gives, produced in C. Text orjson does not decode exactly like
+    json, and every document with the json backend, is decoded member by member by the json module,
+    keeping the source text, which is slower than decoding it whole and re-encoding with json.dumps
+    (see infra/db/importer/bench_payloads.py).
+
+    :param data: A JSON document as UTF-8 bytes or str.
+    :param keep_raw: Names of the members whose raw text is kept.
+    """
+    if _backend == 'orjson' and isinstance(data, bytes):
+        value = _fast_loads(data)
+        if isinstance(value, list):
+            return [_keep_encoded(element, keep_raw) if isinstance(element, dict) else element
+                    for element in value]
+        if isinstance(value, dict):
+            return _keep_encoded(value, keep_raw)
+        if value is not _NOT_DECODED:
+            return value
+    text = data.decode('utf-8') if isinstance(data, bytes) else data
+    pos = _WHITESPACE_RE.match(text).end()
+    if text.startswith('[', pos):
+        return list(iter_json_array(io.StringIO(text), chunk_size=max(len(text), 1), keep_raw=keep_raw))
+    if text.startswith('{', pos):
+        obj, end = decode_object_members(text, pos, keep_raw)
+        end = _WHITESPACE_RE.match(text, end).end()
+        if end != len(text):
+            raise json.JSONDecodeError("Extra data", text, end)
+        return obj
+    return json.loads(text)
+
+
+def load_gz_json(fileobj):
+    """
+    Load a whole gzipped JSON document (array or object) from a binary file-like object.
+    """
+    with gzip.GzipFile(fileobj=fileobj) as gz:
+        return loads(gz.read())
@@ -0,0 +1,198 @@
+import io
+import os
+import sys
+import json
+import mmap
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+from botocore import UNSIGNED
+from botocore.config import Config
+
+BUCKET_NAME = 'vcthackathon-data'
+REGION = 'us-west-2'
+
+# Index of a mirror directory: key -> ETag and Size of the object it was copied from
+MIRROR_INDEX = '.mirror-index.json'
+
+
+class S3Source:
+    """
+    Objects of an S3 bucket, read anonymously unless a client is passed in.
+    """
+
+    def __init__(self, bucket_name=BUCKET_NAME, client=None):
+        self.bucket_name = bucket_name
+        self.client = client or boto3.client('s3', region_name=REGION, config=Config(signature_version=UNSIGNED))
+
+    def __getstate__(self):
+        # boto3 clients can't be pickled: a copy sent to a worker process reads anonymously with a client of its own
+        return {'bucket_name': self.bucket_name}
+
+    def __setstate__(self, state):
+        self.__init__(state['bucket_name'])
+
+    def list(self, prefix=''):
+        """
+        Yield the objects under prefix as dicts with Key, Size and ETag, like list_objects_v2.
+        """
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket_name, Prefix=prefix):
+            for obj in page.get('Contents', []):
+                yield obj
+
+    def head(self, key):
+        """
+        Return the Key, Size and ETag of one object, as list would, without downloading it.
+        """
+        response = self.client.head_object(Bucket=self.bucket_name, Key=key)
+        return {'Key': key, 'Size': response['ContentLength'], 'ETag': response['ETag']}
+
+    def get(self, key):
+        return self.open(key).read()
+
+    def open(self, key):
+        """
+        Return a binary file-like object streaming the object body.
+        """
+        return self.client.get_object(Bucket=self.bucket_name, Key=key)['Body']
+
+
+class LocalSource:
+    """
+    Objects mirrored to a local directory, one file per key. Files are read through mmap, so
+    repeated runs read straight from the page cache.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        index_path = os.path.join(root, MIRROR_INDEX)
+        self.index = {}
+        if os.path.exists(index_path):
+            with open(index_path) as f:
+                self.index = json.load(f)
+
+    def path(self, key):
+        return os.path.join(self.root, *key.split('/'))
+
+    def list(self, prefix=''):
+        """
+        Yield the files under prefix in key order. ETag and Size come from the mirror index when the
+        file was mirrored from a bucket, so the import manifest sees the same objects either way.
+        """
+        keys = []
+        for directory, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                key = os.path.relpath(os.path.join(directory, filename), self.root).replace(os.sep, '/')
+                if key != MIRROR_INDEX and key.startswith(prefix):
+                    keys.append(key)
+        for key in sorted(keys):
+            yield self.head(key)
+
+    def head(self, key):
+        """
+        Return the Key, Size and ETag of one file, as list would, from its stat and the mirror index.
+        """
+        stat = os.stat(self.path(key))
+        entry = self.index.get(key)
+        if entry is not None and entry['Size'] == stat.st_size:
+            return {'Key': key, 'Size': stat.st_size, 'ETag': entry['ETag']}
+        return {'Key': key, 'Size': stat.st_size, 'ETag': f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'}
+
+    def get(self, key):
+        f = self.open(key)
+        try:
+            return f.read()
+        finally:
+            f.close()
+
+    def open(self, key):
+        """
+        Return the file memory-mapped read-only. An mmap supports read(), seek() and tell(),
+        so it can be handed to gzip.GzipFile directly. The caller closes it, e.g. with a with
+        statement or iter_gz_json's close, which unmaps the file.
+        """
+        with open(self.path(key), 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return io.BytesIO()
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class MemorySource:
+    """
+    Objects held in a dict of key -> bytes, for tests and benchmarks.
+    """
+
+    def __init__(self, objects=None):
+        self.objects = dict(objects or {})
+
+    def list(self, prefix=''):
+        for key in sorted(self.objects):
+            if key.startswith(prefix):
+                yield self.head(key)
+
+    def head(self, key):
+        body = self.objects[key]
+        return {'Key': key, 'Size': len(body), 'ETag': f'"{hashlib.md5(body).hexdigest()}"'}
+
+    def get(self, key):
+        return self.objects[key]
+
+    def open(self, key):
+        return io.BytesIO(self.objects[key])
+
+
+def open_source(location):
+    """
+    Open an object source from a location: 's3://<bucket>', 'memory://' or a local mirror directory.
+    """
+    if location.startswith('s3://'):
+        return S3Source(location[len('s3://'):].strip('/') or BUCKET_NAME)
+    if location == 'memory://':
+        return MemorySource()
+    return LocalSource(location)
+
+
+def mirror(source, root, prefix='', workers=16):
+    """
+    Copy the objects under prefix from a source to a local directory readable with LocalSource.
+    Objects whose ETag and size match the previous mirror are skipped.
+
+    :param source: The source to copy from, typically an S3Source.
+    :param root: The mirror directory.
+    :param prefix: Only copy keys starting with this prefix.
+    :param workers: Number of objects downloaded at once.
+    :return: Number of objects copied.
+    """
+    local = LocalSource(root)
+    index = dict(local.index)
+    pending = [obj for obj in source.list(prefix)
+               if index.get(obj['Key']) != {'ETag': obj['ETag'], 'Size': obj['Size']}
+               or not os.path.exists(local.path(obj['Key']))]
+
+    def copy(obj):
+        path = local.path(obj['Key'])
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + '.part', 'wb') as f:
+            f.write(source.get(obj['Key']))
+        os.replace(path + '.part', path)
+        return obj
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for obj in executor.map(copy, pending):
+            index[obj['Key']] = {'ETag': obj['ETag'], 'Size': obj['Size']}
+            print(f"Mirrored {obj['Key']}")
+
+    with open(os.path.join(root, MIRROR_INDEX), 'w') as f:
+        json.dump(index, f, indent=1, sort_keys=True)
+    return len(pending)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("Usage: python object_sources.py <mirror_dir> [prefix] [bucket]")
+        sys.exit(1)
+    copied = mirror(S3Source(sys.argv[3] if len(sys.argv) > 3 else BUCKET_NAME), sys.argv[1],
+                    prefix=sys.argv[2] if len(sys.argv) > 2 else '')
+    print(f"Mirrored {copied} objects to {sys.argv[1]}")
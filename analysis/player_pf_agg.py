@@ -1,20 +1,26 @@
 import boto3
 from botocore import UNSIGNED
 from botocore.config import Config
-import requests
 import gzip
+import os
 import json
+import sqlite3
 from io import BytesIO
 import pandas as pd
-from game_cleaning import GameDataCleaner  # Assuming GameDataCleaner is in a module
+from json_stream import iter_gz_json
+from object_sources import S3Source, LocalSource
+from game_cleaning import GameView
 from agg import PlayerPerformanceAggregator
 
 # Set up S3 client with unsigned configuration for public access
 s3 = boto3.client('s3', config=Config(signature_version=UNSIGNED), region_name='us-west-2')
 
-# Define the bucket name and S3 bucket URL
+# Define the bucket name
 bucket_name = 'vcthackathon-data'
-S3_BUCKET_URL = "https://vcthackathon-data.s3.us-west-2.amazonaws.com"
+
+# Read from a local mirror of the bucket (python object_sources.py <dir>) when VCT_DATA_DIR is set
+data_dir = os.environ.get('VCT_DATA_DIR')
+source = LocalSource(data_dir) if data_dir else S3Source(bucket_name, client=s3)
 
 # Specify the league and year to explore
 LEAGUE = "vct-international"
@@ -23,16 +29,11 @@ YEAR = 2024
 
 def list_s3_objects(prefix=''):
     """
-    List objects in an S3 bucket given a prefix.
+    List objects in the data source given a prefix.
     """
     try:
-        # List objects with the specified prefix
-        response = s3.list_objects_v2(Bucket=bucket_name, Prefix=prefix)
-        files = []
-        if 'Contents' in response:
-            for obj in response['Contents']:
-                files.append(obj['Key'])
-        else:
+        files = [obj['Key'] for obj in source.list(prefix)]
+        if not files:
             print("No objects found with the given prefix.")
         return files
     except Exception as e:
@@ -41,21 +42,16 @@ def list_s3_objects(prefix=''):
 
 def load_gz_file_from_s3(file_path):
     """
-    Load a gzipped file from S3 and decompress it in memory.
+    Load a gzipped file from the data source and decode it with the selected JSON backend.
     
-    :param file_path: The path of the file in the S3 bucket.
-    :return: JSON data of the decompressed file.
+    :param file_path: The key of the file in the bucket.
+    :return: Generator over the events of the decompressed file.
     """
-    file_url = f"{S3_BUCKET_URL}/{file_path}"
-    response = requests.get(file_url, stream=True)
-    
-    if response.status_code == 200:
-        # Decompress the gzipped file in memory
-        with gzip.GzipFile(fileobj=BytesIO(response.content)) as gzipped_file:
-            json_data = json.loads(gzipped_file.read().decode('utf-8'))
-        return json_data
-    else:
-        print(f"Failed to load {file_path}. Status code: {response.status_code}")
+    try:
+        # One game fits in memory, and decoding it whole is faster than streaming
+        return iter_gz_json(source.open(file_path), whole_file=True, close=True)
+    except Exception as e:
+        print(f"Failed to load {file_path}: {e}")
         return None
 
 # Prefix for the S3 path
@@ -70,8 +66,12 @@ excluded_files = [
     'vct-international/esports-data/tournaments.json.gz'
 ]
 
+# With VCT_DB_PATH pointing at a SQLite import (IMPORT_SINK=sqlite), aggregate the games the importer
+# published since the last run instead of downloading and cleaning game files
+db_path = os.environ.get('VCT_DB_PATH')
+
 # Get the list of JSON files from S3 (excluding unwanted files)
-game_json_files = list_s3_objects(prefix)
+game_json_files = [] if db_path else list_s3_objects(prefix)
 
 # Filter out the excluded files from game_json_files
 filtered_game_json_files = [file for file in game_json_files if file not in excluded_files]
@@ -82,16 +82,20 @@ aggregator = PlayerPerformanceAggregator()
 # Define the number of files to process (first 10 valid game files)
 num_files_to_process = 10
 
+if db_path:
+    conn = sqlite3.connect(db_path)
+    aggregator.aggregate_changes(conn.cursor())
+    conn.close()
 # Loop over the filtered game JSON files, processing the first 10
-if filtered_game_json_files:
+elif filtered_game_json_files:
     # Ensure you don't exceed the number of available files
     for i in range(min(num_files_to_process, len(filtered_game_json_files))):
         # Load each game file from S3
         json_data = load_gz_file_from_s3(filtered_game_json_files[i])
 
         if json_data:
-            # Pass the loaded JSON data to GameDataCleaner
-            team_pf, round_df, player_pf = GameDataCleaner.genGameDataFromJson(json_data)
+            # Only player performance is aggregated, so only player_pf of the game is computed
+            player_pf = GameView.fromJson(json_data).player_pf
 
             # Aggregate the player performance data
             aggregator.aggregate_player_data(player_pf)
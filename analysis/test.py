@@ -1,11 +1,12 @@
 import boto3
 from botocore import UNSIGNED
 from botocore.config import Config
-import requests
 import gzip
 import json
 from io import BytesIO
 import pandas as pd
+from json_stream import iter_gz_json
+from object_sources import S3Source, LocalSource
 from game_cleaning import GameDataCleaner  # Assuming GameDataCleaner is in a module
 from agg import PlayerPerformanceAggregator
 import os
@@ -13,9 +14,12 @@ import os
 # Set up S3 client with unsigned configuration for public access
 s3 = boto3.client('s3', config=Config(signature_version=UNSIGNED), region_name='us-west-2')
 
-# Define the bucket name and S3 bucket URL
+# Define the bucket name
 bucket_name = 'vcthackathon-data'
-S3_BUCKET_URL = "https://vcthackathon-data.s3.us-west-2.amazonaws.com"
+
+# Read from a local mirror of the bucket (python object_sources.py <dir>) when VCT_DATA_DIR is set
+data_dir = os.environ.get('VCT_DATA_DIR')
+source = LocalSource(data_dir) if data_dir else S3Source(bucket_name, client=s3)
 
 # Specify the league and year to explore
 LEAGUE = "vct-international"
@@ -24,16 +28,11 @@ YEAR = 2024
 
 def list_s3_objects(prefix=''):
     """
-    List objects in an S3 bucket given a prefix.
+    List objects in the data source given a prefix.
     """
     try:
-        # List objects with the specified prefix
-        response = s3.list_objects_v2(Bucket=bucket_name, Prefix=prefix)
-        files = []
-        if 'Contents' in response:
-            for obj in response['Contents']:
-                files.append(obj['Key'])
-        else:
+        files = [obj['Key'] for obj in source.list(prefix)]
+        if not files:
             print("No objects found with the given prefix.")
         return files
     except Exception as e:
@@ -42,29 +41,21 @@ def list_s3_objects(prefix=''):
 
 def load_gz_file_from_s3(file_path):
     """
-    Load a gzipped file from S3 and decompress it in memory.
+    Load a gzipped file from the data source and decode it with the selected JSON backend.
     
-    :param file_path: The path of the file in the S3 bucket.
-    :return: JSON data of the decompressed file.
+    :param file_path: The key of the file in the bucket.
+    :return: Generator over the events of the decompressed file.
     """
-    file_url = f"{S3_BUCKET_URL}/{file_path}"
-    response = requests.get(file_url, stream=True)
-    
-    if response.status_code == 200:
-        # Decompress the gzipped file in memory
-        with gzip.GzipFile(fileobj=BytesIO(response.content)) as gzipped_file:
-            json_data = json.loads(gzipped_file.read().decode('utf-8'))
-        return json_data
-    else:
-        print(f"Failed to load {file_path}. Status code: {response.status_code}")
+    try:
+        # One game fits in memory, and decoding it whole is faster than streaming
+        return iter_gz_json(source.open(file_path), whole_file=True, close=True)
+    except Exception as e:
+        print(f"Failed to load {file_path}: {e}")
         return None
 
 # Prefix for the S3 path
 prefix = f'{LEAGUE}/'
 
-# Get the list of JSON files from S3 (excluding unwanted files)
-game_json_files = list_s3_objects(prefix)
-
 # Function to read the last processed batch from the log file
 def read_last_processed_batch(log_file='progress_log.txt'):
     if os.path.exists(log_file):
@@ -82,21 +73,19 @@ def write_last_processed_batch(batch_number, log_file='progress_log.txt'):
 # Function to process a batch of files
 def process_batch(batch_files, batch_number, total_files):
     try:
-        for i, game_file in enumerate(batch_files, start=batch_number * batch_size + 1):
-            # Load each game file from S3
-            json_data = load_gz_file_from_s3(game_file)
-
-            if json_data:
-                # Pass the loaded JSON data to GameDataCleaner
-                team_pf, round_df, player_pf = GameDataCleaner.genGameDataFromJson(json_data)
-
-                # Skip if the game is a draw (team_pf, round_df, player_pf are None)
-                if team_pf is None and round_df is None and player_pf is None:
-                    print(f"Skipped game file {game_file} due to a draw.")
-                    continue  # Skip to the next file
-                
-                # Aggregate the player performance data
-                aggregator.aggregate_player_data(player_pf)
+        # Clean the games of the batch in parallel across a process pool, in file order
+        games = GameDataCleaner.iterGameDataFromMany(batch_files, source=source, chunksize=1)
+        for position, platform_game_id, team_pf, round_df, player_pf in games:
+            i = batch_number * batch_size + position + 1
+            game_file = batch_files[position]
+
+            # Skip if the game is a draw (team_pf, round_df, player_pf are None)
+            if team_pf is None and round_df is None and player_pf is None:
+                print(f"Skipped game file {game_file} due to a draw.")
+                continue  # Skip to the next file
+
+            # Aggregate the player performance data
+            aggregator.aggregate_player_data(player_pf)
 
             print(f"Processed file {i}/{total_files}: {game_file}")
         
@@ -124,28 +113,34 @@ excluded_files = [
     'vct-international/esports-data/tournaments.json.gz'
 ]
 
-# Filter out the excluded files from game_json_files
-filtered_game_json_files = [file for file in game_json_files if file not in excluded_files]
-
-# Create an instance of PlayerPerformanceAggregator
-aggregator = PlayerPerformanceAggregator()
-
 # Batch size for processing
 batch_size = 50
-total_files = len(filtered_game_json_files)
 
-# Read the last successfully processed batch from the log file
-last_processed_batch = read_last_processed_batch()
+# List, filter and process the game files in batches only when run as a script, so importing this
+# module (as the worker processes cleaning the games do) doesn't list the bucket
+if __name__ == '__main__':
+    # Get the list of JSON files from S3 (excluding unwanted files)
+    game_json_files = list_s3_objects(prefix)
 
-# Loop over the filtered game JSON files in batches, resuming from the last successful batch
-if filtered_game_json_files:
-    for batch_number in range(last_processed_batch, (total_files + batch_size - 1) // batch_size):
-        batch_start = batch_number * batch_size
-        batch_end = min(batch_start + batch_size, total_files)
-        current_batch = filtered_game_json_files[batch_start:batch_end]
-        
-        # Process the current batch
-        process_batch(current_batch, batch_number, total_files)
-else:
-    print("No valid game JSON files found.")
+    # Filter out the excluded files from game_json_files
+    filtered_game_json_files = [file for file in game_json_files if file not in excluded_files]
+
+    # Create an instance of PlayerPerformanceAggregator
+    aggregator = PlayerPerformanceAggregator()
 
+    total_files = len(filtered_game_json_files)
+
+    # Read the last successfully processed batch from the log file
+    last_processed_batch = read_last_processed_batch()
+
+    # Loop over the filtered game JSON files in batches, resuming from the last successful batch
+    if filtered_game_json_files:
+        for batch_number in range(last_processed_batch, (total_files + batch_size - 1) // batch_size):
+            batch_start = batch_number * batch_size
+            batch_end = min(batch_start + batch_size, total_files)
+            current_batch = filtered_game_json_files[batch_start:batch_end]
+        
+            # Process the current batch
+            process_batch(current_batch, batch_number, total_files)
+    else:
+        print("No valid game JSON files found.")
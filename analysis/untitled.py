@@ -1,19 +1,24 @@
 import boto3
 from botocore import UNSIGNED
 from botocore.config import Config
-import requests
 import gzip
+import os
 import json
 from io import BytesIO
 import pandas as pd
+from json_stream import iter_gz_json
+from object_sources import S3Source, LocalSource
 from game_cleaning import GameDataCleaner  # Assuming GameDataCleaner is in a module
 
 # Set up S3 client with unsigned configuration for public access
 s3 = boto3.client('s3', config=Config(signature_version=UNSIGNED), region_name='us-west-2')
 
-# Define the bucket name and S3 bucket URL
+# Define the bucket name
 bucket_name = 'vcthackathon-data'
-S3_BUCKET_URL = "https://vcthackathon-data.s3.us-west-2.amazonaws.com"
+
+# Read from a local mirror of the bucket (python object_sources.py <dir>) when VCT_DATA_DIR is set
+data_dir = os.environ.get('VCT_DATA_DIR')
+source = LocalSource(data_dir) if data_dir else S3Source(bucket_name, client=s3)
 
 # Specify the league and year to explore
 LEAGUE = "vct-international"
@@ -21,16 +26,11 @@ YEAR = 2024
 
 def list_s3_objects(prefix=''):
     """
-    List objects in an S3 bucket given a prefix.
+    List objects in the data source given a prefix.
     """
     try:
-        # List objects with the specified prefix
-        response = s3.list_objects_v2(Bucket=bucket_name, Prefix=prefix)
-        files = []
-        if 'Contents' in response:
-            for obj in response['Contents']:
-                files.append(obj['Key'])
-        else:
+        files = [obj['Key'] for obj in source.list(prefix)]
+        if not files:
             print("No objects found with the given prefix.")
         return files
     except Exception as e:
@@ -39,21 +39,16 @@ def list_s3_objects(prefix=''):
 
 def load_gz_file_from_s3(file_path):
     """
-    Load a gzipped file from S3 and decompress it in memory.
+    Load a gzipped file from the data source and decode it with the selected JSON backend.
     
-    :param file_path: The path of the file in the S3 bucket.
-    :return: JSON data of the decompressed file.
+    :param file_path: The key of the file in the bucket.
+    :return: Generator over the events of the decompressed file.
     """
-    file_url = f"{S3_BUCKET_URL}/{file_path}"
-    response = requests.get(file_url, stream=True)
-    
-    if response.status_code == 200:
-        # Decompress the gzipped file in memory
-        with gzip.GzipFile(fileobj=BytesIO(response.content)) as gzipped_file:
-            json_data = json.loads(gzipped_file.read().decode('utf-8'))
-        return json_data
-    else:
-        print(f"Failed to load {file_path}. Status code: {response.status_code}")
+    try:
+        # One game fits in memory, and decoding it whole is faster than streaming
+        return iter_gz_json(source.open(file_path), whole_file=True, close=True)
+    except Exception as e:
+        print(f"Failed to load {file_path}: {e}")
         return None
 
 # Prefix for the S3 path
@@ -0,0 +1,99 @@
+import io
+import os
+import sys
+import gzip
+import json
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..', 'analysis'))
+from game_payloads import compress_payload, decompress_payload
+from json_stream import get_backend, iter_json_array, loads, loads_keep_raw
+
+PAYLOAD_MEMBERS = ('metadata', 'snapshot')
+
+def _best(function, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return best
+
+def _dump_payloads(event):
+    return json.dumps(event.get('metadata')), json.dumps(event.get('snapshot'))
+
+def bench_file(path):
+    """
+    Measures, for every event of a local game file, the size of the metadata and snapshot
+    payloads as JSON text and compressed, and the time to decode each form.
+    """
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        text = f.read()
+    events = json.loads(text)
+
+    # Importer cost of the games JSON columns, re-encoding the dicts with json.dumps or passing them through:
+    # streamed like the writers read game files, where the source text is kept, and decoded whole with the
+    # JSON backend, where orjson re-encodes the members instead (see loads_keep_raw)
+    body = text.encode('utf-8')
+    stream_reencode_seconds = _best(lambda: [_dump_payloads(event) for event in iter_json_array(io.StringIO(text))])
+    stream_passthrough_seconds = _best(lambda: list(iter_json_array(io.StringIO(text), keep_raw=PAYLOAD_MEMBERS)))
+    whole_reencode_seconds = _best(lambda: [_dump_payloads(event) for event in loads(body)])
+    whole_passthrough_seconds = _best(lambda: loads_keep_raw(body, PAYLOAD_MEMBERS))
+
+    payloads = [value for event in events for value in (event.get('metadata'), event.get('snapshot'))]
+
+    json_texts = [json.dumps(value) for value in payloads]
+    start = time.perf_counter()
+    blobs = [compress_payload(value) for value in payloads]
+    compress_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for text in json_texts:
+        json.loads(text)
+    json_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for blob in blobs:
+        decompress_payload(blob)
+    zlib_seconds = time.perf_counter() - start
+
+    return {
+        'events': len(events),
+        'json_bytes': sum(len(text.encode('utf-8')) for text in json_texts),
+        'zlib_bytes': sum(len(blob) for blob in blobs),
+        'compress_seconds': compress_seconds,
+        'json_decode_seconds': json_seconds,
+        'zlib_decode_seconds': zlib_seconds,
+        'stream_reencode_seconds': stream_reencode_seconds,
+        'stream_passthrough_seconds': stream_passthrough_seconds,
+        'whole_reencode_seconds': whole_reencode_seconds,
+        'whole_passthrough_seconds': whole_passthrough_seconds,
+    }
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python bench_payloads.py <game.json.gz> [<game.json.gz> ...]")
+        sys.exit(1)
+
+    totals = {}
+    for path in sys.argv[1:]:
+        result = bench_file(path)
+        for name, value in result.items():
+            totals[name] = totals.get(name, 0) + value
+        print(f"{path}: {result['json_bytes']} -> {result['zlib_bytes']} bytes")
+
+    print(f"events: {totals['events']}")
+    print(f"JSON payload bytes: {totals['json_bytes']}")
+    print(f"zlib payload bytes: {totals['zlib_bytes']} ({totals['zlib_bytes'] / totals['json_bytes']:.1%} of JSON)")
+    print(f"compress: {totals['compress_seconds']:.3f}s")
+    print(f"decode JSON text: {totals['json_decode_seconds']:.3f}s")
+    print(f"decode zlib blob: {totals['zlib_decode_seconds']:.3f}s")
+    print(f"JSON backend: {get_backend()}")
+    print(f"import streamed + json.dumps: {totals['stream_reencode_seconds']:.3f}s")
+    print(f"import streamed keeping the source text: {totals['stream_passthrough_seconds']:.3f}s")
+    print(f"import whole + json.dumps: {totals['whole_reencode_seconds']:.3f}s")
+    print(f"import whole keeping the backend's re-encoding: {totals['whole_passthrough_seconds']:.3f}s")
+
+if __name__ == '__main__':
+    main()
@@ -1,14 +1,40 @@
 import os
+import sys
 import time
+import logging
 import gzip
 import json
+import zlib
+import queue
+import sqlite3
+import hashlib
+import tempfile
+import contextlib
+import threading
 import mysql.connector
-from io import BytesIO
+from io import BytesIO, StringIO
+from collections import deque
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 from botocore import UNSIGNED
 from botocore.client import Config
 import boto3
 
+# Loaders shared with the analysis code live in analysis/; the docker image copies them next to this file
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..', 'analysis'))
+from json_stream import get_backend, iter_gz_json, loads, loads_keep_raw
+from object_sources import S3Source, LocalSource
+from game_payloads import compress_payload
+from game_cleaning import GameDataCleaner, GameEvents
+from change_feed import consume, latest_change_id, save_offset
+from validation import (ValidationError, validate_record, validate_event, check_game_events,
+                        validated_game_events, event_type_of)
+from telemetry import (STAGE_SECONDS, FETCHED_BYTES, OBJECTS, ROWS, ERRORS, QUEUE_DEPTH, WRITER_LIMIT,
+                       StructuredLogger, start_metrics_server)
+
+log = StructuredLogger('importer')
+
 def connect_db(retries=5, delay=5):
     for attempt in range(retries):
         try:
@@ -18,20 +44,233 @@ def connect_db(retries=5, delay=5):
                 database=os.environ['DATABASE_NAME'],
                 user=os.environ['DATABASE_USER'],
                 password=os.environ['DATABASE_PASSWORD'],
-                auth_plugin='mysql_native_password'
+                auth_plugin='mysql_native_password',
+                allow_local_infile=True
             )
-            print("Connected to MySQL")
+            log.info("Connected to MySQL")
             return conn
         except mysql.connector.Error as e:
-            print(f"Connection failed: {e}")
+            log.warning("Connection failed", error=str(e), attempt=attempt + 1)
             if attempt < retries - 1:
-                print(f"Retrying in {delay} seconds...")
+                log.info("Retrying connection", delay=delay)
                 time.sleep(delay)
             else:
-                print("Exceeded maximum retries. Exiting.")
+                log.error("Exceeded maximum retries. Exiting.")
                 raise
 
-def create_tables(cursor):
+class ConnectionPool:
+    """
+    A fixed set of MySQL connections opened with connect_db, so they keep its retry behaviour.
+    Connections that are returned broken are replaced. connect can be swapped for a stand-in in tests.
+    """
+
+    def __init__(self, size, connect=connect_db):
+        self.connect = connect
+        self.connections = queue.LifoQueue()
+        for _ in range(size):
+            self.connections.put(connect())
+
+    def get(self):
+        return self.connections.get()
+
+    def put(self, conn):
+        try:
+            alive = conn.is_connected() if hasattr(conn, 'is_connected') else True
+        except Exception:
+            alive = False
+        self.connections.put(conn if alive else self.connect())
+
+    def close(self):
+        while not self.connections.empty():
+            self.connections.get().close()
+
+# MySQL error codes for a deadlock and a lock wait timeout, both safe to retry
+RETRYABLE_ERRORS = (1213, 1205)
+
+def is_retryable(error):
+    return isinstance(error, mysql.connector.Error) and error.errno in RETRYABLE_ERRORS
+
+class WriterLimiter:
+    """
+    Caps how many writers may run a transaction at the same time and adapts the cap.
+
+    The cap is halved on every deadlock or lock wait timeout. Otherwise, after each window of
+    commits it goes down by one when the median commit latency is above target_latency seconds
+    and up by one when it is below.
+    """
+
+    def __init__(self, max_writers, min_writers=1, target_latency=2.0, window=20):
+        self.max_writers = max_writers
+        self.min_writers = min_writers
+        self.target_latency = target_latency
+        self.limit = max_writers
+        self.active = 0
+        self.latencies = deque(maxlen=window)
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        with self.condition:
+            while self.active >= self.limit:
+                self.condition.wait()
+            self.active += 1
+
+    def release(self, latency=None, retryable_error=False):
+        with self.condition:
+            self.active -= 1
+            previous = self.limit
+            if retryable_error:
+                self.limit = max(self.min_writers, self.limit // 2)
+                self.latencies.clear()
+            elif latency is not None:
+                self.latencies.append(latency)
+                if len(self.latencies) == self.latencies.maxlen:
+                    median = sorted(self.latencies)[len(self.latencies) // 2]
+                    if median > self.target_latency:
+                        self.limit = max(self.min_writers, self.limit - 1)
+                    else:
+                        self.limit = min(self.max_writers, self.limit + 1)
+                    self.latencies.clear()
+            WRITER_LIMIT.set(self.limit)
+            if self.limit != previous:
+                log.info("Writer concurrency changed", previous=previous, limit=self.limit)
+            self.condition.notify_all()
+
+# Secondary indexes per table as (name, definition). create_tables adds them after the
+# tables exist, so a bulk load can skip them and build them once at the end.
+SECONDARY_INDEXES = {
+    'games': [
+        ('idx_platformGameId', 'INDEX idx_platformGameId (platformGameId)'),
+        # Unique keys of a partitioned table must contain the partitioning column
+        ('uniq_platformGameId_includedPauses_year',
+         'UNIQUE KEY uniq_platformGameId_includedPauses_year (platformGameId, includedPauses, year)'),
+        ('idx_year_event_type', 'INDEX idx_year_event_type (year, event_type, platformGameId)'),
+        ('idx_year_wall_time', 'INDEX idx_year_wall_time (year, wall_time, platformGameId)'),
+        ('idx_game_id', 'INDEX idx_game_id (game_id)'),
+        ('idx_stage', 'INDEX idx_stage (stage, year)'),
+    ],
+    'game_events': [
+        ('idx_game_round', 'INDEX idx_game_round (platformGameId, round_number)'),
+        ('idx_event_type', 'INDEX idx_event_type (event_type)'),
+        ('idx_year_event_type', 'INDEX idx_year_event_type (year, event_type, platformGameId)'),
+    ],
+    'mapping_data_v2': [
+        ('idx_tournament', 'INDEX idx_tournament (tournamentId, platformGameId)'),
+        ('idx_updated_at', 'INDEX idx_updated_at (updated_at)'),
+    ],
+    'damage_events': [
+        ('idx_game_round', 'INDEX idx_game_round (platformGameId, round_number)'),
+        ('idx_causer', 'INDEX idx_causer (causer_id)'),
+        ('idx_victim', 'INDEX idx_victim (victim_id)'),
+    ],
+    'round_events': [
+        ('idx_game_round', 'INDEX idx_game_round (platformGameId, round_number)'),
+    ],
+    'player_snapshots': [
+        ('idx_game_round', 'INDEX idx_game_round (platformGameId, round_number)'),
+        ('idx_player', 'INDEX idx_player (player_id)'),
+    ],
+    'player_game_totals': [
+        ('idx_team_year', 'INDEX idx_team_year (team_id, year)'),
+    ],
+}
+
+# Columns added to tables after they were first released, as (name, definition).
+# create_tables adds the missing ones to existing tables as well as new ones.
+ADDED_COLUMNS = {
+    'games': [
+        ('event_type', 'VARCHAR(50)'),
+        ('sequence_number', 'BIGINT'),
+        ('wall_time', 'DATETIME'),
+        ('metadata_z', 'LONGBLOB'),
+        ('snapshot_z', 'LONGBLOB'),
+        # Generated from the metadata JSON, NULL for rows stored compressed
+        ('game_id', "VARCHAR(100) AS (metadata->>'$.gameId.value') VIRTUAL"),
+        ('stage', "VARCHAR(50) AS (metadata->>'$.stage') VIRTUAL"),
+    ],
+    'player_game_totals': [
+        # Esports team of the player in that game, from the game's configuration and teamMapping
+        ('team_id', 'VARCHAR(50)'),
+    ],
+    'mapping_data_v2': [
+        # Set by MySQL when an upsert changes the row, so the rollup refresh only checks changed mappings
+        ('updated_at', 'DATETIME(6) DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6)'),
+    ],
+}
+
+# Tables partitioned by year, with their primary key. MySQL requires the partitioning
+# column in every unique key, so year is part of each primary key.
+PARTITIONED_TABLES = {
+    'games': ('id', 'year'),
+    'game_events': ('platformGameId', 'event_index', 'year'),
+    'damage_events': ('platformGameId', 'event_index', 'year'),
+    'round_events': ('platformGameId', 'event_index', 'year'),
+    'player_snapshots': ('platformGameId', 'event_index', 'player_id', 'year'),
+}
+
+# One partition per year of data from FIRST_PARTITION_YEAR; tables are created up to the current
+# year and add_year_partitions splits later years out of p_future as their game files arrive
+FIRST_PARTITION_YEAR = 2021
+
+def partition_years(years=()):
+    """
+    Returns the years that get a partition: FIRST_PARTITION_YEAR up to the current year or the latest of years.
+    """
+    return range(FIRST_PARTITION_YEAR, max([datetime.now().year, *years]) + 1)
+
+def _partition(year):
+    return f"PARTITION p{year} VALUES LESS THAN ({year + 1})"
+
+def year_partitions(years=()):
+    partitions = [_partition(year) for year in partition_years(years)]
+    partitions.append("PARTITION p_future VALUES LESS THAN MAXVALUE")
+    return "PARTITION BY RANGE (year) (\n            " + ",\n            ".join(partitions) + "\n        )"
+
+def add_year_partitions(cursor, years):
+    """
+    Gives every year of years its own partition in the partitioned tables, reorganizing p_future into
+    the missing years and a new p_future. Rows of those years already in p_future move with them.
+    Years below the first partition's bound are left in it.
+    Returns the years added.
+    """
+    added = set()
+    for table_name in PARTITIONED_TABLES:
+        cursor.execute(
+            """
+            SELECT partition_name, partition_description FROM information_schema.partitions
+            WHERE table_schema = DATABASE() AND table_name = %s AND partition_name IS NOT NULL;
+            """,
+            (table_name,)
+        )
+        bounds = {name: description for name, description in cursor.fetchall()}
+        if 'p_future' not in bounds:
+            continue
+        # Years at or above the highest bound are the ones held by p_future
+        highest = max(int(bound) for name, bound in bounds.items() if name != 'p_future')
+        missing = sorted(year for year in set(years) if year >= highest)
+        if not missing:
+            continue
+        log.info("Adding year partitions", table=table_name, years=missing)
+        partitions = [_partition(year) for year in range(highest, missing[-1] + 1)]
+        partitions.append("PARTITION p_future VALUES LESS THAN MAXVALUE")
+        cursor.execute(f"ALTER TABLE {table_name} REORGANIZE PARTITION p_future INTO ({', '.join(partitions)});")
+        added.update(range(highest, missing[-1] + 1))
+    return sorted(added)
+
+def add_missing_columns(cursor):
+    for table_name, columns in ADDED_COLUMNS.items():
+        cursor.execute(
+            """
+            SELECT column_name FROM information_schema.columns
+            WHERE table_schema = DATABASE() AND table_name = %s;
+            """,
+            (table_name,)
+        )
+        existing = {row[0] for row in cursor.fetchall()}
+        missing = [f"{name} {definition}" for name, definition in columns if name not in existing]
+        if missing:
+            cursor.execute(f"ALTER TABLE {table_name} {', '.join('ADD COLUMN ' + column for column in missing)};")
+
+def create_tables(cursor, defer_indexes=False, dedupe_games=False):
     # Create leagues table
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS leagues (
@@ -106,20 +345,422 @@ def create_tables(cursor):
         );
     """)
 
-    # Create games table with composite unique key
-    cursor.execute("""
+    # Create games table partitioned by year, its composite unique key is in SECONDARY_INDEXES
+    cursor.execute(f"""
         CREATE TABLE IF NOT EXISTS games (
-            id INT AUTO_INCREMENT PRIMARY KEY,
+            id INT AUTO_INCREMENT,
             platformGameId VARCHAR(100),
             includedPauses VARCHAR(20),
             year INT,
             metadata JSON,
             snapshot JSON,
-            INDEX idx_platformGameId (platformGameId),
-            UNIQUE KEY uniq_platformGameId_includedPauses (platformGameId, includedPauses)
+            PRIMARY KEY (id, year)
+        )
+        {year_partitions()};
+    """)
+
+    # Create game_events table with one typed row per event of a game file
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS game_events (
+            platformGameId VARCHAR(100),
+            event_index INT,
+            year INT,
+            event_type VARCHAR(50),
+            round_number INT,
+            sequence_number BIGINT,
+            included_pauses VARCHAR(20),
+            wall_time DATETIME,
+            PRIMARY KEY (platformGameId, event_index, year)
+        )
+        {year_partitions()};
+    """)
+
+    # Create damage_events table
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS damage_events (
+            platformGameId VARCHAR(100),
+            event_index INT,
+            year INT,
+            round_number INT,
+            causer_id INT,
+            victim_id INT,
+            location VARCHAR(20),
+            damage_amount FLOAT,
+            kill_event BOOLEAN,
+            PRIMARY KEY (platformGameId, event_index, year)
+        )
+        {year_partitions()};
+    """)
+
+    # Create round_events table for roundStarted, roundEnded and roundCeremony events
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS round_events (
+            platformGameId VARCHAR(100),
+            event_index INT,
+            year INT,
+            round_number INT,
+            event_type VARCHAR(50),
+            ceremony_type VARCHAR(50),
+            PRIMARY KEY (platformGameId, event_index, year)
+        )
+        {year_partitions()};
+    """)
+
+    # Create player_snapshots table with one row per player of every snapshot event
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS player_snapshots (
+            platformGameId VARCHAR(100),
+            event_index INT,
+            year INT,
+            round_number INT,
+            player_id INT,
+            kills INT,
+            deaths INT,
+            assists INT,
+            total_score INT,
+            PRIMARY KEY (platformGameId, event_index, player_id, year)
+        )
+        {year_partitions()};
+    """)
+
+    # Create game_participants table with the in-game team of every player of a game, from its configuration event
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS game_participants (
+            platformGameId VARCHAR(100),
+            player_id INT,
+            year INT,
+            team_number INT,
+            PRIMARY KEY (platformGameId, player_id)
+        );
+    """)
+
+    # Create player_game_totals table with the per game contribution of every player to the rollups
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS player_game_totals (
+            platformGameId VARCHAR(100),
+            player_id INT,
+            year INT,
+            tournamentId VARCHAR(50),
+            esports_player_id VARCHAR(50),
+            kills INT,
+            deaths INT,
+            damage_dealt DOUBLE,
+            damage_taken DOUBLE,
+            headshots INT,
+            total_hits INT,
+            assists INT,
+            total_score INT,
+            PRIMARY KEY (platformGameId, player_id),
+            INDEX idx_tournament_player (tournamentId, esports_player_id),
+            INDEX idx_player_year (esports_player_id, year)
+        );
+    """)
+
+    # Create game_team_stats table with the team_pf output of GameDataCleaner for every game
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS game_team_stats (
+            platformGameId VARCHAR(100),
+            team_number INT,
+            year INT,
+            total_wins INT,
+            attacking_half_wins INT,
+            defending_half_wins INT,
+            pistol_round_wins INT,
+            PRIMARY KEY (platformGameId, team_number)
+        );
+    """)
+
+    # Create game_rounds table with the round_df output of GameDataCleaner for every game
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS game_rounds (
+            platformGameId VARCHAR(100),
+            round_number INT,
+            year INT,
+            winning_team INT,
+            ceremony_type VARCHAR(50),
+            PRIMARY KEY (platformGameId, round_number)
+        );
+    """)
+
+    # Create game_player_stats table with the player_pf output of GameDataCleaner for every game
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS game_player_stats (
+            platformGameId VARCHAR(100),
+            player_id INT,
+            year INT,
+            account_id VARCHAR(100),
+            display_name VARCHAR(100),
+            agent_name VARCHAR(50),
+            kills INT,
+            deaths INT,
+            damage_dealt DOUBLE,
+            damage_taken DOUBLE,
+            total_hits INT,
+            headshots INT,
+            headshot_percentage DOUBLE,
+            assists INT,
+            total_score INT,
+            PRIMARY KEY (platformGameId, player_id),
+            INDEX idx_account (account_id)
         );
     """)
 
+    # Create player_stats_by_tournament rollup table
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS player_stats_by_tournament (
+            tournamentId VARCHAR(50),
+            esports_player_id VARCHAR(50),
+            games_played INT,
+            kills INT,
+            deaths INT,
+            assists INT,
+            damage_dealt DOUBLE,
+            damage_taken DOUBLE,
+            headshots INT,
+            total_hits INT,
+            total_score INT,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            PRIMARY KEY (tournamentId, esports_player_id)
+        );
+    """)
+
+    # Create team_stats_by_year rollup table
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS team_stats_by_year (
+            team_id VARCHAR(50),
+            year INT,
+            games_played INT,
+            kills INT,
+            deaths INT,
+            assists INT,
+            damage_dealt DOUBLE,
+            damage_taken DOUBLE,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            PRIMARY KEY (team_id, year)
+        );
+    """)
+
+    # Create import_manifest table tracking which S3 objects have been imported
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS import_manifest (
+            object_key VARCHAR(512) PRIMARY KEY,
+            etag VARCHAR(100),
+            size BIGINT,
+            last_modified DATETIME,
+            status VARCHAR(20),
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        );
+    """)
+
+    # Create import_quarantine table with the reason each quarantined object was rejected
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS import_quarantine (
+            object_key VARCHAR(512) PRIMARY KEY,
+            etag VARCHAR(100),
+            reason TEXT,
+            quarantined_at DATETIME
+        );
+    """)
+
+    # Create game_changes table, the append-only change feed with one record per committed game
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS game_changes (
+            change_id BIGINT PRIMARY KEY,
+            platformGameId VARCHAR(100),
+            year INT,
+            object_key VARCHAR(512),
+            content_hash CHAR(64),
+            published_at DATETIME,
+            INDEX idx_game_change (platformGameId, change_id)
+        );
+    """)
+
+    # Create game_change_sequence table holding the last change id handed out
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS game_change_sequence (
+            id TINYINT PRIMARY KEY,
+            last_change_id BIGINT
+        );
+    """)
+    cursor.execute("INSERT IGNORE INTO game_change_sequence (id, last_change_id) VALUES (1, 0);")
+
+    # Create change_consumers table with the offset each change feed consumer has processed up to
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS change_consumers (
+            consumer VARCHAR(100) PRIMARY KEY,
+            last_change_id BIGINT,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        );
+    """)
+
+    # Create mapping_offsets table with the latest mapping_data_v2.updated_at each consumer has checked
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS mapping_offsets (
+            consumer VARCHAR(100) PRIMARY KEY,
+            last_updated_at DATETIME(6)
+        );
+    """)
+
+    add_missing_columns(cursor)
+    partition_tables(cursor)
+
+    # Returns the indexes left for build_indexes, so bulk sessions only relax the checks they stand in for
+    if defer_indexes:
+        return missing_indexes(cursor)
+    build_indexes(cursor, dedupe_games=dedupe_games)
+    return {}
+
+def _is_partitioned(cursor, table_name):
+    cursor.execute(
+        """
+        SELECT COUNT(*) FROM information_schema.partitions
+        WHERE table_schema = DATABASE() AND table_name = %s AND partition_name IS NOT NULL;
+        """,
+        (table_name,)
+    )
+    return cursor.fetchone()[0] > 0
+
+def partition_tables(cursor):
+    """
+    Migrates tables created before year partitioning: adds and backfills year on the event
+    tables, moves year into the primary key, drops the old games unique key and partitions
+    the table by year. Tables that are already partitioned are left alone.
+    """
+    for table_name, primary_key in PARTITIONED_TABLES.items():
+        if _is_partitioned(cursor, table_name):
+            continue
+        log.info("Partitioning table by year", table=table_name)
+
+        cursor.execute(
+            """
+            SELECT column_name FROM information_schema.columns
+            WHERE table_schema = DATABASE() AND table_name = %s;
+            """,
+            (table_name,)
+        )
+        if 'year' not in {row[0] for row in cursor.fetchall()}:
+            cursor.execute(f"ALTER TABLE {table_name} ADD COLUMN year INT AFTER event_index;")
+            cursor.execute(f"""
+                UPDATE {table_name} t
+                JOIN game_events g ON g.platformGameId = t.platformGameId AND g.event_index = t.event_index
+                SET t.year = g.year;
+            """)
+        # Primary key columns can't be NULL: take the year of the game's file from game_changes,
+        # and stop rather than file rows under a made up year
+        cursor.execute(f"""
+            UPDATE {table_name} t
+            JOIN (
+                SELECT platformGameId, MAX(year) AS year FROM game_changes
+                WHERE year IS NOT NULL GROUP BY platformGameId
+            ) c ON c.platformGameId = t.platformGameId
+            SET t.year = c.year
+            WHERE t.year IS NULL;
+        """)
+        cursor.execute(f"SELECT COUNT(*), COUNT(DISTINCT platformGameId) FROM {table_name} WHERE year IS NULL;")
+        rows, games = cursor.fetchone()
+        if rows:
+            raise RuntimeError(f"{table_name} has {rows} rows of {games} games without a year; set their year "
+                               f"from the games/<year>/ key of their file before partitioning")
+
+        changes = [f"DROP PRIMARY KEY, ADD PRIMARY KEY ({', '.join(primary_key)})"]
+        if table_name == 'games':
+            cursor.execute(
+                """
+                SELECT COUNT(*) FROM information_schema.statistics
+                WHERE table_schema = DATABASE() AND table_name = 'games'
+                    AND index_name = 'uniq_platformGameId_includedPauses';
+                """
+            )
+            if cursor.fetchone()[0]:
+                changes.append("DROP INDEX uniq_platformGameId_includedPauses")
+        cursor.execute(f"ALTER TABLE {table_name} {', '.join(changes)};")
+        cursor.execute(f"SELECT MAX(year) FROM {table_name};")
+        latest = cursor.fetchone()[0]
+        cursor.execute(f"ALTER TABLE {table_name} {year_partitions([] if latest is None else [latest])};")
+
+def _dedupe_games(cursor, delete=False):
+    """
+    Finds rows sharing (platformGameId, includedPauses) that were loaded without the unique key, with
+    one GROUP BY. Without delete, raises RuntimeError reporting the duplicate keys, so no data is
+    removed unless asked. With delete, the duplicates are logged and all but the latest row of each key,
+    the one the upsert would have kept, are deleted through idx_platformGameId, which must exist.
+    Returns the number of rows deleted.
+    """
+    cursor.execute("""
+        CREATE TEMPORARY TABLE games_duplicates (PRIMARY KEY (platformGameId, includedPauses))
+        SELECT platformGameId, includedPauses, MAX(id) AS keep_id, COUNT(*) AS copies
+        FROM games
+        WHERE platformGameId IS NOT NULL AND includedPauses IS NOT NULL
+        GROUP BY platformGameId, includedPauses
+        HAVING COUNT(*) > 1;
+    """)
+    cursor.execute("SELECT COUNT(*), COALESCE(SUM(copies - 1), 0) FROM games_duplicates;")
+    groups, duplicates = cursor.fetchone()
+    if groups:
+        cursor.execute("SELECT platformGameId, includedPauses, copies FROM games_duplicates "
+                       "ORDER BY platformGameId, includedPauses LIMIT 20;")
+        examples = [list(row) for row in cursor.fetchall()]
+        if not delete:
+            cursor.execute("DROP TEMPORARY TABLE games_duplicates;")
+            raise RuntimeError(f"games has {int(duplicates)} duplicate rows of {groups} (platformGameId, "
+                               f"includedPauses) keys, e.g. {examples}; remove them or set IMPORT_DEDUPE_GAMES=1 "
+                               f"to keep the latest row of each key before building the unique key")
+        log.warning("Removing duplicate games rows before building the unique key", keys=groups,
+                    rows=int(duplicates), examples=examples)
+        cursor.execute("""
+            DELETE g FROM games g
+            JOIN games_duplicates d
+                ON g.platformGameId = d.platformGameId
+                AND g.includedPauses = d.includedPauses
+            WHERE g.id <> d.keep_id;
+        """)
+    cursor.execute("DROP TEMPORARY TABLE games_duplicates;")
+    return int(duplicates)
+
+def missing_indexes(cursor):
+    """
+    Returns {table_name: [(index_name, definition)]} of the SECONDARY_INDEXES that don't exist yet.
+    """
+    missing = {}
+    for table_name, indexes in SECONDARY_INDEXES.items():
+        cursor.execute(
+            """
+            SELECT DISTINCT index_name FROM information_schema.statistics
+            WHERE table_schema = DATABASE() AND table_name = %s;
+            """,
+            (table_name,)
+        )
+        existing = {row[0] for row in cursor.fetchall()}
+        table_missing = [(name, definition) for name, definition in indexes if name not in existing]
+        if table_missing:
+            missing[table_name] = table_missing
+    return missing
+
+def has_unique_index(indexes):
+    """
+    Whether indexes, as returned by missing_indexes, include a unique key.
+    """
+    return any(definition.startswith('UNIQUE') for table in indexes.values() for _, definition in table)
+
+def build_indexes(cursor, dedupe_games=False):
+    """
+    Adds every secondary index that doesn't exist yet, one ALTER TABLE per table.
+    Before the games unique key is built, idx_platformGameId is built and duplicate rows are looked
+    for: they fail the build with a report, or are removed with dedupe_games (see _dedupe_games).
+    """
+    for table_name, indexes in missing_indexes(cursor).items():
+        missing = [definition for _, definition in indexes]
+        names = {name for name, _ in indexes}
+        if table_name == 'games' and 'uniq_platformGameId_includedPauses_year' in names:
+            # The dedupe looks rows up by platformGameId
+            lookup = dict(SECONDARY_INDEXES['games'])['idx_platformGameId']
+            if lookup in missing:
+                cursor.execute(f"ALTER TABLE games ADD {lookup};")
+                missing.remove(lookup)
+            _dedupe_games(cursor, delete=dedupe_games)
+        cursor.execute(f"ALTER TABLE {table_name} {', '.join('ADD ' + definition for definition in missing)};")
+        log.info("Built indexes", table=table_name, indexes=len(missing))
+
 def parse_datetime(dt_str):
     """
     Converts ISO 8601 datetime string to MySQL DATETIME format.
@@ -135,303 +776,1778 @@ def parse_datetime(dt_str):
             dt = datetime.strptime(dt_str, '%Y-%m-%dT%H:%M:%SZ')
         return dt.strftime('%Y-%m-%d %H:%M:%S')
     except ValueError as ve:
-        print(f"ValueError: {ve} for datetime string: {dt_str}")
+        log.sampled(logging.WARNING, "Invalid datetime string", value=dt_str, error=str(ve))
         return None
     except TypeError as te:
-        print(f"TypeError: {te} for datetime string: {dt_str}")
+        log.sampled(logging.WARNING, "Invalid datetime string", value=dt_str, error=str(te))
         return None
 
-def import_data(cursor, table_name, json_data, year=None):
+# Column layout and upsert key of every table written by the writers
+TABLES = {
+    'players': {
+        'columns': ('id', 'handle', 'first_name', 'last_name', 'status', 'photo_url',
+                    'home_team_id', 'created_at', 'updated_at'),
+        'key': ('id',),
+    },
+    'teams': {
+        'columns': ('id', 'acronym', 'home_league_id', 'dark_logo_url', 'light_logo_url', 'slug', 'name'),
+        'key': ('id',),
+    },
+    'leagues': {
+        'columns': ('league_id', 'region', 'dark_logo_url', 'light_logo_url', 'name', 'slug'),
+        'key': ('league_id',),
+    },
+    'mapping_data': {
+        'columns': ('platformGameId', 'esportsGameId', 'tournamentId', 'teamMapping', 'participantMapping'),
+        'key': ('platformGameId',),
+    },
+    'mapping_data_v2': {
+        'columns': ('platformGameId', 'matchId', 'esportsGameId', 'tournamentId', 'teamMapping',
+                    'participantMapping'),
+        'key': ('platformGameId',),
+    },
+    'tournaments': {
+        'columns': ('id', 'status', 'league_id', 'time_zone', 'name'),
+        'key': ('id',),
+    },
+    'games': {
+        'columns': ('platformGameId', 'includedPauses', 'year', 'metadata', 'snapshot', 'event_type',
+                    'sequence_number', 'wall_time', 'metadata_z', 'snapshot_z'),
+        'key': ('platformGameId', 'includedPauses'),
+        'binary': ('metadata_z', 'snapshot_z'),
+    },
+    'game_events': {
+        'columns': ('platformGameId', 'event_index', 'year', 'event_type', 'round_number', 'sequence_number',
+                    'included_pauses', 'wall_time'),
+        'key': ('platformGameId', 'event_index'),
+    },
+    'damage_events': {
+        'columns': ('platformGameId', 'event_index', 'year', 'round_number', 'causer_id', 'victim_id',
+                    'location', 'damage_amount', 'kill_event'),
+        'key': ('platformGameId', 'event_index'),
+    },
+    'round_events': {
+        'columns': ('platformGameId', 'event_index', 'year', 'round_number', 'event_type', 'ceremony_type'),
+        'key': ('platformGameId', 'event_index'),
+    },
+    'player_snapshots': {
+        'columns': ('platformGameId', 'event_index', 'year', 'round_number', 'player_id', 'kills', 'deaths',
+                    'assists', 'total_score'),
+        'key': ('platformGameId', 'event_index', 'player_id'),
+    },
+    'game_participants': {
+        'columns': ('platformGameId', 'player_id', 'year', 'team_number'),
+        'key': ('platformGameId', 'player_id'),
+    },
+    'game_team_stats': {
+        'columns': ('platformGameId', 'team_number', 'year', 'total_wins', 'attacking_half_wins',
+                    'defending_half_wins', 'pistol_round_wins'),
+        'key': ('platformGameId', 'team_number'),
+    },
+    'game_rounds': {
+        'columns': ('platformGameId', 'round_number', 'year', 'winning_team', 'ceremony_type'),
+        'key': ('platformGameId', 'round_number'),
+    },
+    'game_player_stats': {
+        'columns': ('platformGameId', 'player_id', 'year', 'account_id', 'display_name', 'agent_name', 'kills',
+                    'deaths', 'damage_dealt', 'damage_taken', 'total_hits', 'headshots', 'headshot_percentage',
+                    'assists', 'total_score'),
+        'key': ('platformGameId', 'player_id'),
+    },
+    'import_manifest': {
+        'columns': ('object_key', 'etag', 'size', 'last_modified', 'status'),
+        'key': ('object_key',),
+    },
+    'import_quarantine': {
+        'columns': ('object_key', 'etag', 'reason', 'quarantined_at'),
+        'key': ('object_key',),
+    },
+}
+
+# Columns of game_changes. It is appended to by BatchWriter.append_changes rather than upserted, so it is not in TABLES
+CHANGE_COLUMNS = ('change_id', 'platformGameId', 'year', 'object_key', 'content_hash', 'published_at')
+
+def _update_clause(table_name):
+    spec = TABLES[table_name]
+    updates = ',\n    '.join(f"{col} = VALUES({col})" for col in spec['columns'] if col not in spec['key'])
+    return f"ON DUPLICATE KEY UPDATE\n    {updates}"
+
+def upsert_sql(table_name, num_rows=1):
+    """
+    Builds an INSERT ... ON DUPLICATE KEY UPDATE statement for num_rows rows of table_name.
+    """
+    columns = TABLES[table_name]['columns']
+    placeholders = '(' + ', '.join(['%s'] * len(columns)) + ')'
+    return (
+        f"INSERT INTO {table_name} ({', '.join(columns)})\n"
+        f"VALUES {', '.join([placeholders] * num_rows)}\n"
+        f"{_update_clause(table_name)};"
+    )
+
+def build_row(table_name, json_data, year=None):
+    """
+    Converts a parsed json record into the tuple of column values for table_name.
+    Returns None for unrecognized tables.
+    """
     if table_name == 'players':
-        created_at = parse_datetime(json_data.get('created_at'))
-        updated_at = parse_datetime(json_data.get('updated_at'))
-        cursor.execute(
-            """
-            INSERT INTO players (id, handle, first_name, last_name, status, photo_url, home_team_id, created_at, updated_at)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-            ON DUPLICATE KEY UPDATE
-                handle = VALUES(handle),
-                first_name = VALUES(first_name),
-                last_name = VALUES(last_name),
-                status = VALUES(status),
-                photo_url = VALUES(photo_url),
-                home_team_id = VALUES(home_team_id),
-                created_at = VALUES(created_at),
-                updated_at = VALUES(updated_at);
-            """,
-            (
-                json_data.get('id'),
-                json_data.get('handle'),
-                json_data.get('first_name'),
-                json_data.get('last_name'),
-                json_data.get('status'),
-                json_data.get('photo_url'),
-                json_data.get('home_team_id'),
-                created_at,
-                updated_at
-            )
+        return (
+            json_data.get('id'),
+            json_data.get('handle'),
+            json_data.get('first_name'),
+            json_data.get('last_name'),
+            json_data.get('status'),
+            json_data.get('photo_url'),
+            json_data.get('home_team_id'),
+            parse_datetime(json_data.get('created_at')),
+            parse_datetime(json_data.get('updated_at'))
         )
     elif table_name == 'teams':
-        cursor.execute(
-            """
-            INSERT INTO teams (id, acronym, home_league_id, dark_logo_url, light_logo_url, slug, name)
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
-            ON DUPLICATE KEY UPDATE
-                acronym = VALUES(acronym),
-                home_league_id = VALUES(home_league_id),
-                dark_logo_url = VALUES(dark_logo_url),
-                light_logo_url = VALUES(light_logo_url),
-                slug = VALUES(slug),
-                name = VALUES(name);
-            """,
-            (
-                json_data.get('id'),
-                json_data.get('acronym'),
-                json_data.get('home_league_id'),
-                json_data.get('dark_logo_url'),
-                json_data.get('light_logo_url'),
-                json_data.get('slug'),
-                json_data.get('name')
-            )
+        return (
+            json_data.get('id'),
+            json_data.get('acronym'),
+            json_data.get('home_league_id'),
+            json_data.get('dark_logo_url'),
+            json_data.get('light_logo_url'),
+            json_data.get('slug'),
+            json_data.get('name')
         )
     elif table_name == 'leagues':
-        cursor.execute(
-            """
-            INSERT INTO leagues (league_id, region, dark_logo_url, light_logo_url, name, slug)
-            VALUES (%s, %s, %s, %s, %s, %s)
-            ON DUPLICATE KEY UPDATE
-                region = VALUES(region),
-                dark_logo_url = VALUES(dark_logo_url),
-                light_logo_url = VALUES(light_logo_url),
-                name = VALUES(name),
-                slug = VALUES(slug);
-            """,
-            (
-                json_data.get('league_id'),
-                json_data.get('region'),
-                json_data.get('dark_logo_url'),
-                json_data.get('light_logo_url'),
-                json_data.get('name'),
-                json_data.get('slug')
-            )
+        return (
+            json_data.get('league_id'),
+            json_data.get('region'),
+            json_data.get('dark_logo_url'),
+            json_data.get('light_logo_url'),
+            json_data.get('name'),
+            json_data.get('slug')
         )
     elif table_name == 'mapping_data':
-        cursor.execute(
-            """
-            INSERT INTO mapping_data (platformGameId, esportsGameId, tournamentId, teamMapping, participantMapping)
-            VALUES (%s, %s, %s, %s, %s)
-            ON DUPLICATE KEY UPDATE
-                esportsGameId = VALUES(esportsGameId),
-                tournamentId = VALUES(tournamentId),
-                teamMapping = VALUES(teamMapping),
-                participantMapping = VALUES(participantMapping);
-            """,
-            (
-                json_data.get('platformGameId'),
-                json_data.get('esportsGameId'),
-                json_data.get('tournamentId'),
-                json.dumps(json_data.get('teamMapping')),
-                json.dumps(json_data.get('participantMapping'))
-            )
+        return (
+            json_data.get('platformGameId'),
+            json_data.get('esportsGameId'),
+            json_data.get('tournamentId'),
+            json.dumps(json_data.get('teamMapping')),
+            json.dumps(json_data.get('participantMapping'))
         )
     elif table_name == 'mapping_data_v2':
-        cursor.execute(
-            """
-            INSERT INTO mapping_data_v2 (platformGameId, matchId, esportsGameId, tournamentId, teamMapping, participantMapping)
-            VALUES (%s, %s, %s, %s, %s, %s)
-            ON DUPLICATE KEY UPDATE
-                matchId = VALUES(matchId),
-                esportsGameId = VALUES(esportsGameId),
-                tournamentId = VALUES(tournamentId),
-                teamMapping = VALUES(teamMapping),
-                participantMapping = VALUES(participantMapping);
-            """,
-            (
-                json_data.get('platformGameId'),
-                json_data.get('matchId'),
-                json_data.get('esportsGameId'),
-                json_data.get('tournamentId'),
-                json.dumps(json_data.get('teamMapping')),
-                json.dumps(json_data.get('participantMapping'))
-            )
+        return (
+            json_data.get('platformGameId'),
+            json_data.get('matchId'),
+            json_data.get('esportsGameId'),
+            json_data.get('tournamentId'),
+            json.dumps(json_data.get('teamMapping')),
+            json.dumps(json_data.get('participantMapping'))
         )
     elif table_name == 'tournaments':
+        return (
+            json_data.get('id'),
+            json_data.get('status'),
+            json_data.get('league_id'),
+            json_data.get('time_zone'),
+            json_data.get('name')
+        )
+    elif table_name == 'games':
+        return game_row(json_data, year)
+    else:
+        log.warning("Unrecognized table", table=table_name)
+        return None
+
+def game_row(json_data, year, compress=False):
+    """
+    Builds a games row. With compress, metadata and snapshot go zlib-compressed into the
+    metadata_z/snapshot_z columns and the JSON columns are left NULL. The summary columns
+    (event_type, sequence_number, wall_time) are filled either way.
+    """
+    metadata = json_data.get('metadata')
+    # JSON text of metadata/snapshot kept by a passthrough decode, orjson's re-encoding (see game_payload_members)
+    raw = getattr(json_data, 'raw', {})
+    included_pauses = json_data.get('metadata', {}).get('eventTime', {}).get('includedPauses')
+    log.sampled(logging.DEBUG, "Game event", platformGameId=json_data.get('platformGameId'),
+                includedPauses=included_pauses)
+    if compress:
+        payloads = (None, None, compress_payload(metadata), compress_payload(json_data.get('snapshot')))
+    else:
+        payloads = (raw.get('metadata') or json.dumps(metadata),
+                    raw.get('snapshot') or json.dumps(json_data.get('snapshot')), None, None)
+    return (
+        json_data.get('platformGameId'),
+        included_pauses,
+        year,
+        payloads[0],
+        payloads[1],
+        event_type_of(json_data),
+        (metadata or {}).get('sequenceNumber'),
+        parse_datetime((metadata or {}).get('wallTime')),
+        payloads[2],
+        payloads[3]
+    )
+
+class BatchWriter:
+    """
+    Buffers rows per table and writes them as multi-row upserts of up to batch_size rows.
+
+    Rows are buffered by their upsert key, so a record seen twice before a flush is only
+    written once with its latest values, which is what the row-by-row upserts ended up with.
+    With validate, records passed to add() are checked against their schema in validation.py.
+    Change records passed to publish() are appended to game_changes by the next flush().
+    """
+
+    PLACEHOLDER = '%s'
+    # Keeps the sequence row locked until the transaction commits
+    LOCK_SEQUENCE = ' FOR UPDATE'
+
+    def __init__(self, cursor, batch_size=500, validate=True):
+        self.cursor = cursor
+        self.batch_size = batch_size
+        self.validate = validate
+        self.buffers = {table_name: {} for table_name in TABLES}
+        self.changes = []
+        self.statements = 0
+        self.rows = 0
+        # platformGameIds of the game events committed, used to refresh the rollups, and of the
+        # game events of the current transaction
+        self.games = set()
+        self.pending_games = set()
+
+    def add(self, table_name, json_data, year=None):
+        if self.validate:
+            validate_record(table_name, json_data)
+        row = build_row(table_name, json_data, year=year)
+        if row is not None:
+            self.add_row(table_name, row)
+
+    def add_row(self, table_name, row):
+        spec = TABLES[table_name]
+        key = tuple(row[spec['columns'].index(col)] for col in spec['key'])
+        buffer = self.buffers[table_name]
+        buffer[key] = row
+        if len(buffer) >= self.batch_size:
+            self.flush_table(table_name)
+
+    def flush_table(self, table_name):
+        rows = list(self.buffers[table_name].values())
+        self.buffers[table_name] = {}
+        if not rows:
+            return
+        params = [value for row in rows for value in row]
+        self.cursor.execute(upsert_sql(table_name, len(rows)), params)
+        self.statements += 1
+        self.rows += len(rows)
+        ROWS.labels(table_name).inc(len(rows))
+
+    def flush(self):
+        for table_name in TABLES:
+            self.flush_table(table_name)
+        self.flush_changes()
+
+    def publish(self, platform_game_id, year, object_key, content_hash):
+        """
+        Queues a change record for a game written in the current transaction.
+        """
+        published_at = datetime.utcnow().replace(microsecond=0)
+        self.changes.append((platform_game_id, year, object_key, content_hash, published_at))
+
+    def flush_changes(self):
+        changes, self.changes = self.changes, []
+        if changes:
+            self.append_changes(changes)
+
+    def append_changes(self, changes):
+        """
+        Appends change records to game_changes, numbered from game_change_sequence. The sequence
+        row stays locked until the transaction commits, so change ids become visible in increasing
+        order and a consumer reading past its offset never skips a change committed later.
+        """
+        p = self.PLACEHOLDER
+        self.cursor.execute(f"SELECT last_change_id FROM game_change_sequence WHERE id = 1{self.LOCK_SEQUENCE};")
+        last_change_id = self.cursor.fetchone()[0]
+        rows = [(last_change_id + number,) + change for number, change in enumerate(changes, 1)]
+        group = '(' + ', '.join([p] * len(CHANGE_COLUMNS)) + ')'
+        self.cursor.execute(
+            f"INSERT INTO game_changes ({', '.join(CHANGE_COLUMNS)}) VALUES {', '.join([group] * len(rows))};",
+            [value for row in rows for value in row]
+        )
+        self.cursor.execute(f"UPDATE game_change_sequence SET last_change_id = {p} WHERE id = 1;",
+                            (last_change_id + len(rows),))
+        self.statements += 1
+        self.rows += len(rows)
+        ROWS.labels('game_changes').inc(len(rows))
+
+    def discard(self):
+        """
+        Drops buffered rows, used when the surrounding transaction is rolled back.
+        """
+        self.buffers = {table_name: {} for table_name in TABLES}
+        self.changes = []
+        self.pending_games = set()
+
+    def committed(self):
+        """
+        Called once the surrounding transaction is committed.
+        """
+        self.games.update(self.pending_games)
+        self.pending_games = set()
+
+    def finish(self):
+        self.flush()
+
+def _tsv_value(value):
+    """
+    Formats a value for LOAD DATA's default field format: tab separated, backslash escaped, \\N for NULL.
+    """
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, bytes):
+        # Binary columns are staged as hex and decoded with UNHEX while loading
+        return value.hex()
+    return (
+        str(value)
+        .replace('\\', '\\\\')
+        .replace('\t', '\\t')
+        .replace('\n', '\\n')
+        .replace('\r', '\\r')
+        .replace('\0', '\\0')
+    )
+
+class LoadDataWriter(BatchWriter):
+    """
+    Bulk load variant of BatchWriter for cold imports.
+
+    Flushed rows are appended to one TSV staging file per table instead of being sent to MySQL.
+    Once due(), i.e. load_rows rows are staged, and when the import finishes, load() loads every
+    file with LOAD DATA LOCAL INFILE into a temporary staging table and merges it into its table
+    with a single INSERT ... SELECT ... ON DUPLICATE KEY UPDATE.
+
+    flush() marks a file boundary: discard() truncates the staging files back to the last
+    boundary, so a failed source file never reaches the database. The files are only removed by
+    committed() after a load, so a load that fails or is rolled back can be retried with the whole
+    batch; fail_batch() gives up on it. Change records are held back until the rows they announce are loaded.
+    """
+
+    def __init__(self, cursor, staging_dir, batch_size=500, load_rows=500000, validate=True):
+        super().__init__(cursor, batch_size=batch_size, validate=validate)
+        self.staging_dir = staging_dir
+        self.load_rows = load_rows
+        self.files = {}
+        self.marks = {}
+        self.staged_rows = 0
+        self.marked_rows = 0
+        self.staged_changes = []
+        self.marked_changes = 0
+        # Manifest rows of the staged objects, marked failed if the batch cannot be loaded
+        self.staged_objects = []
+        self.marked_objects = 0
+        # Rows loaded by the current transaction by table, counted once it commits
+        self.loaded = None
+        # platformGameIds of the staged objects, counted once their batch is loaded and committed
+        self.staged_games = set()
+
+    def flush_changes(self):
+        self.staged_changes.extend(self.changes)
+        self.changes = []
+
+    def flush_table(self, table_name):
+        rows = list(self.buffers[table_name].values())
+        self.buffers[table_name] = {}
+        if not rows:
+            return
+        if table_name not in self.files:
+            path = os.path.join(self.staging_dir, f"{table_name}.tsv")
+            self.files[table_name] = open(path, 'w', encoding='utf-8', newline='')
+        self.files[table_name].writelines(
+            '\t'.join(_tsv_value(value) for value in row) + '\n' for row in rows
+        )
+        self.staged_rows += len(rows)
+        if table_name == 'import_manifest':
+            self.staged_objects.extend(rows)
+
+    def flush(self):
+        super().flush()
+        self.marks = {table_name: f.tell() for table_name, f in self.files.items()}
+        self.marked_rows = self.staged_rows
+        self.marked_changes = len(self.staged_changes)
+        self.marked_objects = len(self.staged_objects)
+        self.staged_games.update(self.pending_games)
+        self.pending_games = set()
+
+    def due(self):
+        return self.staged_rows >= self.load_rows
+
+    def discard(self):
+        super().discard()
+        for table_name, f in list(self.files.items()):
+            if table_name in self.marks:
+                f.seek(self.marks[table_name])
+                f.truncate()
+            else:
+                f.close()
+                os.remove(f.name)
+                del self.files[table_name]
+        self.staged_rows = self.marked_rows
+        del self.staged_changes[self.marked_changes:]
+        del self.staged_objects[self.marked_objects:]
+        self.loaded = None
+
+    def load(self):
+        """
+        Loads and merges the staged files in the current transaction, keeping them until committed().
+        """
+        loaded = {}
+        for table_name in TABLES:
+            f = self.files.get(table_name)
+            if f is None:
+                continue
+            f.flush()
+            spec = TABLES[table_name]
+            columns = ', '.join(spec['columns'])
+            binary = spec.get('binary', ())
+            load_columns = ', '.join(f"@{col}" if col in binary else col for col in spec['columns'])
+            unhex = ''.join(f", {col} = UNHEX(@{col})" for col in binary)
+            staging = f"staging_{table_name}"
+            # Left over by a failed attempt on the same session
+            self.cursor.execute(f"DROP TEMPORARY TABLE IF EXISTS {staging};")
+            self.cursor.execute(
+                f"CREATE TEMPORARY TABLE {staging} (staging_seq BIGINT AUTO_INCREMENT PRIMARY KEY) "
+                f"SELECT {columns} FROM {table_name} WHERE FALSE;"
+            )
+            self.cursor.execute(
+                f"LOAD DATA LOCAL INFILE %s INTO TABLE {staging} CHARACTER SET utf8mb4 ({load_columns})"
+                f"{' SET ' + unhex[2:] if unhex else ''};",
+                (f.name,)
+            )
+            loaded[table_name] = max(self.cursor.rowcount, 0)
+            # Merge in staging order so the last occurrence of a key wins, like the row-wise path
+            self.cursor.execute(
+                f"INSERT INTO {table_name} ({columns})\n"
+                f"SELECT {columns} FROM {staging} ORDER BY staging_seq\n"
+                f"{_update_clause(table_name)};"
+            )
+            self.cursor.execute(f"DROP TEMPORARY TABLE {staging};")
+            self.statements += 1
+        if self.staged_changes:
+            self.append_changes(self.staged_changes)
+        self.loaded = loaded
+
+    def committed(self):
+        if self.loaded is None:
+            return
+        for table_name, rows in self.loaded.items():
+            self.rows += rows
+            ROWS.labels(table_name).inc(rows)
+        self.games.update(self.staged_games)
+        self.clear()
+
+    def fail_batch(self):
+        """
+        Drops the staged batch and upserts the manifest rows of its objects as failed, straight to
+        import_manifest rather than staged. Returns the number of objects marked failed.
+        """
+        objects = [row[:-1] + ('failed',) for row in self.staged_objects]
+        self.clear()
+        for row in objects:
+            self.buffers['import_manifest'][(row[0],)] = row
+        BatchWriter.flush_table(self, 'import_manifest')
+        return len(objects)
+
+    def clear(self):
+        for f in self.files.values():
+            f.close()
+            os.remove(f.name)
+        self.files = {}
+        self.marks = {}
+        self.staged_rows = 0
+        self.marked_rows = 0
+        self.staged_changes = []
+        self.marked_changes = 0
+        self.staged_objects = []
+        self.marked_objects = 0
+        self.loaded = None
+        self.staged_games = set()
+
+    def finish(self):
+        self.flush()
+        self.load()
+
+def sqlite_upsert_sql(table_name):
+    """
+    Builds a single-row INSERT ... ON CONFLICT DO UPDATE statement for table_name in SQLite.
+    """
+    spec = TABLES[table_name]
+    updates = ', '.join(f"{col} = excluded.{col}" for col in spec['columns'] if col not in spec['key'])
+    return (
+        f"INSERT INTO {table_name} ({', '.join(spec['columns'])}) "
+        f"VALUES ({', '.join(['?'] * len(spec['columns']))}) "
+        f"ON CONFLICT ({', '.join(spec['key'])}) DO UPDATE SET {updates};"
+    )
+
+def sqlite_create_tables(cursor):
+    """
+    Creates every table of TABLES in SQLite, keyed on its upsert key. Columns are left untyped,
+    so values keep the type they were written with.
+    """
+    for table_name, spec in TABLES.items():
         cursor.execute(
-            """
-            INSERT INTO tournaments (id, status, league_id, time_zone, name)
-            VALUES (%s, %s, %s, %s, %s)
-            ON DUPLICATE KEY UPDATE
-                status = VALUES(status),
-                league_id = VALUES(league_id),
-                time_zone = VALUES(time_zone),
-                name = VALUES(name);
+            f"CREATE TABLE IF NOT EXISTS {table_name} ("
+            f"{', '.join(spec['columns'])}, PRIMARY KEY ({', '.join(spec['key'])}));"
+        )
+    # Change feed, see create_tables
+    cursor.execute(f"CREATE TABLE IF NOT EXISTS game_changes ({', '.join(CHANGE_COLUMNS[1:])}, "
+                   f"change_id INTEGER PRIMARY KEY);")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_game_change ON game_changes (platformGameId, change_id);")
+    cursor.execute("CREATE TABLE IF NOT EXISTS game_change_sequence (id INTEGER PRIMARY KEY, last_change_id);")
+    cursor.execute("INSERT OR IGNORE INTO game_change_sequence (id, last_change_id) VALUES (1, 0);")
+    cursor.execute("CREATE TABLE IF NOT EXISTS change_consumers (consumer PRIMARY KEY, last_change_id);")
+
+class SQLiteWriter(BatchWriter):
+    """
+    BatchWriter for SQLite: each flush sends the buffered rows of a table with executemany on a
+    single-row upsert, which SQLite prepares once and runs for every row.
+    """
+
+    PLACEHOLDER = '?'
+    # SQLite has a single writer, which holds the database lock until it commits
+    LOCK_SEQUENCE = ''
+
+    def __init__(self, cursor, batch_size=500, validate=True):
+        super().__init__(cursor, batch_size=batch_size, validate=validate)
+        self.sql = {table_name: sqlite_upsert_sql(table_name) for table_name in TABLES}
+
+    def flush_table(self, table_name):
+        rows = list(self.buffers[table_name].values())
+        self.buffers[table_name] = {}
+        if not rows:
+            return
+        self.cursor.executemany(self.sql[table_name], rows)
+        self.statements += 1
+        self.rows += len(rows)
+        ROWS.labels(table_name).inc(len(rows))
+
+class SQLiteConnection:
+    """
+    A SQLite connection in WAL mode that groups commit_objects commits into one transaction.
+
+    The importer commits once per object. Here commit() only releases a savepoint and
+    rollback() rolls back to it, so a failed object is still undone on its own while the
+    file is only synced every commit_objects objects.
+    """
+
+    def __init__(self, path, commit_objects=100):
+        self.conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False, cached_statements=256)
+        self.conn.execute("PRAGMA journal_mode = WAL;")
+        self.conn.execute("PRAGMA synchronous = NORMAL;")
+        self.conn.execute("PRAGMA temp_store = MEMORY;")
+        self.conn.execute("PRAGMA busy_timeout = 30000;")
+        self.commit_objects = commit_objects
+        self.pending = 0
+        self.conn.execute("BEGIN;")
+        self.conn.execute("SAVEPOINT object;")
+
+    def cursor(self):
+        return self.conn.cursor()
+
+    def commit(self):
+        self.conn.execute("RELEASE SAVEPOINT object;")
+        self.pending += 1
+        if self.pending >= self.commit_objects:
+            self.conn.execute("COMMIT;")
+            self.conn.execute("BEGIN;")
+            self.pending = 0
+        self.conn.execute("SAVEPOINT object;")
+
+    def rollback(self):
+        self.conn.execute("ROLLBACK TO SAVEPOINT object;")
+
+    def close(self):
+        self.conn.execute("RELEASE SAVEPOINT object;")
+        self.conn.execute("COMMIT;")
+        self.conn.close()
+
+class MySQLSink:
+    """
+    Writes to the MySQL database configured by the DATABASE_* variables.
+    """
+    name = 'mysql'
+    bulk_load = True
+    rollups = True
+    # games.metadata/snapshot are JSON columns, so passed through text is stored normalized
+    json_columns = True
+
+    def connect(self):
+        return connect_db()
+
+    def create_tables(self, cursor, defer_indexes=False, dedupe_games=False):
+        return create_tables(cursor, defer_indexes=defer_indexes, dedupe_games=dedupe_games)
+
+    def add_year_partitions(self, cursor, years):
+        return add_year_partitions(cursor, years)
+
+    def writer(self, cursor, batch_size=500, validate=True):
+        return BatchWriter(cursor, batch_size=batch_size, validate=validate)
+
+    def upsert_sql(self, table_name):
+        return upsert_sql(table_name)
+
+class SQLiteSink:
+    """
+    Writes to a single SQLite file, for imports on a laptop or CI box without a MySQL server.
+    There is a single writer; partitioning, LOAD DATA, bulk load mode and the rollup tables are MySQL only.
+    """
+    name = 'sqlite'
+    bulk_load = False
+    rollups = False
+    # games.metadata/snapshot are TEXT: they get json.dumps text, never passed through source text
+    json_columns = False
+
+    def __init__(self, path, commit_objects=100):
+        self.path = path
+        self.commit_objects = commit_objects
+        # DATETIME values (import_manifest.last_modified) are stored as ISO text
+        sqlite3.register_adapter(datetime, lambda value: value.isoformat(' '))
+
+    def connect(self):
+        return SQLiteConnection(self.path, commit_objects=self.commit_objects)
+
+    def create_tables(self, cursor, defer_indexes=False, dedupe_games=False):
+        sqlite_create_tables(cursor)
+        return {}
+
+    def add_year_partitions(self, cursor, years):
+        # SQLite tables are not partitioned
+        return []
+
+    def writer(self, cursor, batch_size=500, validate=True):
+        return SQLiteWriter(cursor, batch_size=batch_size, validate=validate)
+
+    def upsert_sql(self, table_name):
+        return sqlite_upsert_sql(table_name)
+
+def _nested_value(data, *path):
+    for name in path:
+        if not isinstance(data, dict):
+            return None
+        data = data.get(name)
+    return data
+
+def add_game_events(writer, events, year, raw_games=True, compress_games=False, validate=True):
+    """
+    Writes a game file in one pass: one game_events row per event, plus typed rows in
+    damage_events, round_events and player_snapshots, and the team of each player of the
+    configuration event in game_participants. Events are attributed to the round
+    of the latest roundStarted seen before them.
+    When the writer validates, every event is checked against the game_event schema, unless
+    validate is off because the events were already checked (see decode_game).
+    """
+    validate = validate and writer.validate
+    round_number = None
+    for event_index, event in enumerate(events):
+        event_type = event_type_of(event) if isinstance(event, dict) else None
+        if validate:
+            validate_event(event, event_type, event_index)
+        if raw_games:
+            writer.add_row('games', game_row(event, year, compress=compress_games))
+
+        platform_game_id = event.get('platformGameId')
+        writer.pending_games.add(platform_game_id)
+        metadata = event.get('metadata') or {}
+        payload = event.get(event_type) or {}
+
+        if event_type == 'roundStarted':
+            round_number = payload.get('roundNumber', round_number)
+
+        writer.add_row('game_events', (
+            platform_game_id,
+            event_index,
+            year,
+            event_type,
+            round_number,
+            metadata.get('sequenceNumber'),
+            _nested_value(metadata, 'eventTime', 'includedPauses'),
+            parse_datetime(metadata.get('wallTime'))
+        ))
+
+        if event_type == 'damageEvent':
+            writer.add_row('damage_events', (
+                platform_game_id,
+                event_index,
+                year,
+                round_number,
+                _nested_value(payload, 'causerId', 'value'),
+                _nested_value(payload, 'victimId', 'value'),
+                payload.get('location'),
+                payload.get('damageAmount'),
+                bool(payload.get('killEvent'))
+            ))
+        elif event_type in ('roundStarted', 'roundEnded', 'roundCeremony'):
+            writer.add_row('round_events', (
+                platform_game_id,
+                event_index,
+                year,
+                payload.get('roundNumber', round_number),
+                event_type,
+                payload.get('type') if event_type == 'roundCeremony' else None
+            ))
+        elif event_type == 'snapshot':
+            for player in payload.get('players') or []:
+                writer.add_row('player_snapshots', (
+                    platform_game_id,
+                    event_index,
+                    year,
+                    round_number,
+                    _nested_value(player, 'playerId', 'value'),
+                    player.get('kills'),
+                    player.get('deaths'),
+                    player.get('assists'),
+                    _nested_value(player, 'scores', 'combatScore', 'totalScore')
+                ))
+        elif event_type == 'configuration':
+            for team in payload.get('teams') or []:
+                team_number = _nested_value(team, 'teamId', 'value')
+                for player in team.get('playersInTeam') or []:
+                    writer.add_row('game_participants', (platform_game_id, _nested_value(player, 'value'), year,
+                                                         team_number))
+
+def fetch_object(source, key):
+    return source.get(key)
+
+# Members of a game event whose JSON text from the decoder can go to the games JSON columns as is
+GAME_PAYLOAD_MEMBERS = ('metadata', 'snapshot')
+
+def game_payload_members(sink, passthrough, raw_games=True, compress_games=False):
+    """
+    Members to keep as JSON text when decoding game files whole for sink. This is a fast re-encode:
+    with the orjson backend, loads_keep_raw keeps orjson's encoding of the members, which beats
+    decoding and re-encoding them with json.dumps. With the json backend, and for streamed game
+    files (see GameFile), keeping the text is slower than json.dumps, so nothing is kept.
+    It only applies to sinks whose games columns are JSON columns (sink.json_columns): MySQL parses
+    them, so the text is stored exactly like the json.dumps text, where SQLite would keep it as is.
+    Compressed payloads are still built from the dicts.
+    """
+    if passthrough and sink.json_columns and raw_games and not compress_games and get_backend() == 'orjson':
+        return GAME_PAYLOAD_MEMBERS
+    return ()
+
+def decode_object(compressed_body, keep_raw=()):
+    """
+    Gunzips and parses an object body. Kept at module level so it can run in a process pool.
+    The body is parsed by the JSON backend (see json_stream.loads); with keep_raw, objects also keep
+    the JSON text of those members (see loads_keep_raw).
+    """
+    with gzip.GzipFile(fileobj=BytesIO(compressed_body)) as gz:
+        body = gz.read()
+    if keep_raw:
+        return loads_keep_raw(body, keep_raw)
+    return loads(body)
+
+def game_year(key):
+    """
+    Returns the year of a games/<year>/ key, or None if the key has no year.
+    """
+    parts = key.split('/')
+    try:
+        return int(parts[2])
+    except (IndexError, ValueError):
+        return None
+
+def _sql_value(value):
+    # DataFrame cells are numpy scalars, and missing values NaN
+    if hasattr(value, 'item'):
+        value = value.item()
+    if isinstance(value, float) and value != value:
+        return None
+    return value
+
+def derive_game_rows(events, year):
+    """
+    Runs GameDataCleaner on the GameEvents of a game and returns its team_pf, round_df and
+    player_pf as rows of game_team_stats, game_rounds and game_player_stats.
+    """
+    team_pf, round_df, player_pf = GameDataCleaner.genGameDataFromEvents(events)
+    platform_game_id = events.platform_game_id
+    rows = {'game_team_stats': [], 'game_rounds': [], 'game_player_stats': []}
+    for team in team_pf.to_dict('records'):
+        rows['game_team_stats'].append(tuple(_sql_value(value) for value in (
+            platform_game_id,
+            team['Team'],
+            year,
+            team['Total Wins'],
+            team['Attacking Half Wins'],
+            team['Defending Half Wins'],
+            team['Pistol Round Wins']
+        )))
+    for round_number, game_round in zip(round_df.index, round_df.to_dict('records')):
+        rows['game_rounds'].append(tuple(_sql_value(value) for value in (
+            platform_game_id,
+            round_number,
+            year,
+            game_round['Winning Team'],
+            game_round['Round Ceremony Type']
+        )))
+    for player in player_pf.to_dict('records'):
+        rows['game_player_stats'].append(tuple(_sql_value(value) for value in (
+            platform_game_id,
+            player['playerID'],
+            year,
+            player.get('accountId'),
+            player.get('displayName'),
+            player.get('AgentName'),
+            player['kills'],
+            player['deaths'],
+            player['damage_dealt'],
+            player['damage_taken'],
+            player['total_hits'],
+            player['headshots'],
+            player['headshot_percentage'],
+            player.get('Assists'),
+            player.get('TotalScore')
+        )))
+    return rows
+
+class GameFile:
+    """
+    A game file handed to a writer still compressed. Its events are streamed from the body while
+    they are written (see events()), so a queued game costs its compressed size and a writer holds
+    one event and its buffered rows at a time, however large the file is.
+    """
+
+    def __init__(self, compressed_body, platform_game_id):
+        self.compressed_body = compressed_body
+        self.platform_game_id = platform_game_id
+
+    def events(self):
+        # A new stream per call, so a write retried after a deadlock reads the file again. Payloads are
+        # re-encoded with json.dumps: keeping their source text while streaming is slower
+        return iter_gz_json(BytesIO(self.compressed_body))
+
+def decode_game(compressed_body, keep_raw=(), year=None, derive=True, validate=False, stream=True):
+    """
+    Reads a game file: with validate, each event is checked as it is read (see validated_game_events),
+    and the events are collected into the compact columns of GameEvents, which GameDataCleaner runs on
+    with derive.
+    With stream, the file is read in one streamed pass without holding its events, and a GameFile is
+    returned without its body, which the caller already has; the writer streams the events from it.
+    Otherwise the file is decoded whole like decode_object and its events are returned.
+    Returns them with the derived rows (see derive_game_rows), or the exception the cleaner raised
+    instead of the rows: a ValidationError when the file lacks an event type GameDataCleaner needs
+    (see check_game_events), which skips the cleaner. A file failing validation is returned as
+    (ValidationError, None).
+    Kept at module level so it can run in a process pool, off the writer threads.
+    """
+    if stream:
+        json_data = None
+        events = iter_gz_json(BytesIO(compressed_body))
+    else:
+        json_data = decode_object(compressed_body, keep_raw)
+        events = json_data if isinstance(json_data, list) else [json_data]
+    try:
+        game = GameEvents(validated_game_events(events) if validate else events)
+    except ValidationError as e:
+        return e, None
+    derived = None
+    if derive:
+        try:
+            check_game_events(game.types)
+            # GameDataCleaner prints a warning per skipped damage event; keep them out of the JSON logs
+            with contextlib.redirect_stdout(StringIO()):
+                derived = derive_game_rows(game, year)
+        except Exception as e:
+            derived = e
+    if stream:
+        return GameFile(None, game.platform_game_id), derived
+    return json_data, derived
+
+def add_derived_rows(writer, derived):
+    """
+    Queues the rows returned by derive_game_rows on the writer.
+    """
+    for table_name, rows in (derived or {}).items():
+        for row in rows:
+            writer.add_row(table_name, row)
+
+def route_records(key, json_data, writer, raw_games=True, compress_games=False, validate_events=True):
+    """
+    Hands every record of a parsed file to the writer, based on which file the key points at.
+    With raw_games off, game events only go to the normalized event tables, not the games table.
+    With compress_games, their metadata and snapshot are stored compressed in the games table.
+    validate_events off skips validating game events that were checked while decoding.
+    """
+    if key.endswith('players.json.gz'):
+        if isinstance(json_data, list):
+            for player in json_data:
+                writer.add('players', player)
+        elif isinstance(json_data, dict):
+            if 'id' in json_data:
+                writer.add('players', json_data)
+            else:
+                for player in json_data.values():
+                    writer.add('players', player)
+        else:
+            log.warning("Unexpected data format", key=key)
+    elif key.endswith('teams.json.gz'):
+        if isinstance(json_data, list):
+            for team in json_data:
+                writer.add('teams', team)
+        elif isinstance(json_data, dict):
+            if 'id' in json_data:
+                writer.add('teams', json_data)
+            else:
+                for team in json_data.values():
+                    writer.add('teams', team)
+        else:
+            log.warning("Unexpected data format", key=key)
+    elif key.endswith('leagues.json.gz'):
+        if isinstance(json_data, list):
+            for league in json_data:
+                writer.add('leagues', league)
+        elif isinstance(json_data, dict):
+            if 'league_id' in json_data:
+                writer.add('leagues', json_data)
+            else:
+                for league in json_data.values():
+                    writer.add('leagues', league)
+        else:
+            log.warning("Unexpected data format", key=key)
+    elif key.endswith('mapping_data.json.gz'):
+        if isinstance(json_data, list):
+            for mapping in json_data:
+                writer.add('mapping_data', mapping)
+        elif isinstance(json_data, dict):
+            writer.add('mapping_data', json_data)
+        else:
+            log.warning("Unexpected data format", key=key)
+    elif key.endswith('mapping_data_v2.json.gz'):
+        if isinstance(json_data, list):
+            for mapping in json_data:
+                writer.add('mapping_data_v2', mapping)
+        elif isinstance(json_data, dict):
+            writer.add('mapping_data_v2', json_data)
+        else:
+            log.warning("Unexpected data format", key=key)
+    elif key.endswith('tournaments.json.gz'):
+        if isinstance(json_data, list):
+            for tournament in json_data:
+                writer.add('tournaments', tournament)
+        elif isinstance(json_data, dict):
+            if 'id' in json_data:
+                writer.add('tournaments', json_data)
+            else:
+                for tournament in json_data.values():
+                    writer.add('tournaments', tournament)
+        else:
+            log.warning("Unexpected data format", key=key)
+    elif 'games/' in key and key.endswith('.json.gz'):
+        # Rows are partitioned by the year of the games/<year>/ key, so a file without one is quarantined
+        year = game_year(key)
+        if year is None or len(key.split('/')) < 4:
+            raise ValidationError("game file key has no games/<year>/ part")
+        # Game files may arrive fully parsed, as a stream of events from iter_gz_json or as a GameFile
+        if isinstance(json_data, GameFile):
+            json_data = json_data.events()
+        if isinstance(json_data, (list, Iterator)):
+            add_game_events(writer, json_data, year, raw_games=raw_games, compress_games=compress_games,
+                            validate=validate_events)
+        elif isinstance(json_data, dict):
+            add_game_events(writer, [json_data], year, raw_games=raw_games, compress_games=compress_games,
+                            validate=validate_events)
+        else:
+            log.warning("Unexpected data format", key=key)
+    else:
+        log.warning("Unrecognized file", key=key)
+
+# Number of games or rollup keys handled per rollup refresh statement
+ROLLUP_CHUNK_SIZE = 200
+
+def _chunks(items, size):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def _placeholders(count, width=1):
+    group = '%s' if width == 1 else '(' + ', '.join(['%s'] * width) + ')'
+    return ', '.join([group] * count)
+
+def _rollup_keys(cursor, game_ids):
+    """
+    Returns the (tournamentId, esports_player_id) and (team_id, year) rollup keys the given games contribute to.
+    """
+    in_games = _placeholders(len(game_ids))
+    cursor.execute(
+        f"""
+        SELECT DISTINCT tournamentId, esports_player_id FROM player_game_totals
+        WHERE platformGameId IN ({in_games})
+            AND tournamentId IS NOT NULL AND esports_player_id IS NOT NULL;
+        """,
+        game_ids
+    )
+    player_keys = set(cursor.fetchall())
+    cursor.execute(
+        f"""
+        SELECT DISTINCT team_id, year FROM player_game_totals
+        WHERE platformGameId IN ({in_games}) AND team_id IS NOT NULL AND year IS NOT NULL;
+        """,
+        game_ids
+    )
+    team_keys = set(cursor.fetchall())
+    return player_keys, team_keys
+
+def _refresh_player_game_totals(cursor, game_ids):
+    """
+    Recomputes the player_game_totals rows of the given games from the event tables.
+    """
+    in_games = _placeholders(len(game_ids))
+    cursor.execute(f"DELETE FROM player_game_totals WHERE platformGameId IN ({in_games});", game_ids)
+    cursor.execute(
+        f"""
+        INSERT INTO player_game_totals (platformGameId, player_id, year, tournamentId, esports_player_id, team_id,
+            kills, deaths, damage_dealt, damage_taken, headshots, total_hits, assists, total_score)
+        SELECT d.platformGameId, d.player_id, d.year, m.tournamentId,
+            JSON_UNQUOTE(JSON_EXTRACT(m.participantMapping, CONCAT('$."', d.player_id, '"'))),
+            JSON_UNQUOTE(JSON_EXTRACT(m.teamMapping, CONCAT('$."', gp.team_number, '"'))),
+            d.kills, d.deaths, d.damage_dealt, d.damage_taken, d.headshots, d.total_hits, s.assists, s.total_score
+        FROM (
+            SELECT e.platformGameId, e.player_id, MAX(e.year) AS year, SUM(e.kills) AS kills, SUM(e.deaths) AS deaths,
+                SUM(e.damage_dealt) AS damage_dealt, SUM(e.damage_taken) AS damage_taken,
+                SUM(e.headshots) AS headshots, SUM(e.total_hits) AS total_hits
+            FROM (
+                SELECT platformGameId, year, causer_id AS player_id, kill_event AS kills, 0 AS deaths,
+                    damage_amount AS damage_dealt, 0 AS damage_taken, location = 'HEAD' AS headshots, 1 AS total_hits
+                FROM damage_events
+                WHERE platformGameId IN ({in_games}) AND causer_id IS NOT NULL
+                UNION ALL
+                SELECT platformGameId, year, victim_id, 0, kill_event, 0, damage_amount, 0, 0
+                FROM damage_events
+                WHERE platformGameId IN ({in_games}) AND victim_id IS NOT NULL
+            ) e
+            GROUP BY e.platformGameId, e.player_id
+        ) d
+        LEFT JOIN mapping_data_v2 m ON m.platformGameId = d.platformGameId
+        LEFT JOIN game_participants gp ON gp.platformGameId = d.platformGameId AND gp.player_id = d.player_id
+        LEFT JOIN (
+            SELECT ps.platformGameId, ps.player_id, ps.assists, ps.total_score
+            FROM player_snapshots ps
+            JOIN (
+                SELECT platformGameId, MAX(event_index) AS event_index
+                FROM player_snapshots
+                WHERE platformGameId IN ({in_games})
+                GROUP BY platformGameId
+            ) last_snapshot USING (platformGameId, event_index)
+        ) s ON s.platformGameId = d.platformGameId AND s.player_id = d.player_id;
+        """,
+        game_ids * 3
+    )
+
+def refresh_rollups(cursor, platform_game_ids):
+    """
+    Incrementally maintains player_stats_by_tournament and team_stats_by_year.
+
+    The per game contributions of the given games are recomputed in player_game_totals, then
+    only the rollup rows those games contributed to, before or after, are re-aggregated.
+    Players are attributed to the team they played for in each game: their in-game team in
+    game_participants, mapped to an esports team by the game's teamMapping.
+    """
+    player_keys, team_keys = set(), set()
+    for game_ids in _chunks(platform_game_ids, ROLLUP_CHUNK_SIZE):
+        before_players, before_teams = _rollup_keys(cursor, game_ids)
+        _refresh_player_game_totals(cursor, game_ids)
+        after_players, after_teams = _rollup_keys(cursor, game_ids)
+        player_keys |= before_players | after_players
+        team_keys |= before_teams | after_teams
+
+    for keys in _chunks(player_keys, ROLLUP_CHUNK_SIZE):
+        in_keys = _placeholders(len(keys), width=2)
+        params = [value for key in keys for value in key]
+        cursor.execute(
+            f"DELETE FROM player_stats_by_tournament WHERE (tournamentId, esports_player_id) IN ({in_keys});",
+            params
+        )
+        cursor.execute(
+            f"""
+            INSERT INTO player_stats_by_tournament (tournamentId, esports_player_id, games_played, kills, deaths,
+                assists, damage_dealt, damage_taken, headshots, total_hits, total_score)
+            SELECT tournamentId, esports_player_id, COUNT(*), SUM(kills), SUM(deaths), SUM(assists),
+                SUM(damage_dealt), SUM(damage_taken), SUM(headshots), SUM(total_hits), SUM(total_score)
+            FROM player_game_totals
+            WHERE (tournamentId, esports_player_id) IN ({in_keys})
+            GROUP BY tournamentId, esports_player_id;
             """,
-            (
-                json_data.get('id'),
-                json_data.get('status'),
-                json_data.get('league_id'),
-                json_data.get('time_zone'),
-                json_data.get('name')
-            )
+            params
         )
-    elif table_name == 'games':
-        included_pauses = json_data.get('metadata', {}).get('eventTime', {}).get('includedPauses')
-        print("including pauses:", included_pauses)
+
+    for keys in _chunks(team_keys, ROLLUP_CHUNK_SIZE):
+        in_keys = _placeholders(len(keys), width=2)
+        params = [value for key in keys for value in key]
+        cursor.execute(f"DELETE FROM team_stats_by_year WHERE (team_id, year) IN ({in_keys});", params)
         cursor.execute(
-            """
-            INSERT INTO games (platformGameId, includedPauses, year, metadata, snapshot)
-            VALUES (%s, %s, %s, %s, %s)
-            ON DUPLICATE KEY UPDATE
-                year = VALUES(year),
-                metadata = VALUES(metadata),
-                snapshot = VALUES(snapshot);
+            f"""
+            INSERT INTO team_stats_by_year (team_id, year, games_played, kills, deaths, assists, damage_dealt,
+                damage_taken)
+            SELECT team_id, year, COUNT(DISTINCT platformGameId), SUM(kills), SUM(deaths),
+                SUM(assists), SUM(damage_dealt), SUM(damage_taken)
+            FROM player_game_totals
+            WHERE (team_id, year) IN ({in_keys})
+            GROUP BY team_id, year;
             """,
-            (
-                json_data.get('platformGameId'),
-                included_pauses,
-                year,
-                json.dumps(json_data.get('metadata')),
-                json.dumps(json_data.get('snapshot'))
-            )
+            params
         )
+
+    log.info("Refreshed rollups", games=len(platform_game_ids), player_rows=len(player_keys),
+             team_rows=len(team_keys))
+
+def stale_mapping_games(cursor, since=None):
+    """
+    Returns the platformGameIds whose player_game_totals no longer match mapping_data_v2: their tournament,
+    esports player or team differ from what the mapping gives now, e.g. because the mapping file was
+    imported after the game or has changed since.
+    With since, only games whose mapping_data_v2 row changed after it (its updated_at) are checked,
+    instead of every game in player_game_totals.
+    """
+    if since is None:
+        games, changed, params = "player_game_totals t LEFT JOIN mapping_data_v2 m", "", ()
     else:
-        print(f"Unrecognized table: {table_name}")
+        games, changed, params = "mapping_data_v2 m JOIN player_game_totals t", "m.updated_at > %s AND ", (since,)
+    cursor.execute(f"""
+        SELECT DISTINCT t.platformGameId
+        FROM {games} ON m.platformGameId = t.platformGameId
+        LEFT JOIN game_participants gp ON gp.platformGameId = t.platformGameId AND gp.player_id = t.player_id
+        WHERE {changed}NOT (
+            t.tournamentId <=> m.tournamentId
+            AND t.esports_player_id <=> JSON_UNQUOTE(JSON_EXTRACT(m.participantMapping, CONCAT('$."', t.player_id, '"')))
+            AND t.team_id <=> JSON_UNQUOTE(JSON_EXTRACT(m.teamMapping, CONCAT('$."', gp.team_number, '"')))
+        );
+    """, params)
+    return {row[0] for row in cursor.fetchall()}
 
-def process_file(s3_client, bucket_name, key, cursor):
-    print(f"Processing {key}")
-    try:
-        response = s3_client.get_object(Bucket=bucket_name, Key=key)
-        compressed_body = response['Body'].read()
-        with gzip.GzipFile(fileobj=BytesIO(compressed_body)) as gz:
-            content = gz.read().decode('utf-8')
-            try:
-                json_data = json.loads(content)
-            except json.JSONDecodeError as jde:
-                print(f"JSONDecodeError for {key}: {jde}")
+def latest_mapping_update(cursor):
+    """
+    Returns the latest mapping_data_v2.updated_at, None when the table is empty.
+    """
+    cursor.execute("SELECT MAX(updated_at) FROM mapping_data_v2;")
+    return cursor.fetchone()[0]
+
+def load_mapping_offset(cursor, consumer):
+    """
+    Returns the mapping_data_v2.updated_at a consumer saved with save_mapping_offset, None for a new consumer.
+    """
+    cursor.execute("SELECT last_updated_at FROM mapping_offsets WHERE consumer = %s;", (consumer,))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+def save_mapping_offset(cursor, consumer, updated_at):
+    """
+    Saves the latest mapping_data_v2.updated_at a consumer has checked, in the transaction of its refresh.
+    """
+    cursor.execute(
+        "INSERT INTO mapping_offsets (consumer, last_updated_at) VALUES (%s, %s) "
+        "ON DUPLICATE KEY UPDATE last_updated_at = VALUES(last_updated_at);",
+        (consumer, updated_at)
+    )
+
+# Change feed consumer name under which the rollup refresh saves its offset
+ROLLUP_CONSUMER = 'rollups'
+
+def all_game_ids(cursor):
+    cursor.execute("SELECT DISTINCT platformGameId FROM game_events;")
+    return {row[0] for row in cursor.fetchall()}
+
+# Sentinel telling a pipeline stage that its input is exhausted
+_DONE = object()
+
+# Seconds a stage waits on a full queue before checking whether the run was aborted
+QUEUE_POLL_SECONDS = 0.5
+
+def list_objects(source, prefix):
+    return source.list(prefix)
+
+def load_manifest(cursor):
+    """
+    Returns {object_key: (etag, size, status)} for every object recorded in import_manifest.
+    """
+    cursor.execute("SELECT object_key, etag, size, status FROM import_manifest;")
+    return {key: (etag, size, status) for key, etag, size, status in cursor.fetchall()}
+
+def record_manifest(writer, obj, status):
+    """
+    Queues the manifest row of obj on the writer, so it is written together with the object's records.
+    """
+    last_modified = obj.get('LastModified')
+    if last_modified is not None:
+        # boto3 returns an aware UTC datetime, DATETIME columns are naive
+        last_modified = last_modified.replace(tzinfo=None)
+    writer.add_row('import_manifest', (obj['Key'], obj.get('ETag'), obj.get('Size'), last_modified, status))
+
+def record_quarantine(writer, obj, reason):
+    """
+    Queues the manifest and quarantine rows of an object rejected by validation.
+    """
+    record_manifest(writer, obj, 'quarantined')
+    quarantined_at = datetime.utcnow().replace(microsecond=0)
+    writer.add_row('import_quarantine', (obj['Key'], obj.get('ETag'), reason, quarantined_at))
+
+def publish_game_change(writer, obj, json_data):
+    """
+    Queues the change feed record of a game file on the writer, so it is committed with the game.
+    """
+    key = obj['Key']
+    if 'games/' not in key:
+        return
+    if isinstance(json_data, GameFile):
+        platform_game_id = json_data.platform_game_id
+    elif isinstance(json_data, (list, dict)):
+        events = json_data if isinstance(json_data, list) else [json_data]
+        platform_game_id = next((event.get('platformGameId') for event in events if isinstance(event, dict)), None)
+    else:
+        return
+    if platform_game_id is not None:
+        writer.publish(platform_game_id, game_year(key), key, obj.get('ContentHash'))
+
+def pending_objects(objects, manifest):
+    """
+    Yields the objects that are new, changed or not fully imported according to the manifest.
+    Quarantined objects are only retried once they change.
+    """
+    skipped = 0
+    for obj in objects:
+        entry = manifest.get(obj['Key'])
+        unchanged = entry is not None and entry[:2] == (obj.get('ETag'), obj.get('Size'))
+        if unchanged and entry[2] in ('done', 'quarantined'):
+            skipped += 1
+            continue
+        yield obj
+    log.info("Skipped unchanged objects", objects=skipped)
+
+def _start_stage(target, count, *args):
+    threads = [threading.Thread(target=target, args=args, daemon=True) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads
+
+def _put(target_queue, item, alive):
+    """
+    Puts item on a bounded queue, giving up once alive() is false, i.e. once nothing takes items
+    off the queue anymore. Returns whether the item was queued.
+    """
+    while True:
+        try:
+            target_queue.put(item, timeout=QUEUE_POLL_SECONDS)
+            return True
+        except queue.Full:
+            if not alive():
+                return False
+
+def _finish_stage(threads, input_queue):
+    for _ in threads:
+        _put(input_queue, _DONE, lambda: any(thread.is_alive() for thread in threads))
+    for thread in threads:
+        thread.join()
+
+# Times a file is retried after a deadlock or lock wait timeout before it is marked failed
+RETRY_ATTEMPTS = 3
+
+def writer_lane(key, lanes):
+    """
+    Picks the writer for an object key. A file always goes to the same writer, so the rows
+    of one game are never written by two connections at once.
+    """
+    return zlib.crc32(key.encode('utf-8')) % lanes
+
+def run_pipeline(source, objects, batch_size=500, fetch_workers=8, decode_workers=None,
+                 writer_workers=1, queue_size=16, raw_games=True, load_data=False, load_rows=500000,
+                 staging_dir=None, bulk_session=False, compress_games=False, pool=None,
+                 target_commit_latency=2.0, passthrough=True, sink=None, validate=True, derive_stats=True,
+                 relax_unique_checks=False, stream_game_bytes=0):
+    """
+    Imports listed objects through three stages connected by bounded queues:
+    fetch threads download the objects, decode threads gunzip and parse them (games/ files
+    go to a process pool), and writer threads, each with a connection from the pool, upsert the records.
+    Objects are spread over the writers by key, and a WriterLimiter adapts how many writers commit
+    at once from the commit latency and the deadlock rate. Files hitting a deadlock are retried.
+    Each object is marked done in import_manifest in the same transaction as its records.
+    With load_data, writers stage records in TSV files under staging_dir and bulk load them
+    with LoadDataWriter instead of sending multi-row upserts. With bulk_session, writer sessions
+    run with foreign key checks disabled, and unique checks too with relax_unique_checks, which is
+    only safe while the unique keys are deferred. compress_games is passed on to route_records.
+    With passthrough, game files decoded whole with orjson keep its encoding of metadata and snapshot,
+    which then go to the games table without json.dumps (see game_payload_members).
+    Records go to sink, MySQL by default. With validate, records are checked against the schemas in
+    validation.py; objects that fail, or cannot be decoded, are quarantined with the reason.
+    With derive_stats, the decode workers also run GameDataCleaner on every game file and its
+    outputs are written to game_team_stats, game_rounds and game_player_stats with the game's events.
+    Game files of at least stream_game_bytes compressed bytes, all of them by default, are read
+    streamed by the decode workers and handed to the writers compressed, as GameFiles the events are
+    streamed from; smaller ones are decoded whole in the pool and their events handed over.
+    Every game file committed is published on the game_changes feed in the same transaction.
+    A writer that loses its connection reconnects through the pool; a writer that fails anyway
+    aborts the run: the other stages stop taking work and the writer's error is raised.
+    Returns the number of upsert statements issued, the set of platformGameIds written and the number of rows sent.
+    """
+    sink = sink or MySQLSink()
+    decode_workers = decode_workers or os.cpu_count() or 1
+    keep_raw = game_payload_members(sink, passthrough, raw_games, compress_games)
+    object_queue = queue.Queue(maxsize=queue_size)
+    fetched_queue = queue.Queue(maxsize=queue_size)
+    lane_queues = [queue.Queue(maxsize=queue_size) for _ in range(writer_workers)]
+    limiter = WriterLimiter(writer_workers, target_latency=target_commit_latency)
+    statements = []
+    written_rows = []
+    touched_games = set()
+    # Set when a writer fails, so the stages feeding it stop instead of blocking on its full queue
+    abort = threading.Event()
+    failures = []
+    running = lambda: not abort.is_set()
+
+    QUEUE_DEPTH.labels('objects').set_function(object_queue.qsize)
+    QUEUE_DEPTH.labels('fetched').set_function(fetched_queue.qsize)
+    QUEUE_DEPTH.labels('parsed').set_function(lambda: sum(q.qsize() for q in lane_queues))
+    WRITER_LIMIT.set(limiter.limit)
+
+    # Open writer connections up front so connection failures surface before any work starts
+    own_pool = pool is None
+    if own_pool:
+        pool = ConnectionPool(writer_workers, connect=sink.connect)
+
+    def fetch_stage():
+        while True:
+            obj = object_queue.get()
+            if obj is _DONE:
                 return
+            if abort.is_set():
+                continue
+            key = obj['Key']
+            log.info("Processing object", key=key)
+            started = time.perf_counter()
+            try:
+                compressed_body = fetch_object(source, key)
+            except Exception as e:
+                ERRORS.labels('fetch').inc()
+                log.error("Error fetching object", key=key, error=str(e))
+                continue
+            STAGE_SECONDS.labels('fetch').observe(time.perf_counter() - started)
+            FETCHED_BYTES.inc(len(compressed_body))
+            # Published with the game on the change feed, so consumers can tell changed files apart
+            obj['ContentHash'] = hashlib.sha256(compressed_body).hexdigest()
+            _put(fetched_queue, (obj, compressed_body), running)
 
-            if key.endswith('players.json.gz'):
-                if isinstance(json_data, list):
-                    for player in json_data:
-                        import_data(cursor, 'players', player)
-                elif isinstance(json_data, dict):
-                    if 'id' in json_data:
-                        import_data(cursor, 'players', json_data)
-                    else:
-                        for player in json_data.values():
-                            import_data(cursor, 'players', player)
-                else:
-                    print("Unexpected data format in players.json.gz")
-            elif key.endswith('teams.json.gz'):
-                if isinstance(json_data, list):
-                    for team in json_data:
-                        import_data(cursor, 'teams', team)
-                elif isinstance(json_data, dict):
-                    if 'id' in json_data:
-                        import_data(cursor, 'teams', json_data)
-                    else:
-                        for team in json_data.values():
-                            import_data(cursor, 'teams', team)
-                else:
-                    print("Unexpected data format in teams.json.gz")
-            elif key.endswith('leagues.json.gz'):
-                if isinstance(json_data, list):
-                    for league in json_data:
-                        import_data(cursor, 'leagues', league)
-                elif isinstance(json_data, dict):
-                    if 'league_id' in json_data:
-                        import_data(cursor, 'leagues', json_data)
-                    else:
-                        for league in json_data.values():
-                            import_data(cursor, 'leagues', league)
-                else:
-                    print("Unexpected data format in leagues.json.gz")
-            elif key.endswith('mapping_data.json.gz'):
-                if isinstance(json_data, list):
-                    for mapping in json_data:
-                        import_data(cursor, 'mapping_data', mapping)
-                elif isinstance(json_data, dict):
-                    import_data(cursor, 'mapping_data', json_data)
-                else:
-                    print("Unexpected data format in mapping_data.json.gz")
-            elif key.endswith('mapping_data_v2.json.gz'):
-                if isinstance(json_data, list):
-                    for mapping in json_data:
-                        import_data(cursor, 'mapping_data_v2', mapping)
-                elif isinstance(json_data, dict):
-                    import_data(cursor, 'mapping_data_v2', json_data)
+    def decode_stage(process_pool):
+        while True:
+            item = fetched_queue.get()
+            if item is _DONE:
+                return
+            if abort.is_set():
+                continue
+            obj, compressed_body = item
+            key = obj['Key']
+            started = time.perf_counter()
+            derived = None
+            try:
+                if 'games/' in key:
+                    # Game events are validated and cleaned here, in the process pool, rather than by the
+                    # writer; files from stream_game_bytes on reach it as a GameFile it streams the events from
+                    stream = len(compressed_body) >= stream_game_bytes
+                    json_data, derived = process_pool.submit(decode_game, compressed_body, keep_raw, game_year(key),
+                                                             derive_stats, validate, stream).result()
+                    if isinstance(json_data, GameFile):
+                        json_data.compressed_body = compressed_body
                 else:
-                    print("Unexpected data format in mapping_data_v2.json.gz")
-            elif key.endswith('tournaments.json.gz'):
-                if isinstance(json_data, list):
-                    for tournament in json_data:
-                        import_data(cursor, 'tournaments', tournament)
-                elif isinstance(json_data, dict):
-                    if 'id' in json_data:
-                        import_data(cursor, 'tournaments', json_data)
-                    else:
-                        for tournament in json_data.values():
-                            import_data(cursor, 'tournaments', tournament)
+                    json_data = decode_object(compressed_body)
+            except (ValueError, EOFError, OSError) as e:
+                # Not gzip or not JSON: hand the object to its writer to be quarantined
+                ERRORS.labels('decode').inc()
+                log.error("Error decoding object", key=key, error=str(e))
+                json_data = ValidationError(f"cannot decode: {e}")
+            except Exception as e:
+                ERRORS.labels('decode').inc()
+                log.error("Error decoding object", key=key, error=str(e))
+                continue
+            if isinstance(derived, ValidationError):
+                # A game without the events the cleaner needs is still imported, without derived stats
+                log.info("Skipping derived game stats", key=key, reason=str(derived))
+                derived = None
+            elif isinstance(derived, Exception):
+                # The raw events are still imported, only the derived tables miss this game
+                ERRORS.labels('clean').inc()
+                log.warning("Error deriving game stats", key=key, error=repr(derived))
+                derived = None
+            STAGE_SECONDS.labels('decode').observe(time.perf_counter() - started)
+            _put(lane_queues[writer_lane(key, writer_workers)], (obj, json_data, derived), running)
+
+    def start_session(conn, cursor):
+        if bulk_session:
+            conn.autocommit = False
+            cursor.execute("SET SESSION foreign_key_checks = 0;")
+            if relax_unique_checks:
+                cursor.execute("SET SESSION unique_checks = 0;")
+
+    def rollback(conn, writer):
+        """
+        Rolls back the writer's transaction. When that fails the connection is lost: it is dropped
+        and the writer carries on with a new one. Returns the connection to use from now on.
+        """
+        writer.discard()
+        try:
+            conn.rollback()
+            return conn
+        except Exception as e:
+            ERRORS.labels('connection').inc()
+            log.error("Error rolling back, reconnecting", error=str(e))
+        with contextlib.suppress(Exception):
+            conn.close()
+        conn = pool.connect()
+        writer.cursor = conn.cursor()
+        start_session(conn, writer.cursor)
+        return conn
+
+    def write_file(conn, writer, obj, json_data, derived=None):
+        """
+        Writes one object in its own transaction, retrying deadlocks and recording objects that fail.
+        Returns the connection to use for the next object.
+        """
+        key = obj['Key']
+        for attempt in range(1, RETRY_ATTEMPTS + 1):
+            limiter.acquire()
+            started = time.perf_counter()
+            try:
+                if isinstance(json_data, ValidationError):
+                    raise json_data
+                # Game files went through decode_game, which validated their events
+                route_records(key, json_data, writer, raw_games=raw_games, compress_games=compress_games,
+                              validate_events='games/' not in key)
+                add_derived_rows(writer, derived)
+                record_manifest(writer, obj, 'done')
+                publish_game_change(writer, obj, json_data)
+                writer.flush()
+                written = time.perf_counter()
+                conn.commit()
+                writer.committed()
+                committed = time.perf_counter()
+                STAGE_SECONDS.labels('write').observe(written - started)
+                STAGE_SECONDS.labels('commit').observe(committed - written)
+                limiter.release(latency=committed - started)
+                OBJECTS.labels('done').inc()
+                return conn
+            except Exception as e:
+                limiter.release(retryable_error=is_retryable(e))
+                conn = rollback(conn, writer)
+                if is_retryable(e) and attempt < RETRY_ATTEMPTS:
+                    ERRORS.labels('retry').inc()
+                    log.warning("Retrying object", key=key, attempt=attempt, error=str(e))
+                    continue
+                if isinstance(e, ValidationError):
+                    error = e
+                    log.warning("Quarantining object", key=key, reason=str(e))
                 else:
-                    print("Unexpected data format in tournaments.json.gz")
-            elif 'games/' in key and key.endswith('.json.gz'):
-                # Extract year and game_id from the key
-                try:
-                    parts = key.split('/')
-                    if len(parts) < 4:
-                        print(f"Invalid game file path: {key}")
-                        return
-                    year = int(parts[2])
-                    game_filename = parts[3]
-                    if isinstance(json_data, list):
-                        for game in json_data:
-                            import_data(cursor, 'games', game, year=year)
-                    elif isinstance(json_data, dict):
-                        import_data(cursor, 'games', json_data, year=year)
-                    else:
-                        print(f"Unexpected data format in {key}")
-                except (IndexError, ValueError) as e:
-                    print(f"Error extracting year and game_id from {key}: {e}")
+                    error = None
+                    ERRORS.labels('write').inc()
+                    log.error("Error processing object", key=key, error=str(e))
+                break
+        try:
+            if error is not None:
+                OBJECTS.labels('quarantined').inc()
+                record_quarantine(writer, obj, str(error))
             else:
-                print(f"Unrecognized file: {key}")
-    except Exception as e:
-        print(f"Error processing {key}: {e}")
+                OBJECTS.labels('failed').inc()
+                record_manifest(writer, obj, 'failed')
+            writer.flush()
+            conn.commit()
+            writer.committed()
+        except Exception as e:
+            ERRORS.labels('write').inc()
+            log.error("Error recording failure", key=key, error=str(e))
+            conn = rollback(conn, writer)
+        return conn
+
+    def finish_writer(conn, writer):
+        """
+        Sends what the writer still holds in its own transaction: the last rows, and with load_data the
+        staged batch. A batch hitting a deadlock is retried whole from its staging files; a batch that
+        cannot be loaded is dropped and its objects are marked failed. Returns the connection to use next.
+        """
+        for attempt in range(1, RETRY_ATTEMPTS + 1):
+            started = time.perf_counter()
+            try:
+                writer.finish()
+                conn.commit()
+                writer.committed()
+                STAGE_SECONDS.labels('load').observe(time.perf_counter() - started)
+                return conn
+            except Exception as e:
+                conn = rollback(conn, writer)
+                if is_retryable(e) and attempt < RETRY_ATTEMPTS:
+                    ERRORS.labels('retry').inc()
+                    log.warning("Retrying staged records", attempt=attempt, error=str(e))
+                    continue
+                ERRORS.labels('load').inc()
+                log.error("Error loading staged records", error=str(e))
+                break
+        if load_data:
+            failed = writer.fail_batch()
+            conn.commit()
+            OBJECTS.labels('failed').inc(failed)
+            log.error("Marked the objects of the staged batch failed", objects=failed)
+        return conn
+
+    def write_lane(conn, lane_queue):
+        cursor = conn.cursor()
+        start_session(conn, cursor)
+        if load_data:
+            writer = LoadDataWriter(cursor, tempfile.mkdtemp(dir=staging_dir), batch_size=batch_size,
+                                    load_rows=load_rows, validate=validate)
+        else:
+            writer = sink.writer(cursor, batch_size=batch_size, validate=validate)
+        while True:
+            item = lane_queue.get()
+            if item is _DONE:
+                break
+            if abort.is_set():
+                # Another writer failed: drain the lane so the decode threads feeding it can finish
+                continue
+            obj, json_data, derived = item
+            conn = write_file(conn, writer, obj, json_data, derived)
+            if load_data and writer.due():
+                conn = finish_writer(conn, writer)
+        conn = finish_writer(conn, writer)
+        if load_data:
+            os.rmdir(writer.staging_dir)
+        if bulk_session:
+            writer.cursor.execute("SET SESSION unique_checks = 1, foreign_key_checks = 1;")
+        statements.append(writer.statements)
+        written_rows.append(writer.rows)
+        touched_games.update(writer.games)
+        writer.cursor.close()
+        return conn
+
+    def write_stage(lane_queue):
+        conn = pool.get()
+        try:
+            conn = write_lane(conn, lane_queue)
+        except Exception as e:
+            # Typically the database is gone for good: stop the run rather than leave this lane unread
+            ERRORS.labels('write').inc()
+            log.error("Writer failed, aborting the import", error=str(e))
+            failures.append(e)
+            abort.set()
+            with contextlib.suppress(Exception):
+                conn.close()
+            # Keep reading the lane until its _DONE, so nothing blocks on putting to it
+            while lane_queue.get() is not _DONE:
+                pass
+            return
+        pool.put(conn)
+
+    with ProcessPoolExecutor(max_workers=decode_workers) as process_pool:
+        fetchers = _start_stage(fetch_stage, fetch_workers)
+        decoders = _start_stage(decode_stage, decode_workers, process_pool)
+        writers = [threading.Thread(target=write_stage, args=(lane_queue,), daemon=True)
+                   for lane_queue in lane_queues]
+        for writer_thread in writers:
+            writer_thread.start()
+
+        for obj in objects:
+            if not _put(object_queue, obj, running):
+                break
+
+        _finish_stage(fetchers, object_queue)
+        _finish_stage(decoders, fetched_queue)
+        for writer_thread, lane_queue in zip(writers, lane_queues):
+            _finish_stage([writer_thread], lane_queue)
+
+    if own_pool:
+        pool.close()
+    if failures:
+        raise failures[0]
+
+    return sum(statements), touched_games, sum(written_rows)
 
 def main():
     # AWS S3 configuration
     s3_bucket_name = os.environ['S3_BUCKET_NAME']
     s3_bucket_prefix = os.environ.get('S3_BUCKET_PREFIX', '')
 
-    # Initialize S3 client with anonymous access
-    s3_client = boto3.client(
-        's3',
-        region_name='us-west-2',
-        config=Config(signature_version=UNSIGNED)
-    )
+    # Read from a local mirror of the bucket (see analysis/object_sources.py) instead of S3 when set
+    source_dir = os.environ.get('IMPORT_SOURCE_DIR')
+    if source_dir:
+        source = LocalSource(source_dir)
+    else:
+        # Initialize S3 client with anonymous access
+        s3_client = boto3.client(
+            's3',
+            region_name='us-west-2',
+            config=Config(signature_version=UNSIGNED)
+        )
+        source = S3Source(s3_bucket_name, client=s3_client)
+
+    # Number of rows sent per multi-row upsert
+    batch_size = int(os.environ.get('IMPORT_BATCH_SIZE', 500))
+
+    # Pipeline sizing
+    fetch_workers = int(os.environ.get('IMPORT_FETCH_WORKERS', 8))
+    decode_workers = int(os.environ.get('IMPORT_DECODE_WORKERS', os.cpu_count() or 1))
+    writer_workers = int(os.environ.get('IMPORT_WRITER_WORKERS', 1))
+    queue_size = int(os.environ.get('IMPORT_QUEUE_SIZE', 16))
+
+    # Median commit latency (seconds) above which fewer writers are allowed to commit at once
+    target_commit_latency = float(os.environ.get('IMPORT_TARGET_COMMIT_LATENCY', 2.0))
+
+    # Whether game events are still written as JSON rows to the games table next to the event tables
+    raw_games = os.environ.get('IMPORT_RAW_GAMES', '1') == '1'
+
+    # Whether the metadata and snapshot of games rows are stored zlib-compressed instead of as JSON
+    compress_games = os.environ.get('IMPORT_COMPRESS_GAMES', '0') == '1'
+
+    # Whether records are checked against the schemas in validation.py, quarantining objects that fail
+    validate = os.environ.get('IMPORT_VALIDATE', '1') == '1'
+
+    # Whether GameDataCleaner runs on every game file, filling game_team_stats, game_rounds and game_player_stats
+    derive_stats = os.environ.get('IMPORT_DERIVED_STATS', '1') == '1'
+
+    # Whether games metadata and snapshot JSON is forwarded from the source files instead of re-encoded
+    passthrough = os.environ.get('IMPORT_PASSTHROUGH_GAMES', '1') == '1'
+
+    # Game files from this compressed size on are streamed to the writers instead of decoded whole in the pool
+    stream_game_bytes = int(os.environ.get('IMPORT_STREAM_GAME_BYTES', 0))
+
+    # Write path: 'rows', 'load_data', or 'auto' to pick LOAD DATA once the pending objects reach a size
+    import_mode = os.environ.get('IMPORT_MODE', 'auto')
+    load_data_min_bytes = int(os.environ.get('IMPORT_LOAD_DATA_MIN_BYTES', 100 * 1024 * 1024))
+    load_rows = int(os.environ.get('IMPORT_LOAD_DATA_ROWS', 500000))
+    staging_dir = os.environ.get('IMPORT_STAGING_DIR') or None
+
+    # Bulk load: create new tables without secondary indexes, relax session checks and build the indexes at the end
+    bulk_load = os.environ.get('IMPORT_BULK_LOAD', '0') == '1'
+
+    # Delete duplicate games rows found before building the unique key instead of failing with a report of them
+    dedupe_games = os.environ.get('IMPORT_DEDUPE_GAMES', '0') == '1'
+
+    # Recompute the rollups from every game instead of only the games written in this run
+    rebuild_rollups = os.environ.get('IMPORT_REBUILD_ROLLUPS', '0') == '1'
+
+    # Logging: level, and the minimum seconds between two sampled per-record messages
+    log.configure(level=os.environ.get('IMPORT_LOG_LEVEL', 'INFO').upper(),
+                  sample_interval=float(os.environ.get('IMPORT_LOG_SAMPLE_SECONDS', 10)))
+
+    # Prometheus metrics endpoint, 0 to disable
+    start_metrics_server(int(os.environ.get('IMPORT_METRICS_PORT', 9108)))
+
+    # Where records go: 'mysql', or 'sqlite' for a single file at IMPORT_SQLITE_PATH
+    if os.environ.get('IMPORT_SINK', 'mysql') == 'sqlite':
+        sink = SQLiteSink(os.environ.get('IMPORT_SQLITE_PATH', 'esports.db'),
+                          commit_objects=int(os.environ.get('IMPORT_SQLITE_COMMIT_OBJECTS', 100)))
+        # SQLite has a single writer and no LOAD DATA or bulk load mode
+        writer_workers = 1
+        import_mode = 'rows'
+        bulk_load = False
+    else:
+        sink = MySQLSink()
+    timings = {}
 
     # Connect to the database with retry logic
-    conn = connect_db()
+    phase_start = time.perf_counter()
+    conn = sink.connect()
     cursor = conn.cursor()
-    create_tables(cursor)
+    deferred_indexes = sink.create_tables(cursor, defer_indexes=bulk_load, dedupe_games=dedupe_games)
     conn.commit()
+    manifest = load_manifest(cursor)
+    cursor.close()
+    conn.close()
+    timings['schema'] = time.perf_counter() - phase_start
 
-    # List and process files from S3
-    paginator = s3_client.get_paginator('list_objects_v2')
-    page_iterator = paginator.paginate(Bucket=s3_bucket_name, Prefix=s3_bucket_prefix)
+    # List files from S3 and process the ones the manifest doesn't have as done
+    phase_start = time.perf_counter()
+    objects = list(pending_objects(list_objects(source, s3_bucket_prefix), manifest))
+    timings['listing'] = time.perf_counter() - phase_start
 
-    for page in page_iterator:
-        for obj in page.get('Contents', []):
-            key = obj['Key']
-            try:
-                process_file(s3_client, s3_bucket_name, key, cursor)
-                conn.commit()
-            except Exception as e:
-                print(f"Error processing {key}: {e}")
-                conn.rollback()
+    # Give the years of the pending game files their own partitions, rather than filling p_future
+    years = {game_year(obj['Key']) for obj in objects if 'games/' in obj['Key']} - {None}
+    if years:
+        conn = sink.connect()
+        cursor = conn.cursor()
+        sink.add_year_partitions(cursor, years)
+        conn.commit()
+        cursor.close()
+        conn.close()
 
-    # Close the database connection
-    cursor.close()
-    conn.close()
+    # Bulk load large (typically cold) imports with LOAD DATA, keep row-wise upserts for small incremental runs
+    pending_bytes = sum(obj.get('Size', 0) for obj in objects)
+    if import_mode == 'auto':
+        load_data = pending_bytes >= load_data_min_bytes
+    else:
+        load_data = import_mode == 'load_data'
+    log.info("Importing objects", objects=len(objects), bytes=pending_bytes,
+             mode='LOAD DATA' if load_data else 'row upserts')
+
+    phase_start = time.perf_counter()
+    statements, touched_games, rows = run_pipeline(
+        source, objects,
+        batch_size=batch_size,
+        fetch_workers=fetch_workers,
+        decode_workers=decode_workers,
+        writer_workers=writer_workers,
+        queue_size=queue_size,
+        raw_games=raw_games,
+        load_data=load_data,
+        load_rows=load_rows,
+        staging_dir=staging_dir,
+        bulk_session=bulk_load,
+        relax_unique_checks=has_unique_index(deferred_indexes),
+        compress_games=compress_games,
+        target_commit_latency=target_commit_latency,
+        passthrough=passthrough,
+        sink=sink,
+        validate=validate,
+        derive_stats=derive_stats,
+        stream_game_bytes=stream_game_bytes
+    )
+    timings['import'] = time.perf_counter() - phase_start
+
+    log.info("Import finished", statements=statements, games=len(touched_games))
+    # Same figures for every sink, so MySQL and SQLite runs can be compared
+    seconds = max(timings['import'], 1e-9)
+    log.info("Import throughput", sink=sink.name, seconds=round(seconds, 1),
+             objects_per_s=round(len(objects) / seconds, 1), rows_per_s=round(rows / seconds),
+             mb_per_s=round(pending_bytes / seconds / 1e6, 2))
+
+    if deferred_indexes:
+        phase_start = time.perf_counter()
+        conn = connect_db()
+        cursor = conn.cursor()
+        build_indexes(cursor, dedupe_games=dedupe_games)
+        conn.commit()
+        cursor.close()
+        conn.close()
+        timings['index build'] = time.perf_counter() - phase_start
+
+    # Keep the rollup tables in sync with the games published on the change feed since the last refresh,
+    # or all games when rebuilding
+    if sink.rollups:
+        phase_start = time.perf_counter()
+        conn = connect_db()
+        if rebuild_rollups:
+            cursor = conn.cursor()
+            offset = latest_change_id(cursor)
+            mapping_offset = latest_mapping_update(cursor)
+            game_ids = all_game_ids(cursor)
+            game_ids.discard(None)
+            refresh_rollups(cursor, game_ids)
+            save_offset(cursor, ROLLUP_CONSUMER, offset)
+            save_mapping_offset(cursor, ROLLUP_CONSUMER, mapping_offset)
+            conn.commit()
+            cursor.close()
+        else:
+            consume(conn, ROLLUP_CONSUMER, lambda cursor, changes: refresh_rollups(
+                cursor, {change.platformGameId for change in changes}))
+            # Games whose mapping changed after their rollup refresh aren't on the feed. Only the mappings
+            # updated since the last check are compared; the new offset is read before them
+            cursor = conn.cursor()
+            mapping_offset = latest_mapping_update(cursor)
+            stale_games = stale_mapping_games(cursor, load_mapping_offset(cursor, ROLLUP_CONSUMER))
+            if stale_games:
+                refresh_rollups(cursor, stale_games)
+            save_mapping_offset(cursor, ROLLUP_CONSUMER, mapping_offset)
+            conn.commit()
+            cursor.close()
+        conn.close()
+        timings['rollups'] = time.perf_counter() - phase_start
+
+    log.info("Phase timings", **{phase: round(seconds, 1) for phase, seconds in timings.items()})
 
 if __name__ == '__main__':
     main()
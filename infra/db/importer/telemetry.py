@@ -0,0 +1,106 @@
+import sys
+import json
+import time
+import logging
+import threading
+from datetime import datetime, timezone
+
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
+
+# Prometheus metrics of the importer, served by start_metrics_server.
+# Counters get a _total suffix on the endpoint; use rate() for bytes/s and rows/s.
+STAGE_SECONDS = Histogram(
+    'importer_stage_seconds',
+    'Time spent on one object in each pipeline stage',
+    ['stage'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+)
+FETCHED_BYTES = Counter('importer_fetched_bytes', 'Compressed bytes downloaded from the object store')
+OBJECTS = Counter('importer_objects', 'Objects finished, by manifest status', ['status'])
+ROWS = Counter('importer_rows', 'Rows written, by table', ['table'])
+ERRORS = Counter('importer_errors', 'Errors, by pipeline stage', ['stage'])
+QUEUE_DEPTH = Gauge('importer_queue_depth', 'Items waiting in each pipeline queue', ['queue'])
+WRITER_LIMIT = Gauge('importer_writer_limit', 'Writers currently allowed to commit at the same time')
+
+
+def start_metrics_server(port):
+    """
+    Serves the metrics on http://0.0.0.0:<port>/metrics. A port of 0 disables the endpoint.
+    """
+    if port:
+        start_http_server(port)
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats a record as one JSON object per line with its structured fields at the top level.
+    """
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname.lower(),
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        entry.update(getattr(record, 'fields', {}))
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class StructuredLogger:
+    """
+    Thin wrapper around logging that takes structured fields as keyword arguments,
+    e.g. log.info("Processing object", key=key).
+
+    sampled() rate-limits messages logged once per record or event: a message is emitted at
+    most once per interval seconds and carries the number of occurrences it stood in for.
+    """
+
+    def __init__(self, name, level='INFO', sample_interval=10.0):
+        self.logger = logging.getLogger(name)
+        if not self.logger.handlers:
+            handler = logging.StreamHandler(sys.stdout)
+            handler.setFormatter(JsonFormatter())
+            self.logger.addHandler(handler)
+            self.logger.propagate = False
+        self.logger.setLevel(level)
+        self.sample_interval = sample_interval
+        self._last_emitted = {}
+        self._suppressed = {}
+        self._lock = threading.Lock()
+
+    def configure(self, level=None, sample_interval=None):
+        if level is not None:
+            self.logger.setLevel(level)
+        if sample_interval is not None:
+            self.sample_interval = sample_interval
+
+    def log(self, level, msg, exc_info=False, **fields):
+        self.logger.log(level, msg, exc_info=exc_info, extra={'fields': fields})
+
+    def debug(self, msg, **fields):
+        self.log(logging.DEBUG, msg, **fields)
+
+    def info(self, msg, **fields):
+        self.log(logging.INFO, msg, **fields)
+
+    def warning(self, msg, **fields):
+        self.log(logging.WARNING, msg, **fields)
+
+    def error(self, msg, **fields):
+        self.log(logging.ERROR, msg, **fields)
+
+    def sampled(self, level, msg, **fields):
+        if not self.logger.isEnabledFor(level):
+            return
+        now = time.monotonic()
+        with self._lock:
+            last = self._last_emitted.get(msg)
+            if last is not None and now - last < self.sample_interval:
+                self._suppressed[msg] = self._suppressed.get(msg, 0) + 1
+                return
+            self._last_emitted[msg] = now
+            occurrences = self._suppressed.pop(msg, 0) + 1
+        self.log(level, msg, occurrences=occurrences, **fields)
@@ -0,0 +1,234 @@
+import fastjsonschema
+
+# JSON schemas of the records the importer and GameDataCleaner rely on. They only describe the fields that
+# are read downstream and allow any other field, so provider additions don't quarantine files.
+_ID = {'type': ['string', 'integer']}
+_VALUE = {'type': 'object', 'required': ['value'], 'properties': {'value': _ID}}
+_OPTIONAL_STRING = {'type': ['string', 'null']}
+
+SCHEMAS = {
+    'players': {
+        'type': 'object',
+        'required': ['id'],
+        'properties': {
+            'id': _ID,
+            'handle': _OPTIONAL_STRING,
+            'home_team_id': {'type': ['string', 'integer', 'null']},
+            'created_at': _OPTIONAL_STRING,
+            'updated_at': _OPTIONAL_STRING,
+        },
+    },
+    'teams': {
+        'type': 'object',
+        'required': ['id'],
+        'properties': {
+            'id': _ID,
+            'name': _OPTIONAL_STRING,
+            'home_league_id': {'type': ['string', 'integer', 'null']},
+        },
+    },
+    'tournaments': {
+        'type': 'object',
+        'required': ['id'],
+        'properties': {
+            'id': _ID,
+            'league_id': {'type': ['string', 'integer', 'null']},
+            'name': _OPTIONAL_STRING,
+        },
+    },
+    'mapping_data_v2': {
+        'type': 'object',
+        'required': ['platformGameId', 'tournamentId', 'teamMapping', 'participantMapping'],
+        'properties': {
+            'platformGameId': {'type': 'string'},
+            'tournamentId': _ID,
+            'teamMapping': {'type': 'object'},
+            'participantMapping': {'type': 'object'},
+        },
+    },
+}
+
+# Envelope shared by every game event
+_EVENT_ENVELOPE = {
+    'platformGameId': {'type': 'string'},
+    'metadata': {
+        'type': 'object',
+        'properties': {
+            'sequenceNumber': {'type': 'integer'},
+            'wallTime': {'type': 'string'},
+            'eventTime': {
+                'type': 'object',
+                'properties': {'includedPauses': {'type': 'string'}},
+            },
+        },
+    },
+}
+
+# Payload schemas per game event type; other event types only get the envelope checked
+GAME_EVENT_SCHEMAS = {
+    'damageEvent': {
+        'type': 'object',
+        'required': ['damageAmount', 'killEvent', 'location'],
+        'properties': {
+            'causerId': _VALUE,
+            'victimId': _VALUE,
+            'damageAmount': {'type': 'number'},
+            'killEvent': {'type': 'boolean'},
+            'location': {'type': 'string'},
+        },
+    },
+    'roundStarted': {
+        'type': 'object',
+        'properties': {'roundNumber': {'type': 'integer'}},
+    },
+    'roundEnded': {
+        'type': 'object',
+        'properties': {'roundNumber': {'type': 'integer'}},
+    },
+    'roundCeremony': {
+        'type': 'object',
+        'properties': {'type': {'type': 'string'}},
+    },
+    'snapshot': {
+        'type': 'object',
+        'properties': {
+            'players': {
+                'type': 'array',
+                'items': {
+                    'type': 'object',
+                    'required': ['playerId'],
+                    'properties': {'playerId': _VALUE},
+                },
+            },
+        },
+    },
+    'configuration': {
+        'type': 'object',
+        'required': ['players'],
+        'properties': {
+            'players': {
+                'type': 'array',
+                'items': {
+                    'type': 'object',
+                    'required': ['accountId', 'playerId', 'displayName', 'selectedAgent'],
+                    'properties': {'accountId': _VALUE, 'playerId': _VALUE},
+                },
+            },
+        },
+    },
+    'gameDecided': {
+        'type': 'object',
+        'required': ['spikeMode'],
+        'properties': {
+            'spikeMode': {
+                'type': 'object',
+                'required': ['completedRounds'],
+                'properties': {
+                    'completedRounds': {
+                        'type': 'array',
+                        'minItems': 1,
+                        'items': {
+                            'type': 'object',
+                            'required': ['roundNumber', 'winningTeam', 'spikeModeResult'],
+                            'properties': {
+                                'roundNumber': {'type': 'integer'},
+                                'winningTeam': _VALUE,
+                                'spikeModeResult': {
+                                    'type': 'object',
+                                    'required': ['attackingTeam', 'defendingTeam'],
+                                    'properties': {'attackingTeam': _VALUE, 'defendingTeam': _VALUE},
+                                },
+                            },
+                        },
+                    },
+                },
+            },
+        },
+    },
+}
+
+
+def _event_schema(event_type=None):
+    schema = {'type': 'object', 'required': ['platformGameId', 'metadata'], 'properties': dict(_EVENT_ENVELOPE)}
+    if event_type is not None:
+        schema['required'].append(event_type)
+        schema['properties'][event_type] = GAME_EVENT_SCHEMAS[event_type]
+    return schema
+
+
+# Compiled once at import; each validator is generated Python code, not a schema interpreter.
+# Game events get one validator per event type, so an event is only checked against its own payload.
+VALIDATORS = {name: fastjsonschema.compile(schema) for name, schema in SCHEMAS.items()}
+EVENT_VALIDATORS = {event_type: fastjsonschema.compile(_event_schema(event_type)) for event_type in GAME_EVENT_SCHEMAS}
+EVENT_ENVELOPE_VALIDATOR = fastjsonschema.compile(_event_schema())
+
+# Event types a game file must contain for GameDataCleaner to process it; it raises KeyError
+# without any of them (roundStarted and roundEnded are optional). A game missing one is still
+# imported, only without derived stats
+REQUIRED_GAME_EVENTS = ('configuration', 'damageEvent', 'snapshot', 'roundCeremony', 'gameDecided')
+
+
+class ValidationError(ValueError):
+    """
+    A record or file that does not match what the importer and the analysis code expect.
+    Objects failing with it are quarantined instead of imported.
+    """
+
+
+def validate_record(kind, record):
+    """
+    Raise ValidationError if record does not match SCHEMAS[kind]. Kinds without a schema are accepted.
+    """
+    validator = VALIDATORS.get(kind)
+    if validator is None:
+        return
+    try:
+        validator(record)
+    except fastjsonschema.JsonSchemaValueException as e:
+        raise ValidationError(f"{kind} record: {e.message}") from None
+
+
+def event_type_of(event):
+    """
+    Returns the event type of a game event: its first key that is not part of the envelope.
+    """
+    return next((name for name in event if name not in _EVENT_ENVELOPE), None)
+
+
+def validate_event(event, event_type, index=None):
+    """
+    Raise ValidationError if a game event of event_type does not match its schema.
+    """
+    try:
+        EVENT_VALIDATORS.get(event_type, EVENT_ENVELOPE_VALIDATOR)(event)
+    except fastjsonschema.JsonSchemaValueException as e:
+        where = "game event" if index is None else f"game event {index}"
+        raise ValidationError(f"{where}: {e.message}") from None
+
+
+def check_game_events(event_types):
+    """
+    Raise ValidationError if a game file is missing an event type GameDataCleaner needs (REQUIRED_GAME_EVENTS).
+    This is not a reason to quarantine the file: its events are imported without derived stats.
+    """
+    missing = [name for name in REQUIRED_GAME_EVENTS if name not in event_types]
+    if missing:
+        raise ValidationError(f"game file has no {', '.join(missing)} event")
+
+
+def validated_game_events(events):
+    """
+    Yield the events of a game file, checking each one against the schema of its type as it goes.
+    Raise ValidationError on the first event that does not match.
+    """
+    for index, event in enumerate(events):
+        validate_event(event, event_type_of(event) if isinstance(event, dict) else None, index)
+        yield event
+
+
+def validate_game_events(events):
+    """
+    Raise ValidationError if an event of a game file does not match the schema of its type.
+    """
+    for _ in validated_game_events(events):
+        pass
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# The analysis modules and the importer import each other as top-level modules, like the docker image lays them out
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (os.path.join(ROOT, 'analysis'), os.path.join(ROOT, 'infra', 'db', 'importer'), os.path.dirname(__file__)):
+    if path not in sys.path:
+        sys.path.insert(0, path)
@@ -0,0 +1,142 @@
+import gzip
+import json
+import random
+
+# Agents of GameDataCleaner.AGENT_MAP, one per player
+AGENTS = ['ADD6443A-41BD-E414-F6AD-E58D267F4E95', 'A3BFB853-43B2-7238-A4F1-AD90E9E46BCC',
+          'F94C3B30-42BE-E959-889C-5AA313DBA261', '7F94D92C-4234-0A36-9646-3A87EB8B5C89',
+          'EB93336A-449B-9C1B-0A54-A891F7921D69', 'BB2A4828-46EB-8CD1-E765-15848195D751',
+          '5F8D3A7F-467B-97F3-062C-13ACF203C006', '6F2A04CA-43E0-BE17-7F36-B3908627744D',
+          '320B2A48-4D9B-A075-30F1-1F93A9B638FA', '601DBBE7-43CE-BE57-2A40-4ABD24953621']
+PLAYERS = list(range(1, 11))
+# In-game teams: players 1-5 play for team 1, players 6-10 for team 2
+TEAMS = {1: PLAYERS[:5], 2: PLAYERS[5:]}
+
+
+def game_id(seed):
+    return f"val:{seed:08d}-0000-0000-0000-000000000000"
+
+
+def _sides(round_number):
+    """
+    Attacking and defending team of a round: sides swap after 12 rounds and then every round in overtime.
+    """
+    if round_number <= 12:
+        return 1, 2
+    if round_number <= 24:
+        return 2, 1
+    return (1, 2) if round_number % 2 else (2, 1)
+
+
+def game(seed, rounds=24, damage_per_round=20, round_ended=True, float_damage=False, extra_events=True):
+    """
+    Build the events of a synthetic game shaped like the VCT game files.
+
+    :param seed: Seed of the random choices; also sets the platformGameId.
+    :param rounds: Number of rounds played, more than 24 for overtime.
+    :param damage_per_round: Number of damage events per round.
+    :param round_ended: Whether rounds end with a roundEnded event.
+    :param float_damage: Use fractional damage amounts instead of whole numbers.
+    :param extra_events: Add events of types the cleaner does not read.
+    :return: List of event dicts.
+    """
+    rng = random.Random(seed)
+    platform_game_id = game_id(seed)
+    events = []
+
+    def add(event_type, payload):
+        sequence_number = len(events) + 1
+        events.append({
+            'platformGameId': platform_game_id,
+            'metadata': {
+                'gameId': {'value': str(seed)},
+                'eventTime': {'includedPauses': f'{sequence_number * 1.5}s',
+                              'omittingPauses': f'{sequence_number}s'},
+                'wallTime': '2024-06-01T10:00:00Z',
+                'sequenceNumber': sequence_number,
+                'stage': 'IN_ROUND',
+            },
+            event_type: payload,
+        })
+
+    def snapshot():
+        add('snapshot', {'players': [{'playerId': {'value': player},
+                                      'kills': rng.randint(0, 30), 'deaths': rng.randint(0, 30),
+                                      'assists': rng.randint(0, 10),
+                                      'scores': {'combatScore': {'totalScore': rng.randint(0, 9000)}}}
+                                     for player in PLAYERS]})
+
+    add('configuration', {
+        'players': [{'accountId': {'value': f'account-{player}'}, 'playerId': {'value': player},
+                     'displayName': f'Player {player}', 'selectedAgent': {'fallback': {'guid': AGENTS[player - 1]}},
+                     'type': 'PLAYER'}
+                    for player in PLAYERS],
+        'teams': [{'teamId': {'value': team}, 'playersInTeam': [{'value': player} for player in players]}
+                  for team, players in TEAMS.items()],
+    })
+    completed_rounds = []
+    for round_number in range(1, rounds + 1):
+        add('roundStarted', {'roundNumber': round_number})
+        for _ in range(damage_per_round):
+            damage = {
+                'causerId': {'value': rng.choice(PLAYERS)},
+                'victimId': {'value': rng.choice(PLAYERS)},
+                'location': rng.choice(['HEAD', 'BODY', 'LEG']),
+                'damageAmount': round(rng.uniform(1, 160), 2) if float_damage else float(rng.choice([25, 40, 78, 150])),
+                'killEvent': rng.random() < 0.15,
+            }
+            add('damageEvent', damage)
+            if extra_events and rng.random() < 0.2:
+                add('playerDied', {'deceasedId': damage['victimId']})
+            if rng.random() < 0.05:
+                snapshot()
+        if round_ended:
+            add('roundEnded', {'roundNumber': round_number})
+        add('roundCeremony', {'type': rng.choice(['CEREMONY_DEFAULT', 'CEREMONY_ACE', 'CEREMONY_CLUTCH'])})
+        attacking, defending = _sides(round_number)
+        completed_rounds.append({
+            'roundNumber': round_number,
+            'winningTeam': {'value': rng.choice([attacking, defending])},
+            'spikeModeResult': {'attackingTeam': {'value': attacking}, 'defendingTeam': {'value': defending}},
+        })
+    snapshot()
+    add('gameDecided', {'spikeMode': {'completedRounds': completed_rounds}, 'state': 'WINNER_DECIDED'})
+    return events
+
+
+def gz_json(value):
+    return gzip.compress(json.dumps(value).encode('utf-8'))
+
+
+def bucket(games=3, year=2024, prefix='vct-international/'):
+    """
+    Build the objects of a bucket with the esports data files and games, for a MemorySource.
+
+    :param games: Number of game files, or a list of lists of events.
+    :param year: Year the game files are filed under.
+    :return: Dict of key -> gzipped body.
+    """
+    if isinstance(games, int):
+        games = [game(seed, rounds=13 + seed % 3, damage_per_round=8, round_ended=seed % 2 == 0)
+                 for seed in range(games)]
+    game_ids = [events[0]['platformGameId'] for events in games]
+    objects = {
+        prefix + 'esports-data/players.json.gz': gz_json([
+            {'id': f'esports-player-{player}', 'handle': f'player{player}', 'home_team_id': 'team-a',
+             'created_at': '2021-05-13T22:37:14Z', 'updated_at': '2024-05-13T22:37:14.123Z'}
+            for player in PLAYERS]),
+        prefix + 'esports-data/teams.json.gz': gz_json([
+            {'id': 'team-a', 'acronym': 'A', 'name': 'Team A'}, {'id': 'team-b', 'acronym': 'B', 'name': 'Team B'}]),
+        prefix + 'esports-data/leagues.json.gz': gz_json([
+            {'league_id': 'league', 'region': 'INTL', 'name': 'League', 'slug': 'league'}]),
+        prefix + 'esports-data/tournaments.json.gz': gz_json([
+            {'id': 'tournament', 'status': 'published', 'league_id': 'league', 'name': 'Tournament'}]),
+        prefix + 'esports-data/mapping_data_v2.json.gz': gz_json([
+            {'platformGameId': platform_game_id, 'matchId': 'match', 'esportsGameId': f'esports-game-{index}',
+             'tournamentId': 'tournament', 'teamMapping': {'1': 'team-a', '2': 'team-b'},
+             'participantMapping': {str(player): f'esports-player-{player}' for player in PLAYERS}}
+            for index, platform_game_id in enumerate(game_ids)]),
+    }
+    for platform_game_id, events in zip(game_ids, games):
+        objects[f'{prefix}games/{year}/{platform_game_id}.json.gz'] = gz_json(events)
+    return objects
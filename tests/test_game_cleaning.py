@@ -0,0 +1,176 @@
+import io
+import copy
+import contextlib
+
+import pandas as pd
+import pytest
+
+import game_cleaning
+import reference_cleaner
+import synthetic_games
+from game_cache import GameCache, write_events, read_events
+from game_cleaning import GameDataCleaner, GameEvents, GameView
+from json_stream import iter_gz_json
+from object_sources import MemorySource
+
+
+def _drop_round_ended(events, round_number):
+    return [event for event in events if event.get('roundEnded', {}).get('roundNumber') != round_number]
+
+
+def _drop_causers(events, every):
+    events = copy.deepcopy(events)
+    for index, event in enumerate(events):
+        if 'damageEvent' in event and index % every == 0:
+            del event['damageEvent']['causerId']
+    return events
+
+
+GAMES = {
+    'regulation': synthetic_games.game(1),
+    'overtime': synthetic_games.game(2, rounds=30),
+    'no_round_ended': synthetic_games.game(3, round_ended=False),
+    'overtime_no_round_ended': synthetic_games.game(4, rounds=28, round_ended=False),
+    'one_round_ended_missing': _drop_round_ended(synthetic_games.game(5), 7),
+    'float_damage': synthetic_games.game(6, float_damage=True),
+    'missing_causers': _drop_causers(synthetic_games.game(7, float_damage=True), 9),
+    'short': synthetic_games.game(8, rounds=3, damage_per_round=2, extra_events=False),
+}
+
+
+def _clean(cleaner, events):
+    # Both cleaners print a warning per skipped damage event
+    with contextlib.redirect_stdout(io.StringIO()) as output:
+        tables = cleaner.GameDataCleaner.genGameDataFromJson(copy.deepcopy(events))
+    return tables, output.getvalue()
+
+
+def _assert_tables_equal(tables, expected):
+    assert len(tables) == len(expected)
+    for table, expected_table in zip(tables, expected):
+        pd.testing.assert_frame_equal(table, expected_table, check_exact=True)
+
+
+@pytest.mark.parametrize('name', sorted(GAMES))
+def test_outputs_match_reference_cleaner(name):
+    expected, expected_output = _clean(reference_cleaner, GAMES[name])
+    tables, output = _clean(game_cleaning, GAMES[name])
+    _assert_tables_equal(tables, expected)
+    assert output == expected_output
+
+
+@pytest.mark.parametrize('event_type', ['configuration', 'gameDecided', 'roundCeremony', 'snapshot'])
+def test_missing_event_type_fails_like_reference_cleaner(event_type):
+    events = [event for event in GAMES['regulation'] if event_type not in event]
+    with pytest.raises(KeyError):
+        _clean(reference_cleaner, events)
+    with pytest.raises(KeyError):
+        GameDataCleaner.genGameDataFromJson(events)
+
+
+def test_streamed_events_match_loaded_events():
+    events = GAMES['overtime']
+    streamed = GameDataCleaner.genGameDataFromGz(io.BytesIO(synthetic_games.gz_json(events)))
+    _assert_tables_equal(streamed, GameDataCleaner.genGameDataFromJson(events))
+
+
+def test_view_computes_only_requested_tables():
+    events = GAMES['float_damage']
+    view = GameView.fromJson(events)
+    team_pf = view.team_pf
+    assert 'player_pf' not in view.computed()
+    expected = GameDataCleaner.genGameDataFromJson(events)
+    _assert_tables_equal((team_pf, view.round_df, view.player_pf), expected)
+
+
+def test_player_round_df_adds_up_to_player_pf():
+    view = GameView.fromJson(GAMES['overtime'])
+    per_round = view.player_round_df.groupby('playerID')[['kills', 'deaths', 'damage_dealt']].sum()
+    totals = view.player_pf.set_index('playerID')[['kills', 'deaths', 'damage_dealt']]
+    pd.testing.assert_frame_equal(per_round.loc[totals.index], totals, check_dtype=False)
+
+
+def test_many_games_stack_single_game_outputs():
+    names = ['regulation', 'overtime', 'no_round_ended']
+    team_pf, round_df, player_pf = GameDataCleaner.genGameDataFromMany([GAMES[name] for name in names], workers=1)
+    for name in names:
+        game_id = GAMES[name][0]['platformGameId']
+        expected = GameDataCleaner.genGameDataFromJson(GAMES[name])
+        _assert_tables_equal((team_pf.loc[game_id], round_df.loc[game_id], player_pf.loc[game_id]), expected)
+
+
+def test_many_games_leave_out_failures(capsys):
+    broken = [event for event in GAMES['short'] if 'gameDecided' not in event]
+    team_pf, _, _ = GameDataCleaner.genGameDataFromMany([GAMES['short'], broken], workers=1)
+    assert list(team_pf.index.unique('platformGameId')) == [GAMES['short'][0]['platformGameId']]
+    assert 'Failed to clean game 1' in capsys.readouterr().out
+
+
+@pytest.mark.parametrize('name', ['overtime_no_round_ended', 'missing_causers'])
+def test_cached_events_clean_like_parsed_events(tmp_path, name):
+    events = GameEvents(iter_gz_json(io.BytesIO(synthetic_games.gz_json(GAMES[name]))))
+    path = str(tmp_path / 'game.game')
+    write_events(path, events, 'key', 'hash')
+    cached, header = read_events(path)
+    assert header['key'] == 'key'
+    with contextlib.redirect_stdout(io.StringIO()):
+        _assert_tables_equal(GameDataCleaner.genGameDataFromEvents(cached),
+                             GameDataCleaner.genGameDataFromEvents(events))
+
+
+class CountingSource(MemorySource):
+    """
+    A MemorySource counting the calls made to it by method.
+    """
+
+    def __init__(self, objects):
+        super().__init__(objects)
+        self.calls = {'list': 0, 'head': 0, 'get': 0, 'open': 0}
+
+    def list(self, prefix=''):
+        # MemorySource lists through head(), which is not a call made by the cache
+        self.calls['list'] += 1
+        heads = self.calls['head']
+        objects = list(super().list(prefix))
+        self.calls['head'] = heads
+        return objects
+
+    def head(self, key):
+        self.calls['head'] += 1
+        return super().head(key)
+
+    def get(self, key):
+        self.calls['get'] += 1
+        return super().get(key)
+
+    def open(self, key):
+        self.calls['open'] += 1
+        return super().open(key)
+
+
+def test_cache_hits_do_not_read_the_source(tmp_path):
+    key = 'games/2024/game.json.gz'
+    source = CountingSource({key: synthetic_games.gz_json(GAMES['short'])})
+    expected = GameDataCleaner.genGameDataFromEvents(GameCache(str(tmp_path), source).events(key))
+    assert source.calls == {'list': 0, 'head': 1, 'get': 0, 'open': 1}
+
+    # A new cache over the same directory asks for the ETag once and reads the cached columns
+    source.calls = dict.fromkeys(source.calls, 0)
+    cache = GameCache(str(tmp_path), source)
+    for _ in range(2):
+        _assert_tables_equal(GameDataCleaner.genGameDataFromEvents(cache.events(key)), expected)
+    assert source.calls == {'list': 0, 'head': 1, 'get': 0, 'open': 0}
+
+    # Listed keys share the listed ETag, so a listed cache hits the same entry
+    source.calls = dict.fromkeys(source.calls, 0)
+    cache = GameCache(str(tmp_path), source)
+    list(cache.list())
+    cache.events(key)
+    assert source.calls == {'list': 1, 'head': 0, 'get': 0, 'open': 0}
+
+    # A changed game gets a new ETag and is parsed again
+    source.objects[key] = synthetic_games.gz_json(GAMES['regulation'])
+    source.calls = dict.fromkeys(source.calls, 0)
+    cache = GameCache(str(tmp_path), source)
+    assert cache.events(key).count == len(GAMES['regulation'])
+    assert source.calls == {'list': 0, 'head': 1, 'get': 0, 'open': 1}
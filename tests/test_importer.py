@@ -0,0 +1,460 @@
+import io
+import json
+import sqlite3
+import threading
+import contextlib
+
+import pytest
+
+import json_stream
+import synthetic_games
+from game_cleaning import GameDataCleaner
+from object_sources import MemorySource
+from validation import REQUIRED_GAME_EVENTS, ValidationError, check_game_events, validate_game_events
+from importer import (MySQLSink, SQLiteSink, BatchWriter, GameFile, LoadDataWriter, PARTITIONED_TABLES,
+                      _dedupe_games, add_game_events, add_year_partitions, decode_game, game_payload_members, load_manifest,
+                      pending_objects, record_manifest, run_pipeline)
+
+PREFIX = 'vct-international/'
+
+
+def _import(path, objects, sink=None, **kwargs):
+    """
+    Import the objects of a MemorySource into a SQLite file like main() does: create the tables,
+    skip the objects the manifest has, and run the pipeline.
+    """
+    source = MemorySource(objects)
+    sink = sink or SQLiteSink(path)
+    conn = sink.connect()
+    cursor = conn.cursor()
+    sink.create_tables(cursor)
+    conn.commit()
+    manifest = load_manifest(cursor)
+    cursor.close()
+    conn.close()
+    pending = list(pending_objects(source.list(PREFIX), manifest))
+    statements, games, rows = run_pipeline(source, pending, sink=sink, fetch_workers=2, decode_workers=1, **kwargs)
+    return pending, games
+
+
+def _query(path, sql, params=()):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute(sql, params).fetchall()
+    finally:
+        conn.close()
+
+
+@pytest.fixture
+def games():
+    return [synthetic_games.game(seed, rounds=13 + seed, damage_per_round=6, round_ended=seed % 2 == 0,
+                                 float_damage=seed == 1)
+            for seed in range(3)]
+
+
+def test_import_round_trip(tmp_path, games):
+    path = str(tmp_path / 'esports.db')
+    objects = synthetic_games.bucket(games)
+    pending, touched_games = _import(path, objects)
+
+    assert len(pending) == len(objects)
+    assert _query(path, "SELECT object_key, status FROM import_manifest ORDER BY object_key;") == [
+        (key, 'done') for key in sorted(objects)]
+    game_ids = {events[0]['platformGameId'] for events in games}
+    assert touched_games == game_ids
+    assert _query(path, "SELECT COUNT(*) FROM players;") == [(len(synthetic_games.PLAYERS),)]
+    assert _query(path, "SELECT COUNT(*) FROM mapping_data_v2;") == [(len(games),)]
+
+    for events in games:
+        game_id = events[0]['platformGameId']
+        damage = [event['damageEvent'] for event in events if 'damageEvent' in event]
+        assert _query(path, "SELECT COUNT(*) FROM game_events WHERE platformGameId = ?;", (game_id,)) == [
+            (len(events),)]
+        assert _query(path, "SELECT COUNT(*) FROM games WHERE platformGameId = ?;", (game_id,)) == [(len(events),)]
+        assert _query(path, "SELECT SUM(damage_amount), SUM(kill_event) FROM damage_events "
+                            "WHERE platformGameId = ?;", (game_id,)) == [
+            (pytest.approx(sum(event['damageAmount'] for event in damage)),
+             sum(event['killEvent'] for event in damage))]
+        assert _query(path, "SELECT COUNT(*) FROM game_changes WHERE platformGameId = ?;", (game_id,)) == [(1,)]
+        assert _query(path, "SELECT player_id, team_number FROM game_participants WHERE platformGameId = ? "
+                            "ORDER BY player_id;", (game_id,)) == [
+            (player, team) for team, players in synthetic_games.TEAMS.items() for player in players]
+
+        # Derived tables hold the outputs of GameDataCleaner
+        with contextlib.redirect_stdout(io.StringIO()):
+            team_pf, round_df, player_pf = GameDataCleaner.genGameDataFromJson(events)
+        stats = _query(path, "SELECT player_id, kills, deaths, damage_dealt FROM game_player_stats "
+                             "WHERE platformGameId = ? ORDER BY player_id;", (game_id,))
+        expected = player_pf.sort_values('playerID')[['playerID', 'kills', 'deaths', 'damage_dealt']]
+        assert stats == [tuple(row) for row in expected.itertuples(index=False)]
+        assert _query(path, "SELECT COUNT(*) FROM game_rounds WHERE platformGameId = ?;", (game_id,)) == [
+            (len(round_df),)]
+        assert _query(path, "SELECT SUM(total_wins) FROM game_team_stats WHERE platformGameId = ?;", (game_id,)) == [
+            (int(team_pf['Total Wins'].sum()),)]
+
+
+def test_sqlite_stores_encoded_payloads(tmp_path, games):
+    # Passthrough is for JSON columns only: the TEXT columns of SQLite get json.dumps text
+    path = str(tmp_path / 'esports.db')
+    _import(path, synthetic_games.bucket(games[:1]), passthrough=True)
+    events = games[0]
+    rows = _query(path, "SELECT metadata, snapshot FROM games WHERE platformGameId = ? ORDER BY rowid;",
+                  (events[0]['platformGameId'],))
+    assert rows == [(json.dumps(event['metadata']), json.dumps(event.get('snapshot'))) for event in events]
+
+
+def test_streamed_games_import_like_decoded_games(tmp_path, games):
+    objects = synthetic_games.bucket(games)
+    tables = ('games', 'game_events', 'damage_events', 'player_snapshots', 'game_player_stats')
+    contents = []
+    for stream_game_bytes in (0, 1 << 30):
+        path = str(tmp_path / f'esports-{stream_game_bytes}.db')
+        _import(path, objects, stream_game_bytes=stream_game_bytes)
+        contents.append([_query(path, f"SELECT * FROM {table} ORDER BY 1, 2;") for table in tables])
+    assert contents[0] == contents[1]
+
+
+def test_streamed_game_sends_back_no_events(games):
+    game_file, derived = decode_game(synthetic_games.gz_json(games[0]), year=2024, validate=True)
+    assert isinstance(game_file, GameFile) and game_file.compressed_body is None
+    assert game_file.platform_game_id == games[0][0]['platformGameId']
+    assert set(derived) == {'game_team_stats', 'game_rounds', 'game_player_stats'}
+
+
+@pytest.mark.skipif('orjson' not in json_stream.BACKENDS, reason="orjson is not installed")
+def test_passthrough_follows_the_sink_and_backend():
+    previous = json_stream.get_backend()
+    try:
+        json_stream.set_backend('orjson')
+        assert game_payload_members(MySQLSink(), passthrough=True) == ('metadata', 'snapshot')
+        assert game_payload_members(SQLiteSink(':memory:'), passthrough=True) == ()
+        assert game_payload_members(MySQLSink(), passthrough=True, compress_games=True) == ()
+        # Keeping the source text with the json module is slower than json.dumps
+        json_stream.set_backend('json')
+        assert game_payload_members(MySQLSink(), passthrough=True) == ()
+    finally:
+        json_stream.set_backend(previous)
+
+
+def test_rerun_skips_imported_objects(tmp_path, games):
+    path = str(tmp_path / 'esports.db')
+    objects = synthetic_games.bucket(games)
+    _import(path, objects)
+    changes = _query(path, "SELECT COUNT(*) FROM game_changes;")
+
+    pending, touched_games = _import(path, objects)
+    assert pending == []
+    assert touched_games == set()
+    assert _query(path, "SELECT COUNT(*) FROM game_changes;") == changes
+
+
+def test_changed_game_is_imported_again(tmp_path, games):
+    path = str(tmp_path / 'esports.db')
+    objects = synthetic_games.bucket(games)
+    _import(path, objects)
+
+    key = f"{PREFIX}games/2024/{games[0][0]['platformGameId']}.json.gz"
+    objects[key] = synthetic_games.gz_json(games[0][:-1] + [games[0][-1]] * 2)
+    pending, _ = _import(path, objects)
+    assert [obj['Key'] for obj in pending] == [key]
+    assert _query(path, "SELECT COUNT(*) FROM game_changes WHERE object_key = ?;", (key,)) == [(2,)]
+
+
+@pytest.mark.parametrize('event_type', ['configuration', 'damageEvent', 'snapshot', 'roundStarted', 'roundEnded',
+                                        'roundCeremony', 'playerDied', 'gameDecided'])
+def test_required_events_are_those_the_cleaner_needs(games, event_type):
+    events = [event for event in games[0] if event_type not in event]
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            GameDataCleaner.genGameDataFromJson(events)
+        cleaned = True
+    except KeyError:
+        cleaned = False
+    assert cleaned == (event_type not in REQUIRED_GAME_EVENTS)
+    # Missing events are not a schema error, they only skip the cleaner
+    validate_game_events(events)
+    event_types = {name for event in events for name in event}
+    if cleaned:
+        check_game_events(event_types)
+    else:
+        with pytest.raises(ValidationError, match=event_type):
+            check_game_events(event_types)
+
+
+def test_game_without_cleaner_events_is_imported_without_stats(tmp_path, games):
+    path = str(tmp_path / 'esports.db')
+    partial = [event for event in games[1] if 'roundCeremony' not in event]
+    objects = synthetic_games.bucket([games[0], partial])
+    _, touched_games = _import(path, objects)
+    game_id = partial[0]['platformGameId']
+    assert touched_games == {games[0][0]['platformGameId'], game_id}
+
+    assert _query(path, "SELECT COUNT(*) FROM import_quarantine;") == [(0,)]
+    assert _query(path, "SELECT COUNT(*) FROM game_events WHERE platformGameId = ?;", (game_id,)) == [
+        (len(partial),)]
+    assert _query(path, "SELECT COUNT(*) FROM game_team_stats WHERE platformGameId = ?;", (game_id,)) == [(0,)]
+    assert _query(path, "SELECT COUNT(*) FROM game_team_stats WHERE platformGameId = ?;",
+                  (games[0][0]['platformGameId'],)) != [(0,)]
+
+
+def test_invalid_game_is_quarantined(tmp_path, games):
+    path = str(tmp_path / 'esports.db')
+    broken = [dict(event, damageEvent=dict(event['damageEvent'], damageAmount='lots'))
+              if 'damageEvent' in event else event for event in games[1]]
+    objects = synthetic_games.bucket([games[0], broken])
+    broken_key = f"{PREFIX}games/2024/{broken[0]['platformGameId']}.json.gz"
+    _, touched_games = _import(path, objects)
+    # Only games that were written have their rollups refreshed
+    assert touched_games == {games[0][0]['platformGameId']}
+
+    assert _query(path, "SELECT status FROM import_manifest WHERE object_key = ?;", (broken_key,)) == [
+        ('quarantined',)]
+    reason, = _query(path, "SELECT reason FROM import_quarantine WHERE object_key = ?;", (broken_key,))[0]
+    assert 'damageAmount' in reason
+    assert _query(path, "SELECT COUNT(*) FROM game_events WHERE platformGameId = ?;",
+                  (broken[0]['platformGameId'],)) == [(0,)]
+    assert _query(path, "SELECT COUNT(*) FROM game_changes;") == [(1,)]
+
+
+def test_game_without_year_is_quarantined(tmp_path, games):
+    path = str(tmp_path / 'esports.db')
+    objects = synthetic_games.bucket(games[:1])
+    key = f"{PREFIX}games/{games[1][0]['platformGameId']}.json.gz"
+    objects[key] = synthetic_games.gz_json(games[1])
+    _import(path, objects)
+
+    assert _query(path, "SELECT status FROM import_manifest WHERE object_key = ?;", (key,)) == [('quarantined',)]
+    assert _query(path, "SELECT COUNT(*) FROM game_events WHERE year IS NULL;") == [(0,)]
+
+
+class PartitionCursor:
+    """
+    Stands in for a MySQL cursor over tables partitioned up to bound: answers the information_schema
+    partition query and records the other statements.
+    """
+
+    def __init__(self, bound):
+        self.bound = bound
+        self.statements = []
+
+    def execute(self, sql, params=()):
+        self.statements.append(sql)
+
+    def fetchall(self):
+        return [(f'p{year}', str(year + 1)) for year in range(2021, self.bound)] + [('p_future', 'MAXVALUE')]
+
+
+def test_new_years_are_split_out_of_p_future():
+    cursor = PartitionCursor(bound=2027)
+    assert add_year_partitions(cursor, {2024, 2026}) == []
+    assert not any(sql.startswith('ALTER') for sql in cursor.statements)
+
+    assert add_year_partitions(cursor, {2024, 2029}) == [2027, 2028, 2029]
+    alters = [sql for sql in cursor.statements if sql.startswith('ALTER')]
+    assert [sql.split()[2] for sql in alters] == list(PARTITIONED_TABLES)
+    assert alters[0] == ("ALTER TABLE games REORGANIZE PARTITION p_future INTO ("
+                         "PARTITION p2027 VALUES LESS THAN (2028), PARTITION p2028 VALUES LESS THAN (2029), "
+                         "PARTITION p2029 VALUES LESS THAN (2030), PARTITION p_future VALUES LESS THAN MAXVALUE);")
+
+
+class DuplicateCursor:
+    """
+    A MySQL cursor stand-in for _dedupe_games, on a games table with two duplicate rows of one key.
+    """
+
+    def __init__(self):
+        self.statements = []
+
+    def execute(self, sql, params=()):
+        self.statements.append(' '.join(sql.split()))
+
+    def fetchone(self):
+        return 1, 2
+
+    def fetchall(self):
+        return [('game-1', 'PT0S', 3)]
+
+
+def test_duplicate_games_fail_unless_deduped():
+    cursor = DuplicateCursor()
+    with pytest.raises(RuntimeError, match=r"2 duplicate rows of 1 .*game-1"):
+        _dedupe_games(cursor)
+    assert not any(sql.startswith('DELETE') for sql in cursor.statements)
+    assert cursor.statements[-1] == "DROP TEMPORARY TABLE games_duplicates;"
+
+    cursor = DuplicateCursor()
+    assert _dedupe_games(cursor, delete=True) == 2
+    assert any(sql.startswith('DELETE') for sql in cursor.statements)
+
+
+class LosingConnection:
+    """
+    A SQLite connection that is lost on its lose_at-th commit: the uncommitted work is gone and
+    every later call fails, like a MySQL connection the server dropped.
+    """
+
+    def __init__(self, conn, lose_at):
+        self.conn = conn
+        self.commits = 0
+        self.lose_at = lose_at
+        self.lost = False
+
+    def _check(self):
+        if self.lost:
+            raise sqlite3.OperationalError("connection lost")
+
+    def cursor(self):
+        self._check()
+        return self.conn.cursor()
+
+    def commit(self):
+        self._check()
+        self.commits += 1
+        if self.commits == self.lose_at:
+            # The server drops the session: its transaction is gone and it holds no locks
+            self.lost = True
+            self.conn.conn.execute("ROLLBACK;")
+            self._check()
+        self.conn.commit()
+
+    def rollback(self):
+        self._check()
+        self.conn.rollback()
+
+    def close(self):
+        self._check()
+        self.conn.close()
+
+
+class LosingSink(SQLiteSink):
+    """
+    Hands out one connection that gets lost, the pipeline's: _import connects once before to create the
+    tables. Later connections work, or fail with down=True.
+    """
+
+    def __init__(self, path, lose_at, down=False):
+        super().__init__(path, commit_objects=1)
+        self.lose_at = lose_at
+        self.down = down
+        self.connections = 0
+
+    def connect(self):
+        self.connections += 1
+        if self.connections == 2:
+            return LosingConnection(super().connect(), self.lose_at)
+        if self.down and self.connections > 2:
+            raise sqlite3.OperationalError("database is down")
+        return super().connect()
+
+
+def test_writer_reconnects_after_lost_connection(tmp_path, games):
+    path = str(tmp_path / 'esports.db')
+    objects = synthetic_games.bucket(games)
+    _import(path, {}, sink=SQLiteSink(path))
+    sink = LosingSink(path, lose_at=3)
+    _import(path, objects, sink=sink)
+
+    statuses = [status for status, in _query(path, "SELECT status FROM import_manifest;")]
+    assert sink.connections == 3
+    assert sorted(statuses) == ['done'] * (len(objects) - 1) + ['failed']
+
+    # The failed object is picked up by the next run
+    pending, _ = _import(path, objects)
+    assert len(pending) == 1
+    assert _query(path, "SELECT DISTINCT status FROM import_manifest;") == [('done',)]
+
+
+def test_writer_failure_aborts_run(tmp_path):
+    path = str(tmp_path / 'esports.db')
+    objects = synthetic_games.bucket(12)
+    _import(path, {}, sink=SQLiteSink(path))
+    errors = []
+
+    def run():
+        try:
+            _import(path, objects, sink=LosingSink(path, lose_at=2, down=True), queue_size=1)
+        except sqlite3.OperationalError as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(timeout=60)
+    assert not thread.is_alive()
+    assert [str(e) for e in errors] == ["database is down"]
+
+
+class LoadingCursor:
+    """
+    Stands in for a MySQL cursor under LoadDataWriter: records statements and fails the next fail_loads LOAD DATAs.
+    """
+
+    def __init__(self):
+        self.statements = []
+        self.fail_loads = 0
+        self.rowcount = 0
+
+    def execute(self, sql, params=()):
+        if sql.startswith('LOAD DATA'):
+            if self.fail_loads:
+                self.fail_loads -= 1
+                raise RuntimeError("load failed")
+            with open(params[0], encoding='utf-8') as f:
+                self.rowcount = len(f.readlines())
+        self.statements.append((sql, params))
+
+
+def test_rolled_back_games_are_not_counted(games):
+    writer = BatchWriter(LoadingCursor())
+    add_game_events(writer, games[0], 2024)
+    writer.discard()
+    add_game_events(writer, games[1], 2024)
+    writer.flush()
+    writer.committed()
+    assert writer.games == {games[1][0]['platformGameId']}
+
+
+def _stage_objects(writer, keys):
+    for key in keys:
+        record_manifest(writer, {'Key': key, 'ETag': 'etag', 'Size': 1}, 'done')
+        writer.flush()
+        writer.committed()
+
+
+def test_failed_load_keeps_staged_batch(tmp_path):
+    cursor = LoadingCursor()
+    writer = LoadDataWriter(cursor, str(tmp_path), load_rows=2)
+    _stage_objects(writer, ['a', 'b'])
+    assert writer.due()
+
+    cursor.fail_loads = 1
+    with pytest.raises(RuntimeError):
+        writer.finish()
+    writer.discard()
+    path = tmp_path / 'import_manifest.tsv'
+    assert len(path.read_text().splitlines()) == 2
+
+    # The retry loads the whole batch, and the files go once it is committed
+    writer.finish()
+    assert path.exists()
+    writer.committed()
+    assert not path.exists()
+    assert writer.rows == 2
+
+
+def test_unloadable_batch_is_marked_failed(tmp_path):
+    cursor = LoadingCursor()
+    writer = LoadDataWriter(cursor, str(tmp_path))
+    _stage_objects(writer, ['a', 'b'])
+    writer.pending_games.add('game')
+    writer.flush()
+    cursor.fail_loads = 1
+    with pytest.raises(RuntimeError):
+        writer.finish()
+    writer.discard()
+
+    assert writer.fail_batch() == 2
+    assert writer.games == set()
+    assert list(tmp_path.iterdir()) == []
+    sql, params = cursor.statements[-1]
+    assert sql.startswith('INSERT INTO import_manifest')
+    assert [params[i:i + 5][::4] for i in range(0, len(params), 5)] == [['a', 'failed'], ['b', 'failed']]
@@ -0,0 +1,90 @@
+import io
+import json
+
+import pytest
+
+import json_stream
+import synthetic_games
+from json_stream import BACKENDS, iter_gz_json, iter_json_array, loads_keep_raw
+from object_sources import LocalSource
+
+KEEP_RAW = ('metadata', 'snapshot')
+
+
+@pytest.fixture(params=sorted(BACKENDS))
+def backend(request):
+    previous = json_stream.get_backend()
+    json_stream.set_backend(request.param)
+    yield request.param
+    json_stream.set_backend(previous)
+
+
+def test_kept_members_decode_to_the_same_values(backend):
+    events = synthetic_games.game(1, rounds=3)
+    decoded = loads_keep_raw(json.dumps(events, indent=1).encode('utf-8'), KEEP_RAW)
+    assert decoded == events
+    for event, expected in zip(decoded, events):
+        assert set(event.raw) == set(KEEP_RAW) & set(expected)
+        for name, text in event.raw.items():
+            assert json.loads(text) == expected[name]
+
+
+def test_text_orjson_rejects_keeps_source_text(backend):
+    # An integer beyond 64 bits and NaN are decoded by json, member by member
+    body = b'[{"metadata": {"id": 123456789012345678901234}, "snapshot": NaN, "other": 1}]'
+    event, = loads_keep_raw(body, KEEP_RAW)
+    assert event.raw == {'metadata': '{"id": 123456789012345678901234}', 'snapshot': 'NaN'}
+    assert event['metadata'] == {'id': 123456789012345678901234}
+
+
+def test_iter_gz_json_streams_by_default(backend):
+    events = synthetic_games.game(2, rounds=30, damage_per_round=40)
+    fileobj = io.BytesIO(synthetic_games.gz_json(events))
+    stream = iter_gz_json(fileobj, chunk_size=1024)
+    assert next(stream) == events[0]
+    # Only the start of the file has been read for the first event
+    assert fileobj.tell() < len(fileobj.getvalue()) / 2
+    assert [events[0]] + list(stream) == events
+
+
+@pytest.mark.parametrize('keep_raw', [(), KEEP_RAW])
+def test_iter_gz_json_whole_file_decodes_like_streaming(backend, keep_raw):
+    body = synthetic_games.gz_json(synthetic_games.game(3, rounds=4))
+    whole = list(iter_gz_json(io.BytesIO(body), keep_raw=keep_raw, whole_file=True))
+    streamed = list(iter_gz_json(io.BytesIO(body), keep_raw=keep_raw))
+    assert whole == streamed
+    if keep_raw:
+        assert [event.raw.keys() for event in whole] == [event.raw.keys() for event in streamed]
+
+
+@pytest.mark.parametrize('text', ['[]', ' [ ] ', '[1]', '[1, {"a": [2, 3]} ,"x"]\n', '[{"a": 1},{"b": 2}]'])
+@pytest.mark.parametrize('chunk_size', [1, 3, 1024])
+@pytest.mark.parametrize('keep_raw', [(), ('a',)])
+def test_iter_json_array_decodes_like_loads(text, chunk_size, keep_raw):
+    assert list(iter_json_array(io.StringIO(text), chunk_size=chunk_size, keep_raw=keep_raw)) == json.loads(text)
+
+
+@pytest.mark.parametrize('text', ['[1 2]', '[,1]', '[1,,2]', '[1,]', '[,]', '[1] 2', '[1', '[1,', '', ']'])
+@pytest.mark.parametrize('chunk_size', [1, 1024])
+def test_iter_json_array_rejects_what_loads_rejects(text, chunk_size):
+    with pytest.raises(ValueError):
+        json.loads(text)
+    with pytest.raises(ValueError):
+        list(iter_json_array(io.StringIO(text), chunk_size=chunk_size))
+
+
+def test_iter_gz_json_closes_source_files(tmp_path):
+    events = synthetic_games.game(4, rounds=3)
+    (tmp_path / 'game.json.gz').write_bytes(synthetic_games.gz_json(events))
+    source = LocalSource(str(tmp_path))
+
+    fileobj = source.open('game.json.gz')
+    assert list(iter_gz_json(fileobj, close=True)) == events
+    assert fileobj.closed
+
+    # Also when the events are not all read
+    fileobj = source.open('game.json.gz')
+    stream = iter_gz_json(fileobj, close=True)
+    next(stream)
+    stream.close()
+    assert fileobj.closed